@@ -0,0 +1,143 @@
+"""
+Мікробенчмарк маршрутизації натискань кнопок: таблиця CallbackRouter проти попередніх
+CallbackQueryHandler з регулярними виразами.
+
+Для кожного оновлення обробники групи перевіряються по черзі до першого, що підходить, —
+так само, як у Application.process_update. Вимірюється лише пошук обробника (check_update),
+без виконання callback. Частина користувачів перебуває в діалогах, тож ConversationHandler
+перевіряють обробники поточного стану і fallbacks.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_callback_routing --updates 200000
+"""
+import argparse
+import datetime
+import random
+import time
+import warnings
+from telegram import CallbackQuery, Chat, Message, Update, User
+from telegram.ext import CallbackQueryHandler, CommandHandler, ConversationHandler, MessageHandler, filters
+from src.settings.config import config
+from src.bot.constants import (
+    GPT_DIALOGUE_STATE,
+    TALK_PERSONALITY_STATE,
+    TALK_CONVERSING_STATE,
+    QUIZ_SELECTING_TOPIC,
+    QUIZ_WAITING_FOR_ANSWER,
+    QUIZ_SHOWING_RESULT
+)
+
+# Натискання: (callback_data, діалог і його стан або None)
+PRESSES = [
+    ("start", None), ("random", None), ("gpt", None), ("talk", None), ("quiz", None),
+    ("talk_hawking", ("talk_conversation", TALK_PERSONALITY_STATE)),
+    ("end_talk", ("talk_conversation", TALK_CONVERSING_STATE)),
+    ("end_talk", ("talk_conversation", TALK_PERSONALITY_STATE)),  # кнопка з talk.json до вибору особистості
+    ("quiz_python", ("quiz_conversation", QUIZ_SELECTING_TOPIC)),
+    ("ask_another_question", ("quiz_conversation", QUIZ_SHOWING_RESULT)),
+    ("end_quiz", ("quiz_conversation", QUIZ_SHOWING_RESULT)),
+    ("end_gpt_dialogue", ("gpt_conversation", GPT_DIALOGUE_STATE)),
+    ("start", ("quiz_conversation", QUIZ_SHOWING_RESULT)),
+]
+
+
+async def noop(update, context):
+    return None
+
+
+def legacy_handlers() -> list:
+    """Обробники в тому вигляді, в якому їх реєстрував main.py до таблиці маршрутизації."""
+    # Попередження PTB про CallbackQueryHandler з per_message=False тут очікувані
+    warnings.filterwarnings("ignore", message="If 'per_message=False'")
+    text = filters.TEXT & ~filters.COMMAND
+    gpt = ConversationHandler(
+        name="gpt_conversation",
+        entry_points=[CommandHandler("gpt", noop), CallbackQueryHandler(noop, pattern="^gpt$")],
+        states={GPT_DIALOGUE_STATE: [MessageHandler(text, noop),
+                                     CallbackQueryHandler(noop, pattern="^end_gpt_dialogue$")]},
+        fallbacks=[CommandHandler("start", noop), CommandHandler("cancel", noop)]
+    )
+    talk = ConversationHandler(
+        name="talk_conversation",
+        entry_points=[CommandHandler("talk", noop), CallbackQueryHandler(noop, pattern="^talk$")],
+        states={
+            TALK_PERSONALITY_STATE: [CallbackQueryHandler(noop, pattern="^talk_.*")],
+            TALK_CONVERSING_STATE: [MessageHandler(text, noop), CallbackQueryHandler(noop, pattern="^end_talk$")]
+        },
+        fallbacks=[CommandHandler("cancel", noop), CommandHandler("start", noop)]
+    )
+    quiz = ConversationHandler(
+        name="quiz_conversation",
+        entry_points=[CommandHandler("quiz", noop), CallbackQueryHandler(noop, pattern="^quiz$")],
+        states={
+            QUIZ_SELECTING_TOPIC: [CallbackQueryHandler(noop, pattern="^quiz_.*")],
+            QUIZ_WAITING_FOR_ANSWER: [MessageHandler(text, noop)],
+            QUIZ_SHOWING_RESULT: [CallbackQueryHandler(noop, pattern="^ask_another_question$"),
+                                  CallbackQueryHandler(noop, pattern="^change_topic$"),
+                                  CallbackQueryHandler(noop, pattern="^end_quiz$")]
+        },
+        fallbacks=[CommandHandler("cancel", noop), CommandHandler("start", noop),
+                   CallbackQueryHandler(noop, pattern="^start$")]
+    )
+    return [
+        gpt, talk, quiz,
+        CommandHandler("start", noop), CommandHandler("random", noop),
+        CallbackQueryHandler(noop, pattern="^random$"),
+        CallbackQueryHandler(noop, pattern="^start$"),
+        CallbackQueryHandler(noop, pattern="^gpt$"),
+        CallbackQueryHandler(noop, pattern="^talk$"),
+        CallbackQueryHandler(noop, pattern="^quiz$"),
+    ]
+
+
+def current_handlers() -> list:
+    config.bot_api_key = config.bot_api_key or "123456:BENCH"
+    from src.main import build_application
+    return build_application(use_updater=False).handlers[0]
+
+
+def make_updates(count: int, rng: random.Random) -> list[tuple[Update, tuple | None]]:
+    user = User(1, "Бенчмарк", False)
+    chat = Chat(1, Chat.PRIVATE)
+    message = Message(1, datetime.datetime.now(datetime.timezone.utc), chat)
+    updates = []
+    for update_id in range(count):
+        data, conversation = rng.choice(PRESSES)
+        query = CallbackQuery(str(update_id), user, "bench", message=message, data=data)
+        updates.append((Update(update_id, callback_query=query), conversation))
+    return updates
+
+
+def dispatch(handlers: list, updates: list) -> tuple[float, int]:
+    """Середній час пошуку обробника (мкс) і кількість оновлень без обробника."""
+    conversations = {handler.name: handler for handler in handlers if isinstance(handler, ConversationHandler)}
+    unmatched = 0
+    elapsed = 0.0
+    for update, conversation in updates:
+        for handler in conversations.values():
+            handler._conversations.clear()
+        if conversation is not None:
+            name, state = conversation
+            conversations[name]._conversations[(1, 1)] = state
+        start = time.perf_counter()
+        for handler in handlers:
+            if handler.check_update(update) not in (None, False):
+                break
+        else:
+            unmatched += 1
+        elapsed += time.perf_counter() - start
+    return elapsed / len(updates) * 1e6, unmatched
+
+
+def main(count: int) -> None:
+    updates = make_updates(count, random.Random(5))
+    for name, handlers in (("регулярні вирази", legacy_handlers()), ("таблиця маршрутизації", current_handlers())):
+        per_update, unmatched = dispatch(handlers, updates)
+        print(f"{name:22} {per_update:6.2f} мкс на оновлення, без обробника: {unmatched}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=200_000)
+    args = parser.parse_args()
+    main(args.updates)
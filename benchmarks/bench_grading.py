@@ -0,0 +1,129 @@
+"""
+Бенчмарк локальної перевірки відповідей квізу.
+
+Показує, яку частку відповідей вдається оцінити без звернення до моделі, точність цих
+оцінок на розміченому наборі та скільки часу економиться на одній відповіді.
+Затримка запиту до моделі задається параметром --llm-latency (вимірювання без мережі).
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_grading --llm-latency 1.5
+"""
+import argparse
+import time
+from src.bot.services import grading
+
+# (правильна відповідь, синоніми, відповідь користувача, чи вона правильна)
+CASES = [
+    ("Docker Compose", ["compose", "docker-compose"], "docker compose", True),
+    ("Docker Compose", ["compose", "docker-compose"], "докер компоуз", True),
+    ("Docker Compose", ["compose", "docker-compose"], "Docker-Compose!", True),
+    ("Docker Compose", ["compose", "docker-compose"], "kubernetes", False),
+    ("Dockerfile", ["докерфайл"], "dockerfile", True),
+    ("Dockerfile", ["докерфайл"], "Докерфайл", True),
+    ("Dockerfile", ["докерфайл"], "docker image", False),
+    ("volume", ["том", "volumes"], "Volumes", True),
+    ("volume", ["том", "volumes"], "том", True),
+    ("volume", ["том", "volumes"], "network", False),
+    ("list", ["список"], "список", True),
+    ("list", ["список"], "List", True),
+    ("list", ["список"], "tuple", False),
+    ("list", ["список"], "dict", False),
+    ("декоратор", ["decorator"], "декоратори", True),
+    ("декоратор", ["decorator"], "decorator", True),
+    ("декоратор", ["decorator"], "генератор", None),
+    ("генератор", ["generator"], "генератор", True),
+    ("генератор", ["generator"], "ітератор", None),
+    ("lambda", ["лямбда", "лямбда-функція"], "лямбда", True),
+    ("lambda", ["лямбда", "лямбда-функція"], "анонімна функція", None),
+    ("self", [], "self", True),
+    ("self", [], "this", False),
+    ("Promise", ["проміс"], "проміс", True),
+    ("Promise", ["проміс"], "promise", True),
+    ("Promise", ["проміс"], "callback", False),
+    ("замикання", ["closure"], "closure", True),
+    ("замикання", ["closure"], "замиканя", True),
+    ("замикання", ["closure"], "область видимості", False),
+    ("const", ["константа"], "const", True),
+    ("const", ["константа"], "let", False),
+    ("HTTPS", ["https протокол"], "https", True),
+    ("HTTPS", ["https протокол"], "http", None),
+    ("DNS", ["система доменних імен"], "dns", True),
+    ("DNS", ["система доменних імен"], "доменна система імен", None),
+    ("кеш", ["cache", "кешування"], "кешування", True),
+    ("кеш", ["cache", "кешування"], "cache", True),
+    ("кеш", ["cache", "кешування"], "cookie", False),
+    ("CSS", ["каскадні таблиці стилів"], "css", True),
+    ("CSS", ["каскадні таблиці стилів"], "html", False),
+    ("event loop", ["цикл подій"], "цикл подій", True),
+    ("event loop", ["цикл подій"], "event-loop", True),
+    ("event loop", ["цикл подій"], "потік виконання", False),
+    ("GIL", ["global interpreter lock"], "гіл", True),
+    ("GIL", ["global interpreter lock"], "глобальне блокування інтерпретатора", None),
+    ("pip", [], "pip", True),
+    ("pip", [], "npm", False),
+    ("npm", [], "yarn", False),
+    ("image", ["образ"], "образ", True),
+    ("image", ["образ"], "контейнер", False),
+    # Еталон поруч із запереченням чи другою відповіддю: локально не зараховується
+    ("Docker", [], "не Docker", None),
+    ("Docker", [], "Docker або Kubernetes", None),
+    ("Docker", [], "це Docker", True),
+    ("null", [], "not null", None),
+    ("GIL", ["global interpreter lock"], "точно не GIL", None),
+    ("list", ["список"], "no list", None),
+    ("list", ["список"], "the list", True),
+    ("Docker Compose", ["compose", "docker-compose"], "це docker compose", True),
+    # Оператори: після нормалізації від них нічого не лишається
+    ("===", ["строга рівність"], "===", True),
+    ("===", ["строга рівність"], "==", False),
+    ("=>", ["стрілкова функція"], "=>", True),
+    ("**", ["піднесення до степеня"], "**", True),
+    ("**", ["піднесення до степеня"], "*", False),
+    # Схожі написання з іншим змістом
+    ("C#", [], "C#", True),
+    ("C#", [], "C++", False),
+    ("C#", [], "C", False),
+    ("чай", [], "хай", False),
+    ("asynchronous", ["асинхронний"], "synchronous", False),
+    ("asynchronous", ["асинхронний"], "asynchronus", True),
+    ("Python 3", [], "Python 2", False),
+    ("Python 3", [], "python3", True),
+    ("стабільний", [], "нестабільний", False),
+]
+
+
+def main(llm_latency: float, repeats: int) -> None:
+    local = correct_local = 0
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for answer, aliases, user_answer, _ in CASES:
+            grading.grade(user_answer, answer, aliases)
+    local_latency = (time.perf_counter() - start) / (repeats * len(CASES))
+
+    for answer, aliases, user_answer, expected in CASES:
+        result = grading.grade(user_answer, answer, aliases)
+        if result.verdict == grading.AMBIGUOUS:
+            continue
+        local += 1
+        if expected is not None and (result.verdict == grading.CORRECT) == expected:
+            correct_local += 1
+        elif expected is None:
+            # Розмітка «спірно»: будь-яке локальне рішення вважаємо помилкою
+            print(f"  локально вирішено спірний випадок: {user_answer!r} vs {answer!r} -> {result.verdict}")
+        else:
+            print(f"  помилка: {user_answer!r} vs {answer!r} -> {result.verdict} ({result.confidence:.2f})")
+
+    fraction = local / len(CASES)
+    saved = fraction * llm_latency - local_latency
+    print(f"Відповідей: {len(CASES)}, оцінено локально: {local} ({fraction:.0%})")
+    print(f"Точність локальних рішень: {correct_local}/{local}")
+    print(f"Час локальної перевірки: {local_latency * 1e6:.1f} мкс на відповідь")
+    print(f"Середня економія при затримці моделі {llm_latency:.2f} с: {saved * 1000:.0f} мс на відповідь")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="затримка запиту до моделі, секунди")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+    main(args.llm_latency, args.repeats)
@@ -0,0 +1,122 @@
+"""
+Бенчмарк пам'яті сесій діалогу: компактна DialogueHistory проти попереднього розміщення
+(повний текст промпта в кожній сесії, словник на кожну репліку).
+
+Сесії створюються так, як їх відновлює сховище після перезапуску або витіснення, — через
+pickle, тож у попередньому розміщенні кожна сесія має власну копію промпта особистості
+(в історії і в user_data['personality_prompt']).
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_history_memory --sessions 10000 --turns 12
+"""
+import argparse
+import gc
+import pickle
+import random
+import time
+import tracemalloc
+from src.settings.config import config
+from src.bot.services.history import DialogueHistory, count_tokens
+
+PERSONALITIES = ["talk_cobain", "talk_hawking", "talk_nietzsche", "talk_queen", "talk_tolkien"]
+WORDS = ("відповідь питання розмова всесвіт музика книга філософія людина світло час простір зірка "
+         "пісня гітара слово істина воля сила правда королева дракон кільце мандрівка дорога думка").split()
+
+
+class LegacyHistory:
+    """Розміщення даних DialogueHistory до компактного сховища: промпт у кожній сесії, словник на репліку."""
+
+    def __init__(self, system_prompt: str):
+        self.system_prompt = system_prompt
+        self.system_tokens = count_tokens(system_prompt)
+        self.token_budget = config.history.token_budget
+        self.keep_recent = config.history.keep_recent_turns
+        self.turns: list[dict] = []
+        self.turn_tokens: list[int] = []
+        self.summary = None
+        self.summary_tokens = 0
+        self.summarized_turns = 0
+        self.prompt_tokens_sent = 0
+        self.requests = 0
+        self._summarizing = False
+
+    def append(self, role: str, content: str) -> None:
+        self.turns.append({"role": role, "content": content})
+        self.turn_tokens.append(count_tokens(content))
+
+    def messages(self) -> list[dict]:
+        budget = self.token_budget - self.system_tokens - self.summary_tokens
+        used = 0
+        start = len(self.turns)
+        while start > 0 and (used + self.turn_tokens[start - 1] <= budget or start == len(self.turns)):
+            start -= 1
+            used += self.turn_tokens[start]
+        messages = [{"role": "system", "content": self.system_prompt}]
+        messages.extend(self.turns[start:])
+        self.requests += 1
+        self.prompt_tokens_sent += self.system_tokens + self.summary_tokens + used
+        return messages
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def build_sessions(count: int, turns: int, compact: bool) -> list[bytes]:
+    """Знімки user_data для count сесій (як у сховищі сесій)."""
+    prompts = {key: (config.paths.prompts / f"{key}.txt").read_text(encoding="utf-8") for key in PERSONALITIES}
+    rng = random.Random(3)
+    blobs = []
+    for index in range(count):
+        key = PERSONALITIES[index % len(PERSONALITIES)]
+        history = DialogueHistory(prompts[key]) if compact else LegacyHistory(prompts[key])
+        for _ in range(turns // 2):
+            history.append("user", sentence(rng, 12))
+            history.append("assistant", " ".join(sentence(rng, 15) for _ in range(rng.randint(2, 10))))
+        user_data = {"dialogue_history": history}
+        if compact:
+            user_data["personality"] = key
+        else:
+            user_data["personality_prompt"] = prompts[key]
+        blobs.append(pickle.dumps(user_data, protocol=pickle.HIGHEST_PROTOCOL))
+    return blobs
+
+
+def measure(blobs: list[bytes]) -> tuple[float, list[dict], float]:
+    """Пам'ять відновлених сесій (байт на сесію), самі сесії і час messages() (мкс)."""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    sessions = [pickle.loads(blob) for blob in blobs]
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    sample = sessions[:1000]
+    start = time.perf_counter()
+    for session in sample:
+        session["dialogue_history"].messages()
+    elapsed = time.perf_counter() - start
+    return used / len(sessions), sessions, elapsed / len(sample) * 1e6
+
+
+def main(count: int, turns: int) -> None:
+    print(f"{count} сесій по {turns} реплік, стиснення після {config.history.compress_after_turns} останніх")
+    results = {}
+    for name, compact in (("попереднє розміщення", False), ("компактна історія", True)):
+        blobs = build_sessions(count, turns, compact)
+        per_session, sessions, messages_us = measure(blobs)
+        blob_size = sum(map(len, blobs)) / len(blobs)
+        results[name] = per_session
+        print(f"  {name:22} {per_session / 1024:6.1f} КБ на сесію, {per_session * count / 1024 / 1024:7.1f} МБ разом, "
+              f"знімок {blob_size / 1024:5.1f} КБ, messages() {messages_us:5.1f} мкс")
+        del sessions
+    legacy, compact = results.values()
+    print(f"Пам'ять сесій зменшилась у {legacy / compact:.1f} раза")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--turns", type=int, default=12)
+    args = parser.parse_args()
+    main(args.sessions, args.turns)
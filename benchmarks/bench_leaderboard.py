@@ -0,0 +1,137 @@
+"""
+Бенчмарк рейтингу квізу: оновлення бала, місце користувача і перші 10 місць на мільйоні гравців.
+
+Для кожного розміру створюється база рейтингу (гравець набирав бали в 1–3 темах), Leaderboard
+завантажує її так само, як під час старту бота, і вимірюються:
+- record() — оновлення бала в темі і в загальному рейтингу (як у process_answer);
+- rank() і top(10) — запити /top;
+- flush() — запис пакета змін у SQLite;
+- для порівняння — ті самі запити до SQLite без структури в пам'яті (COUNT за індексом балів).
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_leaderboard --users 10000 100000 1000000
+"""
+import argparse
+import asyncio
+import gc
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.load_test import rss_bytes
+from src.bot.constants import QUIZ_TOPIC_MAPPING
+from src.bot.services.leaderboard import Leaderboard, GLOBAL
+
+TOPICS = list(QUIZ_TOPIC_MAPPING)
+USER_ID_BASE = 10_000_000
+
+
+async def build_database(path: Path, users: int, rng: random.Random) -> int:
+    """Заповнює базу рейтингу; повертає кількість рядків (гравець × тема)."""
+    board = Leaderboard(path, flush_interval=60, batch_size=10 ** 9)
+    now_ms = int(time.time() * 1000)
+    rows = 0
+    chunk: dict = {}
+    for index in range(users):
+        user_id = USER_ID_BASE + index
+        for topic in rng.sample(TOPICS, rng.randint(1, 3)):
+            # Бали з довгим хвостом: більшість гравців має кілька балів, одиниці — сотні
+            chunk[(user_id, topic)] = (int(rng.paretovariate(1.2)), now_ms - rng.randrange(86_400_000 * 30))
+            rows += 1
+        if len(chunk) >= 50_000:
+            board._write_batch(chunk, {})
+            chunk = {}
+    board._write_batch(chunk, {USER_ID_BASE + i: f"Гравець {i}" for i in range(100)})
+    await board.close()
+    return rows
+
+
+def per_call_us(samples: list[float]) -> str:
+    ordered = sorted(samples)
+    return (f"p50 {statistics.median(ordered) * 1e6:6.2f} мкс, "
+            f"p99 {ordered[int(len(ordered) * 0.99)] * 1e6:6.2f} мкс")
+
+
+async def measure_memory(path: Path) -> tuple[Leaderboard, float, int]:
+    gc.collect()
+    before = rss_bytes()
+    board = Leaderboard(path, flush_interval=60, batch_size=10 ** 9)
+    start = time.perf_counter()
+    await board.load()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    return board, elapsed, rss_bytes() - before
+
+
+async def measure(users: int, operations: int) -> None:
+    rng = random.Random(11)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "leaderboard.sqlite3"
+        start = time.perf_counter()
+        rows = await build_database(path, users, rng)
+        print(f"{users} гравців, {rows} рядків (база створена за {time.perf_counter() - start:.1f} с)")
+
+        board, load_time, memory = await measure_memory(path)
+        print(f"  завантаження       {load_time:6.2f} с, пам'ять {memory / 1024 / 1024:6.1f} МБ "
+              f"({memory / users:.0f} Б на гравця)")
+
+        # Активні гравці відповідають частіше: 80% оновлень припадає на 20% гравців
+        active = max(1, users // 5)
+        ids = [USER_ID_BASE + (rng.randrange(active) if rng.random() < 0.8 else rng.randrange(users))
+               for _ in range(operations)]
+        timings = {"record": [], "rank": [], "top": []}
+        for user_id in ids:
+            topic = rng.choice(TOPICS)
+            t0 = time.perf_counter()
+            board.record(user_id, topic, "Гравець")
+            t1 = time.perf_counter()
+            board.board(topic).rank(user_id)
+            t2 = time.perf_counter()
+            board.board(GLOBAL).top(10)
+            t3 = time.perf_counter()
+            timings["record"].append(t1 - t0)
+            timings["rank"].append(t2 - t1)
+            timings["top"].append(t3 - t2)
+        for name, samples in timings.items():
+            print(f"  {name + '()':18} {per_call_us(samples)}")
+
+        pending = board.stats()["pending"]
+        start = time.perf_counter()
+        await board.flush()
+        print(f"  flush()            {(time.perf_counter() - start) * 1000:6.1f} мс на {pending} змін "
+              f"(з {operations} оновлень)")
+        await board.close()
+
+        # Без структури в пам'яті: місце і перші 10 — запитами до SQLite з індексом за балами
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE INDEX quiz_scores_topic_score ON quiz_scores (topic, score)")
+        samples_rank, samples_top = [], []
+        for user_id in ids[:200]:
+            topic = rng.choice(TOPICS)
+            t0 = time.perf_counter()
+            row = conn.execute("SELECT score FROM quiz_scores WHERE user_id = ? AND topic = ?", (user_id, topic)).fetchone()
+            if row is not None:
+                conn.execute("SELECT COUNT(*) + 1 FROM quiz_scores WHERE topic = ? AND score > ?", (topic, row[0])).fetchone()
+            t1 = time.perf_counter()
+            conn.execute("SELECT user_id, score FROM quiz_scores WHERE topic = ? ORDER BY score DESC LIMIT 10", (topic,)).fetchall()
+            t2 = time.perf_counter()
+            samples_rank.append(t1 - t0)
+            samples_top.append(t2 - t1)
+        conn.close()
+        print(f"  SQLite: місце      {per_call_us(samples_rank)}")
+        print(f"  SQLite: перші 10   {per_call_us(samples_top)}")
+
+
+def main(sizes: list[int], operations: int) -> None:
+    for users in sizes:
+        asyncio.run(measure(users, operations))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--operations", type=int, default=100_000, help="оновлень і запитів на кожен розмір")
+    args = parser.parse_args()
+    main(args.users, args.operations)
@@ -0,0 +1,119 @@
+"""
+Бенчмарк вартості одного запису в лог: попереднє налаштування (три синхронні обробники,
+повний текст повідомлення користувача) проти конвеєра з setup_logging (черга, JSON,
+хешування тексту, семплювання подій).
+
+Вимірюється час виклику logger.* у циклі подій — саме стільки обробник оновлення чекає на лог —
+та загальний час до повного запису на диск.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_logging --messages 20000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from loguru import logger
+from src.settings.config import config
+from src.settings.logging_config import setup_logging, flush_logging
+
+USER_TEXT = "Поясни, будь ласка, як працює asyncio і чим він відрізняється від потоків? " * 3
+
+
+def legacy_setup(log_dir: Path) -> None:
+    """Налаштування логування до переходу на конвеєр з чергою (для порівняння)."""
+    logger.remove()
+    logger.configure(patcher=None)
+    fmt = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}"
+    logger.add(sink=log_dir / "app.log", level="INFO", rotation="5 MB", encoding="utf-8", format=fmt)
+    logger.add(sink=log_dir / "error.log", level="WARNING", rotation="5 MB", encoding="utf-8", format=fmt)
+    logger.add(
+        sink=sys.stderr,
+        level="INFO",
+        colorize=True,
+        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:"
+               "<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+    )
+
+
+def legacy_workload(i: int) -> None:
+    user_id = 100_000 + i % 1000
+    if i % 2:
+        logger.info(f"Користувач {user_id} надіслав запит: '{USER_TEXT}'")
+    else:
+        logger.info(f"Користувач {user_id} викликав команду /start.")
+    if i % 100 == 0:
+        logger.warning(f"Запит до моделі для {user_id} повторено")
+
+
+def pipeline_workload(i: int) -> None:
+    user_id = 100_000 + i % 1000
+    if i % 2:
+        logger.bind(event="user_message", user_id=user_id, text=USER_TEXT).info("Користувач надіслав запит.")
+    else:
+        logger.bind(event="command", user_id=user_id).info("Користувач викликав команду /start.")
+    if i % 100 == 0:
+        logger.warning(f"Запит до моделі для {user_id} повторено")
+
+
+def directory_size(path: Path) -> int:
+    return sum(file.stat().st_size for file in path.iterdir() if file.is_file())
+
+
+async def measure(name: str, setup, workload, messages: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        log_dir = Path(tmp)
+        setup(log_dir)
+        durations = []
+        start = time.perf_counter()
+        for i in range(messages):
+            call_start = time.perf_counter()
+            workload(i)
+            durations.append(time.perf_counter() - call_start)
+            if i % 100 == 0:
+                # Даємо циклу подій попрацювати, як між оновленнями в боті
+                await asyncio.sleep(0)
+        caller_total = time.perf_counter() - start
+        await logger.complete()
+        flush_logging(timeout=60)
+        flushed = time.perf_counter() - start
+        size = directory_size(log_dir)
+        logger.remove()
+
+    durations.sort()
+    print(f"{name:28} виклик: сер. {sum(durations) / len(durations) * 1e6:7.1f} мкс  "
+          f"p50 {durations[len(durations) // 2] * 1e6:7.1f}  p99 {durations[int(len(durations) * 0.99)] * 1e6:8.1f}  "
+          f"max {durations[-1] * 1e3:6.1f} мс | цикл {caller_total:5.2f} с, до запису {flushed:5.2f} с, "
+          f"на диску {size / 1024:8.0f} КБ")
+
+
+def pipeline_setup(sample_rates: dict | None = None):
+    def setup(log_dir: Path) -> None:
+        config.paths.logs = log_dir
+        config.logging.level = "INFO"
+        if sample_rates is not None:
+            config.logging.sample_rates = sample_rates
+        setup_logging()
+    return setup
+
+
+async def main(messages: int) -> None:
+    original_rates = dict(config.logging.sample_rates)
+    await measure("попереднє налаштування", legacy_setup, legacy_workload, messages)
+    await measure("конвеєр без семплювання", pipeline_setup({}), pipeline_workload, messages)
+    await measure("конвеєр", pipeline_setup(original_rates), pipeline_workload, messages)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=20000)
+    args = parser.parse_args()
+    # Консольний обробник є в обох налаштуваннях, але його вивід тут не потрібен
+    stdout = sys.stdout
+    sys.stderr = open(os.devnull, "w", encoding="utf-8")
+    print(f"{args.messages} записів (половина з текстом користувача {len(USER_TEXT)} символів, 1% попереджень)",
+          file=stdout)
+    asyncio.run(main(args.messages))
@@ -0,0 +1,106 @@
+"""
+Бенчмарк сховища сесій (SQLitePersistence) на синтетичних користувачах.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_persistence --users 100000
+    python -m benchmarks.bench_persistence --users 100000 --memory
+"""
+import argparse
+import asyncio
+import gc
+import random
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from src.bot.services.history import DialogueHistory
+from src.bot.services.persistence import SQLitePersistence
+
+
+class FakeApplication:
+    """Мінімальна заміна Application: лише user_data та drop_user_data."""
+
+    def __init__(self):
+        self.user_data = defaultdict(dict)
+
+    def drop_user_data(self, user_id: int) -> None:
+        self.user_data.pop(user_id, None)
+
+
+def make_session(user_id: int) -> dict:
+    history = DialogueHistory(f"Системний промпт для особистості {user_id % 5}", token_budget=3000)
+    for turn in range(3):
+        history.append("user", f"Питання {turn} від користувача {user_id}")
+        history.append("assistant", f"Відповідь {turn}: " + "текст відповіді " * 10)
+    return {"dialogue_history": history, "personality": f"talk_{user_id % 5}", "quiz_score": user_id % 7}
+
+
+def traced_mib() -> float:
+    gc.collect()
+    if not tracemalloc.is_tracing():
+        return 0.0
+    return tracemalloc.get_traced_memory()[0] / 1024 / 1024
+
+
+async def main(users: int, hot: int, measure_memory: bool) -> None:
+    db_path = Path(tempfile.mkdtemp()) / "bench.sqlite3"
+    persistence = SQLitePersistence(db_path, flush_interval=5, batch_size=5000, max_hot_sessions=hot,
+                                    idle_ttl=3600, update_interval=0)
+    application = FakeApplication()
+    persistence._application = application
+
+    if measure_memory:
+        tracemalloc.start()
+    baseline = traced_mib()
+
+    # Запис: refresh -> зміна даних -> update_user_data, запис пакетами.
+    # Час рахується лише для викликів сховища, без генерації синтетичних сесій.
+    elapsed = 0.0
+    for user_id in range(users):
+        data = application.user_data[user_id]
+        start = time.perf_counter()
+        await persistence.refresh_user_data(user_id, data)
+        elapsed += time.perf_counter() - start
+        data.update(make_session(user_id))
+        start = time.perf_counter()
+        await persistence.update_user_data(user_id, data)
+        elapsed += time.perf_counter() - start
+    start = time.perf_counter()
+    await persistence.flush()
+    elapsed += time.perf_counter() - start
+    print(f"Запис {users} сесій: {elapsed:.2f} с, {users / elapsed:,.0f} оновлень/с")
+
+    # Без вивантаження (як зараз) усі сесії залишаються в пам'яті
+    all_hot = traced_mib() - baseline
+    evicted = persistence.evict_idle()
+    after_eviction = traced_mib() - baseline
+    if measure_memory:
+        print(f"Пам'ять, усі {users} сесій у пам'яті: {all_hot:.1f} MiB")
+        print(f"Пам'ять після вивантаження ({evicted} вивантажено, {len(application.user_data)} гарячих): "
+              f"{after_eviction:.1f} MiB")
+        tracemalloc.stop()
+
+    # Ліниве підвантаження холодних сесій
+    sample = random.sample(range(users), min(10000, users))
+    latencies = []
+    for user_id in sample:
+        data = application.user_data[user_id]
+        t0 = time.perf_counter()
+        await persistence.refresh_user_data(user_id, data)
+        latencies.append(time.perf_counter() - t0)
+    latencies.sort()
+    print(f"Підвантаження холодної сесії: p50 {latencies[len(latencies) // 2] * 1e6:.0f} мкс, "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1e6:.0f} мкс")
+    print(f"Розмір бази: {db_path.stat().st_size / 1024 / 1024:.1f} MiB")
+    persistence.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--hot", type=int, default=1000)
+    parser.add_argument("--memory", action="store_true",
+                        help="вимірювати пам'ять через tracemalloc (значно сповільнює запис)")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.hot, args.memory))
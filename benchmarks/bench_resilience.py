@@ -0,0 +1,81 @@
+"""
+Перевірка політик викликів моделі (повтори, хеджування, запобіжник) на фейковому сервері OpenAI.
+
+Сценарії:
+    healthy — швидкий сервер без помилок;
+    flaky   — частина запитів отримує 503, їх рятують повтори;
+    slow    — повільний «хвіст» затримок, його зрізає хеджування;
+    down    — сервер недоступний, запобіжник починає відхиляти запити одразу.
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_resilience --requests 200
+"""
+import argparse
+import asyncio
+import time
+import openai
+from src.settings.config import config
+from src.bot.services import llm
+from src.bot.services.resilience import ResilientCaller, CircuitOpenError
+from src.bot.services import resilience
+from benchmarks.fake_openai import FakeOpenAIServer
+
+SCENARIOS = {
+    "healthy": {"latency": 0.02},
+    "flaky": {"latency": 0.02, "error_rate": 0.2},
+    "slow": {"latency": 0.02, "slow_fraction": 0.02, "slow_latency": 1.0},
+    "down": {"latency": 0.01, "error_rate": 1.0},
+}
+
+
+async def run_scenario(name: str, params: dict, requests: int, task: str) -> None:
+    server = FakeOpenAIServer(**params)
+    await server.start()
+    config.openai.base_url = server.base_url
+    config.openai.api_key = "test"
+    config.completion_cache.enabled = False
+    # Свіжий виконавець для кожного сценарію: статистика і запобіжник не переносяться
+    resilience.resilient_caller = llm.resilient_caller = ResilientCaller(
+        config.openai.circuit_failure_threshold, config.openai.circuit_reset_timeout
+    )
+
+    latencies, ok, failed, rejected = [], 0, 0, 0
+    start = time.perf_counter()
+    for i in range(requests):
+        call_start = time.perf_counter()
+        try:
+            await llm.complete([{"role": "user", "content": f"питання {i}"}], task=task)
+            ok += 1
+        except CircuitOpenError:
+            rejected += 1
+        except openai.OpenAIError:
+            failed += 1
+        latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+
+    await llm.close_client(_FakeApplication())
+    await server.stop()
+    latencies.sort()
+    stats = llm.resilient_caller.stats()
+    print(f"{name:8} успішно {ok:4}  помилок {failed:3}  відхилено {rejected:4}  "
+          f"p50 {latencies[len(latencies) // 2] * 1000:6.0f} мс  p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.0f} мс  "
+          f"запитів до сервера {server.requests:4}  повторів {stats['retries']:3}  хеджів {stats['hedges']:3}  "
+          f"час {elapsed:.1f} с")
+
+
+class _FakeApplication:
+    bot_data: dict = {}
+
+
+async def main(requests: int, task: str, scenarios: list[str]) -> None:
+    for name in scenarios:
+        await run_scenario(name, SCENARIOS[name], requests, task)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--task", default="quiz_grade", help="задача з таблиці маршрутів і Settings.openai.policies")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.task, args.scenarios))
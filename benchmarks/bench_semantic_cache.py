@@ -0,0 +1,223 @@
+"""
+Бенчмарк семантичного кешу питань /gpt.
+
+Заповнює кеш синтетичними питаннями (за замовчуванням 100 000) і вимірює:
+- час додавання та пошуку (p50/p99) для перефразованих збережених питань і для нових питань;
+- частку знайдених перефразувань (повнота LSH порівняно з повним перебором матриці);
+- частку хибних збігів на близьких, але інших питаннях (інший термін, заперечення, число);
+- пам'ять індексу, час запису і завантаження знімка.
+
+Запуск з кореня репозиторію (потрібен numpy):
+    python -m benchmarks.bench_semantic_cache --entries 100000 --queries 2000
+"""
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from src.settings.config import config
+from src.bot.services.semantic_cache import SemanticCache, embed
+
+TERMS = [
+    "asyncio", "потоки", "процеси", "GIL", "генератори", "декоратори", "замикання", "контекстні менеджери",
+    "метакласи", "дескриптори", "типізація", "dataclasses", "pydantic", "FastAPI", "Django", "Flask",
+    "SQLAlchemy", "PostgreSQL", "індекси", "транзакції", "Redis", "Kafka", "RabbitMQ", "Docker", "Kubernetes",
+    "Helm", "Terraform", "CI/CD", "git rebase", "git merge", "REST", "GraphQL", "gRPC", "WebSocket", "HTTP/2",
+    "TLS", "OAuth", "JWT", "CORS", "React", "Vue", "TypeScript", "Promise", "event loop", "webpack", "Vite",
+    "pytest", "mock", "профілювання", "кешування", "черги повідомлень", "мікросервіси", "моноліт", "шардинг",
+    "реплікація", "CAP-теорема", "бінарний пошук", "хеш-таблиці", "сортування злиттям", "динамічне програмування",
+]
+TEMPLATES = [
+    "Що таке {a}?", "Що таке {a} і як це пов'язано з {b}?", "Як працює {a} разом з {b}?",
+    "Чим {a} відрізняється від {b}?", "Коли краще використовувати {a}, а коли {b}?",
+    "Поясни {a} на прикладі {b}", "Які переваги {a} порівняно з {b}?", "Як налаштувати {a} для {b}?",
+    "Які типові помилки з {a} при роботі з {b}?", "Як протестувати {a} у проєкті з {b}?",
+    "Як оптимізувати {a}, якщо використовується {b}?", "Напиши приклад {a} з {b}",
+    "Як мігрувати з {b} на {a}?", "Чи можна поєднати {a} і {b}?", "Як дебажити {a} у {b}?",
+    "Які альтернативи {a} для {b}?", "Як {a} впливає на продуктивність {b}?", "Як безпечно використовувати {a} з {b}?",
+    "Які кращі практики {a} для {b}?", "Як пояснити {a} новачку, який знає {b}?", "Навіщо потрібен {a} у {b}?",
+    "Як масштабувати {a} з {b}?", "Як логувати {a} в {b}?", "Як моніторити {a} у зв'язці з {b}?",
+    "Як обробляти помилки {a} в {b}?", "Як документувати {a} для {b}?", "Як розгорнути {a} поруч з {b}?",
+    "Які обмеження {a} при використанні {b}?", "Як вивчити {a}, якщо вже знаєш {b}?", "Як вибрати між {a} та {b}?",
+]
+
+
+def questions(count: int, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    combos = [(template, a, b) for template in TEMPLATES for a in TERMS for b in TERMS if a != b]
+    rng.shuffle(combos)
+    # Шаблони без {b} дають однакові питання, тож лишаємо по одному
+    result = list(dict.fromkeys(template.format(a=a, b=b) for template, a, b in combos))[:count]
+    while len(result) < count:  # більше, ніж дають шаблони: додаємо уточнення
+        result.append(f"{result[len(result) % len(combos)]} (варіант {len(result)})")
+    return result
+
+
+def paraphrase(question: str, rng: random.Random) -> str:
+    """Варіант питання, що відрізняється написанням: регістр, пунктуація, зайві слова, одна помилка."""
+    text = question.rstrip("?")
+    variant = rng.randrange(4)
+    if variant == 0:
+        return text.lower() + "??"
+    if variant == 1:
+        return "Скажи, будь ласка, " + text[0].lower() + text[1:] + "?"
+    if variant == 2:
+        words = text.split()
+        index = rng.randrange(len(words))
+        word = words[index]
+        if len(word) > 3:
+            position = rng.randrange(len(word) - 1)
+            words[index] = word[:position] + word[position + 1] + word[position] + word[position + 2:]
+        return " ".join(words) + "?"
+    return text.upper()
+
+
+# Пари з ручною розміткою: збережене питання і інше питання, що відрізняється одним словом
+NEAR_MISS_PAIRS = [
+    ("Напиши функцію, яка сортує список чисел за зростанням", "Напиши функцію, яка сортує список чисел за спаданням"),
+    ("Чи безпечно пити воду з-під крана?", "Чи небезпечно пити воду з-під крана?"),
+    ("What is the capital city of Australia?", "What is the capital city of Austria?"),
+    ("Поясни різницю між TCP та UDP", "Поясни різницю між TCP та HTTP"),
+    ("Скільки буде 12 помножити на 7?", "Скільки буде 12 помножити на 8?"),
+    ("Чи можна використовувати Redis як основну базу даних?", "Чи не можна використовувати Redis як основну базу даних?"),
+    ("Як встановити Python 3.11 на Ubuntu?", "Як встановити Python 3.12 на Ubuntu?"),
+    ("Is Python slower than Java?", "Is Python faster than Java?"),
+    ("Чому виникає холод?", "Чому виникає голод?"),
+    ("What is a hat?", "What is a chat?"),
+    ("Як працює керування пам'яттю в C#?", "Як працює керування пам'яттю в C++?"),
+    ("Як працює керування пам'яттю в C#?", "Як працює керування пам'яттю в C?"),
+    ("Що таке Python 3?", "Що таке Python 2?"),
+]
+
+
+def near_misses(stored: list[str], count: int, rng: random.Random) -> list[str]:
+    """Збережені питання з одним зміненим терміном, запереченням або числом."""
+    result = []
+    while len(result) < count:
+        question = rng.choice(stored)
+        terms = [term for term in TERMS if term in question]
+        variant = rng.randrange(3)
+        if variant == 0 and terms:
+            term = rng.choice(terms)
+            result.append(question.replace(term, rng.choice([other for other in TERMS if other not in question]), 1))
+        elif variant == 1 and question.startswith("Чи можна"):
+            result.append(question.replace("Чи можна", "Чи не можна", 1))
+        elif variant == 1:
+            result.append(question.replace(" ", " не ", 1))
+        else:
+            result.append(f"{question.rstrip('?')} у версії {rng.randrange(2, 9)}?")
+    return result
+
+
+def timed(call, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = call(*args)
+    return time.perf_counter() - start, result
+
+
+def summary(durations: list[float]) -> str:
+    durations = sorted(durations)
+    return (f"p50 {durations[len(durations) // 2] * 1e6:7.0f} мкс, "
+            f"p99 {durations[int(len(durations) * 0.99)] * 1e6:7.0f} мкс")
+
+
+def main(entries: int, queries: int, threshold: float, dim: int, tables: int, bits: int) -> None:
+    rng = random.Random(2)
+    stored = questions(entries)
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = Path(tmp) / "semantic_cache.npz"
+        options = dict(capacity=entries, dim=dim, tables=tables, bits=bits, threshold=threshold,
+                       snapshot_path=snapshot_path)
+        cache = SemanticCache(**options)
+
+        start = time.perf_counter()
+        for index, question in enumerate(stored):
+            cache.add(question, f"відповідь {index}")
+        added = time.perf_counter() - start
+        index_bytes = (cache._vectors.nbytes + cache._scales.nbytes + cache._signatures.nbytes
+                       + cache._scopes.nbytes + cache._expires_at.nbytes + cache._last_used.nbytes)
+        print(f"Додано {entries} питань за {added:.1f} с ({added / entries * 1e6:.0f} мкс на питання), "
+              f"масиви індексу {index_bytes / 1024 / 1024:.0f} МБ, кошиків LSH: "
+              f"{sum(len(buckets) for buckets in cache._buckets)}")
+
+        # Перефразовані збережені питання: LSH проти повного перебору матриці
+        sample = rng.sample(range(entries), queries)
+        # Еталон: точні float32-вектори і повний перебір матриці
+        matrix = np.stack([embed(question, cache.dim) for question in stored])
+        lsh_times, brute_times, candidates = [], [], 0
+        found = wrong = brute_found = brute_wrong = 0
+        for row in sample:
+            query = paraphrase(stored[row], rng)
+            duration, result = timed(cache.search, query)
+            lsh_times.append(duration)
+            if result is not None and result[1] >= threshold:
+                found += result[0] == f"відповідь {row}"
+                wrong += result[0] != f"відповідь {row}"
+            vector = embed(query, cache.dim)
+            candidates += len(cache._candidates(cache._signature(vector[None, :])[0]))
+            duration, scores = timed(lambda: matrix @ vector)
+            brute_times.append(duration)
+            best = int(np.argmax(scores))
+            if scores[best] >= threshold:
+                brute_found += best == row
+                brute_wrong += best != row
+        print(f"\nПерефразовані питання ({queries}), поріг {threshold}:")
+        print(f"  LSH, int8:               {summary(lsh_times)}, знайдено {found / queries:.1%}, "
+              f"чужа відповідь {wrong / queries:.1%}, у середньому {candidates / queries:.0f} кандидатів")
+        print(f"  повний перебір, float32: {summary(brute_times)}, знайдено {brute_found / queries:.1%}, "
+              f"чужа відповідь {brute_wrong / queries:.1%}")
+
+        # Нові питання, яких у кеші немає: кеш не повинен повертати чужу відповідь
+        fresh = [f"Як приготувати {word} на вечерю для {count} людей?"
+                 for count, word in enumerate(["борщ", "вареники", "пасту", "плов", "салат"] * (queries // 5))]
+        fresh_times, false_hits = [], 0
+        for query in fresh:
+            duration, result = timed(cache.search, query)
+            fresh_times.append(duration)
+            false_hits += result is not None and result[1] >= threshold
+        print(f"Нові питання ({len(fresh)}): {summary(fresh_times)}, хибних збігів {false_hits}")
+
+        # Близькі, але інші питання: відповідь на збережене питання для них неправильна
+        answers = {question: f"відповідь {index}" for index, question in enumerate(stored)}
+        near = near_misses(stored, queries, rng)
+        near_hits = near_wrong = 0
+        for query in near:
+            result = cache.search(query)
+            if result is not None and result[1] >= threshold:
+                # Змінене питання могло збігтися з іншим збереженим — тоді його відповідь правильна
+                near_hits += 1
+                near_wrong += result[0] != answers.get(query)
+        print(f"Близькі інші питання ({len(near)}): хибних збігів {near_wrong / len(near):.1%} "
+              f"(усього збігів {near_hits / len(near):.1%})")
+        paired = SemanticCache(**{**options, "snapshot_path": None})
+        for index, (question, _) in enumerate(NEAR_MISS_PAIRS):
+            paired.add(question, f"пара {index}")
+        pair_hits = 0
+        for question, other in NEAR_MISS_PAIRS:
+            vector_similarity = float(embed(question, dim) @ embed(other, dim))
+            result = paired.search(other)
+            served = result is not None and result[1] >= threshold
+            pair_hits += served
+            print(f"  {vector_similarity:.3f} {'ВИДАНО' if served else 'пропущено':9} {question!r} -> {other!r}")
+        print(f"Пари з розміткою: хибних збігів {pair_hits} з {len(NEAR_MISS_PAIRS)}")
+
+        duration, _ = timed(lambda: cache._write_snapshot(cache._snapshot()))
+        print(f"\nЗнімок: запис {duration:.2f} с, {snapshot_path.stat().st_size / 1024 / 1024:.0f} МБ")
+        restored = SemanticCache(**options)
+        duration, loaded = timed(restored.load)
+        check = restored.search(stored[sample[0]])
+        print(f"Завантаження {loaded} записів: {duration:.2f} с, перевірка пошуку: "
+              f"{'ок' if check and check[0] == f'відповідь {sample[0]}' else 'не знайдено'}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=config.semantic_cache.threshold)
+    parser.add_argument("--dim", type=int, default=config.semantic_cache.dim)
+    parser.add_argument("--tables", type=int, default=config.semantic_cache.tables)
+    parser.add_argument("--bits", type=int, default=config.semantic_cache.bits)
+    args = parser.parse_args()
+    main(args.entries, args.queries, args.threshold, args.dim, args.tables, args.bits)
@@ -0,0 +1,154 @@
+"""
+Бенчмарк холодного старту: час від запуску процесу до першого обробленого оновлення.
+
+Запускає бота окремим процесом у режимі long polling проти локального фейкового Bot API
+(benchmarks.fake_telegram). Перший getUpdates повертає /start, і вимірюється час від запуску
+процесу до першого повідомлення бота у відповідь. Режими:
+- eager — прогрів (імпорт шару моделі, команди бота) до початку обробки оновлень,
+  як було раніше (STARTUP_BACKGROUND_WARMUP=0, без збереженого відбитка команд);
+- lazy, cold — прогрів у фоні, команди ще не встановлені (перший запуск);
+- lazy, restart — прогрів у фоні, відбиток команд збережено (перезапуск, масштабування).
+
+Запуск з кореня репозиторію:
+    python -m benchmarks.bench_startup --runs 5 --latency 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from benchmarks.fake_telegram import FakeTelegramServer, _MESSAGE_METHODS
+
+CHAT_ID = 42
+START_UPDATE = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": CHAT_ID, "type": "private"},
+        "from": {"id": CHAT_ID, "is_bot": False, "first_name": "Startup"},
+        "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    },
+}
+
+
+class StartupProbe(FakeTelegramServer):
+    """Фейковий Bot API, що віддає /start у першому getUpdates і фіксує першу відповідь бота."""
+
+    def __init__(self, latency: float):
+        super().__init__(latency=latency)
+        self.delivered = False
+        self.first_reply = asyncio.Event()
+
+    def result(self, method: str, fields: dict[str, str]):
+        if method == "getUpdates":
+            if self.delivered:
+                return []
+            self.delivered = True
+            return [START_UPDATE]
+        if method in _MESSAGE_METHODS and fields.get("chat_id") == str(CHAT_ID):
+            self.first_reply.set()
+        return super().result(method, fields)
+
+    async def _respond(self, writer, method: str, fields: dict[str, str]) -> None:
+        if method == "getUpdates" and self.delivered:
+            # Довге опитування без нових оновлень: не даємо процесу крутитися в циклі
+            await asyncio.sleep(1)
+        await super()._respond(writer, method, fields)
+
+
+def run_child(base_url: str, state_dir: str, background: bool) -> None:
+    """Процес бота: те саме, що main(), але з Bot API на фейковому сервері."""
+    started = float(os.environ["STARTUP_BENCH_T0"])
+    from src.bot.services.workers import apply_overrides
+
+    state = Path(state_dir)
+    apply_overrides({
+        "bot_api_key": "123456:STARTUP",
+        "openai.api_key": "test",
+        "persistence.db_path": state / "bot_state.sqlite3",
+        "leaderboard.db_path": state / "leaderboard.sqlite3",
+        "completion_cache.disk_enabled": False,
+        "media.cache_file": state / "media_file_ids.json",
+        "metrics.enabled": False,
+        "logging.level": "WARNING",
+        "paths.logs": state / "logs",
+        "startup.commands_hash_file": state / "bot_commands.sha256",
+        "startup.background_warmup": background,
+        "startup.warm_up_connections": False,
+    })
+    from src.settings.logging_config import setup_logging
+    from src.bot.services.resources import resource_registry
+    from src.main import build_application
+
+    imported = time.time() - started
+    setup_logging()
+    resource_registry.load_all()
+    application = build_application(bot_api_url=base_url)
+    print(json.dumps({"import": imported}), flush=True)
+    application.run_polling(poll_interval=0, timeout=1)
+
+
+async def measure(server: StartupProbe, state_dir: str, background: bool) -> tuple[float, float]:
+    server.delivered = False
+    server.first_reply.clear()
+    env = {**os.environ, "STARTUP_BENCH_T0": repr(time.time())}
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "benchmarks.bench_startup", "--child", server.base_url, state_dir,
+        "--background" if background else "--eager",
+        env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        await asyncio.wait_for(server.first_reply.wait(), timeout=60)
+        elapsed = time.perf_counter() - start
+        line = await asyncio.wait_for(process.stdout.readline(), timeout=5)
+        return elapsed, json.loads(line)["import"]
+    finally:
+        process.terminate()
+        await process.wait()
+
+
+async def main(runs: int, latency: float) -> None:
+    server = StartupProbe(latency)
+    await server.start()
+    print(f"Затримка Bot API: {latency * 1000:.0f} мс, запусків у кожному режимі: {runs}")
+    try:
+        for name, background, keep_hash in (("eager", False, False), ("lazy, cold", True, False),
+                                             ("lazy, restart", True, True)):
+            totals, imports = [], []
+            with tempfile.TemporaryDirectory() as state_dir:
+                if keep_hash:
+                    await measure(server, state_dir, background)  # перший запуск зберігає відбиток команд
+                for _ in range(runs):
+                    if not keep_hash:
+                        Path(state_dir, "bot_commands.sha256").unlink(missing_ok=True)
+                    server.calls.clear()
+                    total, imported = await measure(server, state_dir, background)
+                    totals.append(total)
+                    imports.append(imported)
+                set_commands = server.calls["setMyCommands"]
+            print(f"  {name:14} до першої відповіді: медіана {statistics.median(totals) * 1000:5.0f} мс "
+                  f"(min {min(totals) * 1000:5.0f}), імпорт src.main {statistics.median(imports) * 1000:4.0f} мс, "
+                  f"setMyCommands в останньому запуску: {set_commands}")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="затримка кожного запиту до Bot API, секунди")
+    parser.add_argument("--child", nargs=2, metavar=("BOT_API_URL", "STATE_DIR"), help=argparse.SUPPRESS)
+    parser.add_argument("--background", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(*args.child, background=args.background)
+    else:
+        asyncio.run(main(args.runs, args.latency))
@@ -0,0 +1,158 @@
+"""
+Локальний фейковий сервер OpenAI Chat Completions для перевірки бота без мережі.
+
+Підтримує POST /v1/chat/completions (звичайний і потоковий режим) і дозволяє задати
+затримку (фіксовану або логнормальну з медіаною latency), «повільний хвіст», паузу між
+фрагментами потокової відповіді, частку помилок 503, недоступність окремих моделей або всього сервера.
+
+Запуск окремо (бот підключається через OPENAI_BASE_URL=http://127.0.0.1:8900/v1):
+    python -m benchmarks.fake_openai --port 8900 --latency 0.3 --error-rate 0.1
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+
+
+class FakeOpenAIServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.05, slow_fraction: float = 0.0,
+                 slow_latency: float = 2.0, error_rate: float = 0.0, seed: int = 1, latency_sigma: float = 0.0,
+                 chunk_delay: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.latency_sigma = latency_sigma  # > 0 — логнормальний розподіл затримки
+        self.chunk_delay = chunk_delay  # пауза між фрагментами потокової відповіді
+        self.down = False  # True — усі запити отримують 503
+        self.failing_models: set[str] = set()  # моделі, які завжди «перевантажені»
+        self.requests = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def sample_latency(self) -> float:
+        if self._random.random() < self.slow_fraction:
+            return self.slow_latency
+        if self.latency_sigma > 0 and self.latency > 0:
+            return self._random.lognormvariate(math.log(self.latency), self.latency_sigma)
+        return self.latency
+
+    def reply_text(self, body: dict) -> str:
+        """Текст відповіді; для запитів з JSON-форматом — пакет унікальних питань і фактів."""
+        messages = body.get("messages", [])
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            n = self.requests
+            return json.dumps({
+                "questions": [{"question": f"Питання {n}-{i}?", "answer": f"відповідь {i}", "aliases": []}
+                              for i in range(5)],
+                "facts": [f"Факт {n}-{i}: " + " ".join(f"слово{(n * 10 + i) * 8 + k}" for k in range(8))
+                          for i in range(10)],
+            }, ensure_ascii=False)
+        last = messages[-1]["content"] if messages else ""
+        return f"Відповідь на: {last[:80]}"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = json.loads(await reader.readexactly(length)) if length else {}
+                await self._respond(writer, body)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, body: dict) -> None:
+        self.requests += 1
+        await asyncio.sleep(self.sample_latency())
+        if self.down or body.get("model") in self.failing_models or self._random.random() < self.error_rate:
+            self.errors += 1
+            payload = json.dumps({"error": {"message": "overloaded", "type": "server_error"}}).encode()
+            writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+            await writer.drain()
+            return
+
+        text = self.reply_text(body)
+        created = int(time.time())
+        if not body.get("stream"):
+            payload = json.dumps({
+                "id": f"chatcmpl-{self.requests}", "object": "chat.completion", "created": created,
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": text}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 10, "total_tokens": 20},
+            }, ensure_ascii=False).encode("utf-8")
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+            await writer.drain()
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nTransfer-Encoding: chunked\r\n\r\n")
+        for word in text.split(" "):
+            chunk = {"id": f"chatcmpl-{self.requests}", "object": "chat.completion.chunk", "created": created,
+                     "model": body.get("model", "fake"),
+                     "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+            self._write_chunk(writer, f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            await writer.drain()
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+        self._write_chunk(writer, b"data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    @staticmethod
+    def _write_chunk(writer: asyncio.StreamWriter, data: bytes) -> None:
+        writer.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+
+async def _serve(args) -> None:
+    server = FakeOpenAIServer(port=args.port, latency=args.latency, slow_fraction=args.slow_fraction,
+                              slow_latency=args.slow_latency, error_rate=args.error_rate,
+                              latency_sigma=args.latency_sigma, chunk_delay=args.chunk_delay)
+    await server.start()
+    print(f"Фейковий OpenAI слухає {server.base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--slow-fraction", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
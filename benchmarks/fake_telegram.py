@@ -0,0 +1,154 @@
+"""
+Локальний фейковий сервер Bot API для навантажувальних тестів без мережі.
+
+Приймає POST /bot<token>/<method> у форматі application/x-www-form-urlencoded
+або multipart/form-data (завантаження файлів) і відповідає так, як відповів би Telegram:
+getMe — фейковий бот, send*/edit* — повідомлення з новим message_id, решта методів — True.
+Затримку відповіді можна задати, кількість викликів кожного методу рахується.
+
+Запуск окремо (бот підключається через builder.base_url("http://127.0.0.1:8901/bot")):
+    python -m benchmarks.fake_telegram --port 8901 --latency 0.02
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+from urllib.parse import parse_qsl
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+
+_MESSAGE_METHODS = {"sendMessage", "sendPhoto", "editMessageText", "editMessageCaption", "editMessageReplyMarkup"}
+_NAME_RE = re.compile(rb'name="([^"]+)"')
+
+
+class FakeTelegramServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 seed: int = 1):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.calls: Counter[str] = Counter()
+        self._message_ids: Counter[int] = Counter()
+        self._file_ids = 0
+        self._random = random.Random(seed)
+        self._server: asyncio.AbstractServer | None = None
+
+    @property
+    def base_url(self) -> str:
+        """Адреса для ApplicationBuilder.base_url (токен і метод PTB додає сам)."""
+        return f"http://{self.host}:{self.port}/bot"
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def last_message_id(self, chat_id: int) -> int:
+        """message_id останнього повідомлення бота в чаті (для кнопок під ним)."""
+        return self._message_ids[chat_id] or 1
+
+    @staticmethod
+    def parse_form(content_type: str, body: bytes) -> dict[str, str]:
+        """Текстові поля запиту (файли з multipart ігноруються)."""
+        if content_type.startswith("multipart/form-data"):
+            boundary = content_type.split("boundary=", 1)[1].strip('"').encode()
+            fields = {}
+            for part in body.split(b"--" + boundary):
+                head, _, value = part.partition(b"\r\n\r\n")
+                match = _NAME_RE.search(head)
+                if match is None or b"filename=" in head:
+                    continue
+                fields[match.group(1).decode()] = value.rstrip(b"\r\n").decode("utf-8", "replace")
+            return fields
+        if content_type.startswith("application/json"):
+            return {key: value if isinstance(value, str) else json.dumps(value)
+                    for key, value in json.loads(body or b"{}").items()}
+        return dict(parse_qsl(body.decode("utf-8")))
+
+    def result(self, method: str, fields: dict[str, str]):
+        """Результат методу Bot API у форматі Telegram."""
+        if method == "getMe":
+            return BOT_USER
+        if method not in _MESSAGE_METHODS:
+            return True
+        chat_id = int(fields.get("chat_id", 0))
+        if method.startswith("edit") and "message_id" in fields:
+            message_id = int(fields["message_id"])
+        else:
+            self._message_ids[chat_id] += 1
+            message_id = self._message_ids[chat_id]
+        message = {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": BOT_USER,
+        }
+        if method == "sendPhoto":
+            self._file_ids += 1
+            message["photo"] = [{"file_id": f"fake-photo-{self._file_ids}", "file_unique_id": f"u{self._file_ids}",
+                                 "width": 640, "height": 480}]
+            if "caption" in fields:
+                message["caption"] = fields["caption"]
+        else:
+            message["text"] = fields.get("text") or fields.get("caption") or ""
+        return message
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                path = lines[0].split(" ")[1]
+                headers = {}
+                for line in lines[1:]:
+                    if ":" in line:
+                        name, value = line.split(":", 1)
+                        headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+                method = path.rstrip("/").rsplit("/", 1)[-1]
+                fields = self.parse_form(headers.get("content-type", ""), body)
+                await self._respond(writer, method, fields)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer: asyncio.StreamWriter, method: str, fields: dict[str, str]) -> None:
+        self.calls[method] += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        payload = json.dumps({"ok": True, "result": self.result(method, fields)}, ensure_ascii=False).encode("utf-8")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                     b"Content-Length: " + str(len(payload)).encode() + b"\r\n\r\n" + payload)
+        await writer.drain()
+
+
+async def _serve(args) -> None:
+    server = FakeTelegramServer(port=args.port, latency=args.latency, jitter=args.jitter)
+    await server.start()
+    print(f"Фейковий Bot API слухає {server.base_url}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
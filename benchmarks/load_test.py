@@ -0,0 +1,392 @@
+"""
+Навантажувальний тест бота без мережі.
+
+Запускає справжній Application з src/main.py проти локального фейкового Bot API
+(benchmarks.fake_telegram) і фейкового OpenAI (benchmarks.fake_openai) та програє сценарії
+користувачів через /start, /gpt, /talk, /quiz і /random з заданою кількістю одночасних сесій.
+
+Звіт: пропускна здатність, p50/p95/p99 часу обробки оновлень (окремо для кожного кроку),
+затримка циклу подій і пам'ять на одну сесію.
+
+З --workers N оновлення розподіляються між N процесами-обробниками через WorkerPool,
+як у режимі WORKERS > 1 (для пам'яті рахується сумарний RSS обробників).
+
+Запуск з кореня репозиторію (підходить для CI):
+    python -m benchmarks.load_test --users 200 --concurrency 50 --openai-latency 0.3 --openai-sigma 0.5
+    python -m benchmarks.load_test --users 400 --concurrency 100 --workers 4
+"""
+import argparse
+import asyncio
+import gc
+import itertools
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+from telegram import Update
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.webhook import Overloaded
+from src.bot.services.workers import WorkerPool, apply_overrides
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fake_telegram import FakeTelegramServer
+
+# Кроки сценарію: ("command", "/gpt"), ("text", "..."), ("callback", "end_gpt_dialogue")
+JOURNEYS = {
+    "start": [("command", "/start"), ("callback", "start")],
+    "gpt": [("command", "/gpt"), ("text", "Що таке asyncio?"), ("text", "А чим він кращий за потоки?"),
+            ("callback", "end_gpt_dialogue")],
+    "talk": [("command", "/talk"), ("callback", "talk_cobain"), ("text", "Привіт! Як справи?"),
+             ("text", "Розкажи про музику."), ("callback", "end_talk")],
+    "quiz": [("command", "/quiz"), ("callback", "quiz_python"), ("text", "відповідь 1"),
+             ("callback", "ask_another_question"), ("text", "відповідь 2"), ("callback", "end_quiz"),
+             ("command", "/top")],
+    "random": [("command", "/random"), ("callback", "random")],
+}
+
+USER_ID_BASE = 100_000
+
+
+def percentile(ordered: list[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else 0.0
+
+
+def rss_bytes(pid: int | str = "self") -> int:
+    """Поточний RSS процесу (0, якщо /proc недоступний)."""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class LoopLagMonitor:
+    """Вимірює, наскільки пізніше за заплановане прокидається корутина з asyncio.sleep(interval)."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples: list[float] = []
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+
+
+class UpdateFactory:
+    """Будує оновлення Telegram від імені віртуальних користувачів."""
+
+    def __init__(self, telegram: FakeTelegramServer):
+        self.telegram = telegram
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    @staticmethod
+    def _user(user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def build(self, user_id: int, kind: str, payload: str) -> dict:
+        user = self._user(user_id)
+        chat = {"id": user_id, "type": "private", "first_name": user["first_name"]}
+        now = int(time.time())
+        update = {"update_id": next(self._update_ids)}
+        if kind == "callback":
+            update["callback_query"] = {
+                "id": str(update["update_id"]),
+                "from": user,
+                "chat_instance": str(user_id),
+                "data": payload,
+                "message": {"message_id": self.telegram.last_message_id(user_id), "date": now, "chat": chat,
+                            "from": {"id": 1, "is_bot": True, "first_name": "Fake"}, "text": "menu"},
+            }
+            return update
+        message = {"message_id": next(self._message_ids), "date": now, "chat": chat, "from": user, "text": payload}
+        if kind == "command":
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(payload.split()[0])}]
+        update["message"] = message
+        return update
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.openai = FakeOpenAIServer(latency=args.openai_latency, latency_sigma=args.openai_sigma,
+                                       slow_fraction=args.openai_slow_fraction, slow_latency=args.openai_slow_latency,
+                                       error_rate=args.openai_error_rate, chunk_delay=args.chunk_delay)
+        self.telegram = FakeTelegramServer(latency=args.telegram_latency, jitter=args.telegram_jitter)
+        self.factory = UpdateFactory(self.telegram)
+        self.lag = LoopLagMonitor()
+        self.application = None
+        self.pool: WorkerPool | None = None
+        self._pending: dict[int, tuple[float, asyncio.Future]] = {}
+        # крок -> [(час у черзі + обробка, лише обробка)]
+        self.latencies: dict[str, list[tuple[float, float]]] = defaultdict(list)
+        self.errors = 0
+        self.journeys_done = 0
+
+    def _overrides(self, tmp_dir: Path) -> dict:
+        """
+        Спрямовує бота на фейкові сервери, а стан — у тимчасовий каталог.
+
+        Застосовується до імпорту сервісів (і в кожному процесі-обробнику), тож об'єкти-одинаки
+        створюються вже з цими налаштуваннями.
+        """
+        overrides = {
+            "bot_api_key": "123456:LOADTEST",
+            "openai.api_key": "test",
+            "openai.base_url": self.openai.base_url,
+            "persistence.db_path": tmp_dir / "bot_state.sqlite3",
+            "leaderboard.db_path": tmp_dir / "leaderboard.sqlite3",
+            "completion_cache.disk_enabled": False,
+            "media.warmup_chat_id": None,
+            "media.cache_file": tmp_dir / "media_file_ids.json",
+            "startup.commands_hash_file": tmp_dir / "bot_commands.sha256",
+            # Шар моделі імпортується до першого сценарію, щоб пам'ять і затримки стосувалися лише навантаження
+            "startup.background_warmup": False,
+            "metrics.port": 0,  # вільний порт, щоб не конфліктувати із запущеним ботом
+            "logging.level": self.args.log_level,
+            "paths.logs": tmp_dir / "logs",
+        }
+        if self.args.no_rate_limits:
+            overrides["outbound.enabled"] = False
+        if self.args.debounce is not None:
+            overrides["coalescing.debounce"] = self.args.debounce
+        return overrides
+
+    async def _build(self) -> None:
+        from src.main import build_application
+        from src.bot.services.resources import resource_registry
+
+        resource_registry.load_all()
+        application = build_application(use_updater=False, bot_api_url=self.telegram.base_url)
+        original = application.process_update
+
+        async def timed_process_update(update: object) -> None:
+            started = time.perf_counter()
+            try:
+                await original(update)
+            finally:
+                pending = self._pending.pop(getattr(update, "update_id", None), None)
+                if pending is not None:
+                    enqueued, future = pending
+                    future.set_result((time.perf_counter() - enqueued, time.perf_counter() - started))
+
+        async def count_error(update: object, context) -> None:
+            self.errors += 1
+            if self.errors <= 5:
+                logger.warning(f"Помилка обробника: {context.error!r}")
+
+        # Application викликає self.process_update, тож обгортка на екземплярі бачить кожне оновлення
+        application.process_update = timed_process_update
+        application.add_error_handler(count_error)
+        await application.initialize()
+        await application.post_init(application)
+        await application.start()
+        self.application = application
+
+    def _on_processed(self, update_id: int, handler_duration: float) -> None:
+        pending = self._pending.pop(update_id, None)
+        if pending is not None:
+            enqueued, future = pending
+            future.set_result((time.perf_counter() - enqueued, handler_duration))
+
+    async def _start_pool(self, overrides: dict) -> None:
+        self.pool = WorkerPool(
+            count=self.args.workers,
+            queue_size=config.workers.queue_size,
+            restart_backoff=config.workers.restart_backoff,
+            restart_backoff_max=config.workers.restart_backoff_max,
+            stable_after=config.workers.stable_after,
+            bot_api_url=self.telegram.base_url,
+            overrides=overrides,
+            ack=True,
+            on_processed=self._on_processed
+        )
+        await self.pool.start()
+        deadline = time.monotonic() + 120
+        while len(self.pool.ready_workers) < self.args.workers:
+            if time.monotonic() > deadline:
+                raise SystemExit("Обробники не запустилися за 120 с")
+            await asyncio.sleep(0.1)
+
+    async def _shutdown(self) -> None:
+        if self.pool is not None:
+            await self.pool.drain(config.workers.drain_timeout)
+            return
+        application = self.application
+        await application.stop()
+        await application.shutdown()
+        await application.post_shutdown(application)
+
+    async def _enqueue(self, data: dict) -> None:
+        if self.pool is None:
+            await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+            return
+        while True:
+            try:
+                self.pool.dispatch(data)
+                return
+            except Overloaded:
+                await asyncio.sleep(0.01)
+
+    async def send(self, user_id: int, kind: str, payload: str, label: str) -> None:
+        data = self.factory.build(user_id, kind, payload)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[data["update_id"]] = (time.perf_counter(), future)
+        await self._enqueue(data)
+        try:
+            total, handler = await asyncio.wait_for(future, timeout=self.args.step_timeout)
+        except asyncio.TimeoutError:
+            self._pending.pop(data["update_id"], None)
+            self.errors += 1
+            return
+        self.latencies[label].append((total, handler))
+
+    async def run_user(self, index: int, journey: str, semaphore: asyncio.Semaphore) -> None:
+        async with semaphore:
+            user_id = USER_ID_BASE + index
+            for step, (kind, payload) in enumerate(JOURNEYS[journey]):
+                await self.send(user_id, kind, payload, f"{journey}:{step}:{payload.split()[0][:24]}")
+                if self.args.think:
+                    await asyncio.sleep(self.args.think)
+            self.journeys_done += 1
+
+    async def run(self) -> None:
+        journeys = self.args.journeys.split(",")
+        unknown = set(journeys) - JOURNEYS.keys()
+        if unknown:
+            raise SystemExit(f"Невідомі сценарії: {', '.join(sorted(unknown))}")
+
+        await self.openai.start()
+        await self.telegram.start()
+        with tempfile.TemporaryDirectory() as tmp:
+            overrides = self._overrides(Path(tmp))
+            if self.args.workers > 1:
+                await self._start_pool(overrides)
+            else:
+                apply_overrides(overrides)
+                await self._build()
+            try:
+                await self._measure(journeys)
+            finally:
+                await self._shutdown()
+        await self.telegram.stop()
+        await self.openai.stop()
+
+    def _rss(self) -> int:
+        if self.pool is not None:
+            return sum(rss_bytes(pid) for pid in self.pool.pids())
+        return rss_bytes()
+
+    async def _measure(self, journeys: list[str]) -> None:
+        gc.collect()
+        rss_before = self._rss()
+        if self.args.tracemalloc:
+            tracemalloc.start()
+        traced_before = tracemalloc.get_traced_memory()[0] if self.args.tracemalloc else 0
+
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        self.lag.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(self.run_user(i, journeys[i % len(journeys)], semaphore)
+                               for i in range(self.args.users)))
+        elapsed = time.perf_counter() - started
+        self.lag.stop()
+
+        gc.collect()
+        rss_after = self._rss()
+        traced_after = tracemalloc.get_traced_memory()[0] if self.args.tracemalloc else 0
+        if self.args.tracemalloc:
+            tracemalloc.stop()
+        self.report(elapsed, rss_after - rss_before, traced_after - traced_before)
+
+    def report(self, elapsed: float, rss_delta: int, traced_delta: int) -> None:
+        updates = sum(len(samples) for samples in self.latencies.values())
+        users = self.args.users
+        print(f"\nКористувачів: {users}, одночасно: {self.args.concurrency}, сценарії: {self.args.journeys}, "
+              f"процесів: {self.args.workers}")
+        print(f"Час: {elapsed:.2f} с, оновлень: {updates} ({updates / elapsed:.1f}/с), "
+              f"сценаріїв: {self.journeys_done} ({self.journeys_done / elapsed:.1f}/с), помилок: {self.errors}")
+
+        print(f"\n{'крок':40} {'n':>6} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8} {'обробка p95':>12}")
+        all_total, all_handler = [], []
+        for label in sorted(self.latencies):
+            total = sorted(sample[0] for sample in self.latencies[label])
+            handler = sorted(sample[1] for sample in self.latencies[label])
+            all_total += total
+            all_handler += handler
+            print(f"{label:40} {len(total):6} {percentile(total, 0.5) * 1000:8.1f} "
+                  f"{percentile(total, 0.95) * 1000:8.1f} {percentile(total, 0.99) * 1000:8.1f} "
+                  f"{percentile(handler, 0.95) * 1000:12.1f}")
+        all_total.sort()
+        all_handler.sort()
+        print(f"{'усі':40} {len(all_total):6} {percentile(all_total, 0.5) * 1000:8.1f} "
+              f"{percentile(all_total, 0.95) * 1000:8.1f} {percentile(all_total, 0.99) * 1000:8.1f} "
+              f"{percentile(all_handler, 0.95) * 1000:12.1f}")
+
+        lag = sorted(self.lag.samples)
+        print(f"\nЗатримка циклу подій: p50 {percentile(lag, 0.5) * 1000:.1f} мс, "
+              f"p99 {percentile(lag, 0.99) * 1000:.1f} мс, max {(lag[-1] if lag else 0) * 1000:.1f} мс")
+
+        print(f"Пам'ять: RSS +{rss_delta / 1024 / 1024:.1f} МБ, ~{rss_delta / users / 1024:.1f} КБ на сесію"
+              + (f"; tracemalloc ~{traced_delta / users / 1024:.1f} КБ на сесію" if self.args.tracemalloc else ""))
+        if self.pool is not None:
+            stats = self.pool.stats()
+            print(f"Оновлень на обробник: {stats['dispatched']}, перезапусків: {stats['restarts']}")
+        else:
+            from src.bot.services.admission import admission_controller
+            print(f"Сесій у user_data: {len(self.application.user_data)}, "
+                  f"контроль допуску: {admission_controller.stats()}")
+            if self.application.bot.rate_limiter is not None:
+                print(f"Черга Bot API: {self.application.bot.rate_limiter.stats()}")
+        print(f"Запитів до OpenAI: {self.openai.requests}, до Bot API: {sum(self.telegram.calls.values())}")
+        print("Bot API: " + ", ".join(f"{method} {count}" for method, count in self.telegram.calls.most_common()))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="кількість віртуальних користувачів")
+    parser.add_argument("--concurrency", type=int, default=20, help="скільки сесій виконуються одночасно")
+    parser.add_argument("--journeys", default=",".join(JOURNEYS), help="сценарії через кому")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза користувача між кроками, с")
+    parser.add_argument("--step-timeout", type=float, default=60.0)
+    parser.add_argument("--debounce", type=float, default=None, help="перевизначити затримку об'єднання реплік")
+    parser.add_argument("--no-rate-limits", action="store_true", help="вимкнути планувальник вихідних запитів")
+    parser.add_argument("--tracemalloc", action="store_true", help="точніший облік пам'яті (повільніше)")
+    parser.add_argument("--workers", type=int, default=1, help="кількість процесів-обробників")
+    parser.add_argument("--openai-latency", type=float, default=0.05, help="медіана затримки OpenAI, с")
+    parser.add_argument("--openai-sigma", type=float, default=0.5, help="сигма логнормального розподілу")
+    parser.add_argument("--openai-slow-fraction", type=float, default=0.0)
+    parser.add_argument("--openai-slow-latency", type=float, default=2.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="пауза між фрагментами стріму, с")
+    parser.add_argument("--telegram-latency", type=float, default=0.01)
+    parser.add_argument("--telegram-jitter", type=float, default=0.01)
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    asyncio.run(LoadTest(args).run())
+
+
+if __name__ == "__main__":
+    main()
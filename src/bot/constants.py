@@ -8,4 +8,12 @@ TALK_CONVERSING_STATE = 2
 # Стани для обробника квізу
 QUIZ_SELECTING_TOPIC = 1
 QUIZ_WAITING_FOR_ANSWER = 2
-QUIZ_SHOWING_RESULT = 3
\ No newline at end of file
+QUIZ_SHOWING_RESULT = 3
+
+# Теми квізу: ключ кнопки з quiz_topics.json -> опис теми для моделі
+QUIZ_TOPIC_MAPPING = {
+    "quiz_python": "програмування мовою Python",
+    "quiz_javascript": "програмування мовою JavaScript",
+    "quiz_docker": "Docker",
+    "quiz_web": "веб-технології"
+}
@@ -6,8 +6,24 @@ import openai
 from src.settings.config import config
 from src.bot.handlers.common import start
 from src.bot.constants import GPT_DIALOGUE_STATE
-
-openai.api_key = config.openai.api_key
+from src.bot.services import llm
+from src.bot.services.streaming import reply_streaming, TELEGRAM_MESSAGE_LIMIT
+from src.bot.services.semantic_cache import semantic_cache
+from src.bot.services.media import media_registry
+from src.bot.services.resources import resource_registry
+from src.bot.services.history import DialogueHistory, schedule_summary
+from src.bot.services.coalescer import turn_coalescer, Superseded
+from src.bot.services.resilience import CircuitOpenError, UNAVAILABLE_MESSAGE
+from src.bot.services.admission import AdmissionRejected
+
+
+def _get_gpt_system_prompt() -> str:
+    """Повертає системний промпт для діалогу з GPT."""
+    try:
+        return resource_registry.get_prompt("gpt.txt")
+    except FileNotFoundError:
+        logger.error(f"Файл промта gpt.txt не знайдено.")
+        return "Ви досвідчений AI асистент, що відповідає на запити користувачів."
 
 
 async def start_gpt_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -15,27 +31,27 @@ async def start_gpt_conversation(update: Update, context: ContextTypes.DEFAULT_T
 
     if update.message:
         target_message = update.message
-        logger.info(f"Користувач {update.effective_user.id} викликав команду /gpt.")
+        logger.bind(event="command", user_id=update.effective_user.id).info("Користувач викликав команду /gpt.")
     elif update.callback_query:
         target_message = update.callback_query.message
         await update.callback_query.answer()
-        logger.info(f"Користувач {update.effective_user.id} натиснув кнопку GPT.")
+        logger.bind(event="button", user_id=update.effective_user.id).info("Користувач натиснув кнопку GPT.")
     else:
         return ConversationHandler.END
 
     # Відправляємо зображення
-    image_path = (config.paths.images / "gpt.jpg")
-    if not image_path.is_file():
-        logger.error(f"Файл зображення не знайдено за шляхом: {image_path}")
+    if not media_registry.exists("gpt.jpg"):
+        logger.error(f"Файл зображення не знайдено за шляхом: {config.paths.images / 'gpt.jpg'}")
         await target_message.reply_text("Вибачте, зображення недоступне.")
     else:
-        await target_message.reply_photo(
-            photo=image_path.open("rb"),
+        await media_registry.reply_photo(
+            target_message,
+            "gpt.jpg",
             caption="Вітаю! Я твій AI-асистент. Надішли мені свій запит."
         )
 
     # Ініціалізуємо історію діалогу
-    context.user_data['dialogue_history'] = []
+    context.user_data['dialogue_history'] = DialogueHistory(_get_gpt_system_prompt())
 
     return GPT_DIALOGUE_STATE
 
@@ -43,41 +59,73 @@ async def start_gpt_conversation(update: Update, context: ContextTypes.DEFAULT_T
 async def gpt_message_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Обробляє текстові повідомлення користувача та надсилає їх до OpenAI."""
     user_message = update.message.text
-    logger.info(f"Користувач {update.effective_user.id} надіслав запит: '{user_message}'")
-
-    # Читаємо промт із файлу
-    try:
-        with open(config.paths.prompts / "gpt.txt", "r", encoding="utf-8") as f:
-            gpt_system_prompt = f.read()
-    except FileNotFoundError:
-        logger.error(f"Файл промта gpt.txt не знайдено.")
-        gpt_system_prompt = "Ви досвідчений AI асистент, що відповідає на запити користувачів."
-
-    # Додаємо системний промпт та повідомлення користувача до історії
-    dialogue_history = context.user_data.get('dialogue_history', [])
-    if not dialogue_history or dialogue_history[0].get('role') != 'system':
-        dialogue_history.insert(0, {"role": "system", "content": gpt_system_prompt})
-
-    dialogue_history.append({"role": "user", "content": user_message})
-
-    try:
-        response = openai.chat.completions.create(
-            model=config.openai.model,
-            messages=dialogue_history,
-            temperature=config.openai.temperature
-        )
-        chatgpt_response = response.choices[0].message.content
-
-        # Додаємо відповідь асистента до історії
-        dialogue_history.append({"role": "assistant", "content": chatgpt_response})
+    # Текст потрапляє в лог лише як хеш (Settings.logging.hashed_fields)
+    logger.bind(event="user_message", user_id=update.effective_user.id, text=user_message).info(
+        "Користувач надіслав запит."
+    )
+
+    # Додаємо повідомлення користувача до історії (системний промпт зберігається в історії окремо)
+    dialogue_history = context.user_data.get('dialogue_history')
+    if not isinstance(dialogue_history, DialogueHistory):
+        dialogue_history = DialogueHistory(_get_gpt_system_prompt())
         context.user_data['dialogue_history'] = dialogue_history
 
-        # Додаємо кнопку для завершення діалогу
-        keyboard = [[InlineKeyboardButton("Завершити розмову 🚪", callback_data="end_gpt_dialogue")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-
-        await update.message.reply_text(chatgpt_response, reply_markup=reply_markup)
+    # Кілька швидких повідомлень поспіль обробляються як одна репліка
+    dialogue_key = (update.effective_chat.id, update.effective_user.id)
+    turn = await turn_coalescer.collect(dialogue_key, user_message)
+    if turn is None:
+        return GPT_DIALOGUE_STATE
+
+    # Кнопка для завершення діалогу
+    keyboard = [[InlineKeyboardButton("Завершити розмову 🚪", callback_data="end_gpt_dialogue")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
+
+    async def respond(text: str) -> None:
+        dialogue_history.append("user", text)
+        messages = dialogue_history.messages()
+        # Перше питання не залежить від попередньої розмови, тож відповідь можна взяти з кешу
+        first_turn = len(dialogue_history) == 1 and not dialogue_history.summary
+        cache_ttl = config.completion_cache.gpt_first_turn_ttl if first_turn else 0
+        # Перефразоване популярне питання: відповідь з семантичного кешу (для того ж промпту і моделі)
+        scope = None
+        if first_turn and semantic_cache is not None:
+            scope = semantic_cache.scope(llm.request_key(messages[:1], task="gpt"))
+            cached = semantic_cache.lookup(text, scope)
+            if cached is not None:
+                await update.message.reply_text(cached, reply_markup=reply_markup)
+                dialogue_history.append("assistant", cached)
+                return
+        try:
+            if config.streaming.enabled:
+                chatgpt_response = await reply_streaming(update.message, messages, reply_markup=reply_markup,
+                                                         task="gpt", cache_ttl=cache_ttl)
+            else:
+                chatgpt_response = await llm.complete(messages, task="gpt", cache_ttl=cache_ttl)
+                await update.message.reply_text(chatgpt_response, reply_markup=reply_markup)
+        except BaseException:
+            # Відповіді немає (запит замінено новішим або стався збій): прибираємо репліку користувача,
+            # щоб вона потрапила в наступний запит і не залишилась без відповіді в історії
+            dialogue_history.pop_last()
+            raise
+
+        if scope is not None and len(chatgpt_response) <= TELEGRAM_MESSAGE_LIMIT:
+            semantic_cache.add(text, chatgpt_response, scope)
+
+        # Додаємо відповідь асистента до історії і за потреби згортаємо старі репліки у фоні
+        dialogue_history.append("assistant", chatgpt_response)
+        schedule_summary(context.application, dialogue_history)
+        logger.bind(event="token_stats", user_id=update.effective_user.id).debug(
+            f"Статистика токенів: {dialogue_history.stats()}"
+        )
 
+    try:
+        await turn_coalescer.run(dialogue_key, turn, respond)
+    except Superseded:
+        logger.bind(event="superseded", user_id=update.effective_user.id).info("Запит замінено новим повідомленням.")
+    except AdmissionRejected as e:
+        await update.message.reply_text(e.user_message)
+    except CircuitOpenError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
     except openai.OpenAIError as e:
         logger.error(f"Помилка OpenAI API: {e}")
         await update.message.reply_text("Вибачте, сталася помилка з'єднання з AI. Спробуйте ще раз.")
@@ -1,40 +1,53 @@
 import json
 import openai
 import os
+from collections import deque
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler
 from loguru import logger
 from src.settings.config import config
 from src.bot.handlers.common import start
+from src.bot.services import llm
+from src.bot.services.media import media_registry
+from src.bot.services.resources import resource_registry
+from src.bot.services.quiz_pool import quiz_pool, question_id
+from src.bot.services import grading
+from src.bot.services.resilience import CircuitOpenError, UNAVAILABLE_MESSAGE
+from src.bot.services.admission import AdmissionRejected
+from src.bot.services.leaderboard import leaderboard, GLOBAL
 from src.bot.constants import (
     QUIZ_SELECTING_TOPIC,
     QUIZ_WAITING_FOR_ANSWER,
-    QUIZ_SHOWING_RESULT
+    QUIZ_SHOWING_RESULT,
+    QUIZ_TOPIC_MAPPING
 )
 
-# Завантажуємо промпт
-try:
-    with open(config.paths.prompts / "quiz.txt", "r", encoding="utf-8") as f:
-        QUIZ_SINGLE_PROMPT = f.read().strip()
-except (FileNotFoundError, IOError) as e:
-    logger.error(f"Не вдалося завантажити файл промпта: {e}")
-    QUIZ_SINGLE_PROMPT = ""
+def _get_quiz_prompt() -> str:
+    """Повертає промпт квізу з реєстру ресурсів (з урахуванням змін у файлі)."""
+    try:
+        return resource_registry.get_prompt("quiz.txt")
+    except (FileNotFoundError, IOError) as e:
+        logger.error(f"Не вдалося завантажити файл промпта: {e}")
+        return ""
+
+
+def _build_quiz_topics_keyboard(menu_data) -> InlineKeyboardMarkup:
+    """Створює клавіатуру з темами квізу з даних quiz_topics.json."""
+    quiz_topics = {k: v for k, v in menu_data.items() if k != "start"}
+    keyboard = [
+        [InlineKeyboardButton(text, callback_data=key)]
+        for key, text in quiz_topics.items()
+    ]
+    keyboard.append([InlineKeyboardButton("Головне меню 🏠", callback_data="start")])
+    return InlineKeyboardMarkup(keyboard)
+
 
 # Допоміжна функція для отримання клавіатури з темами квізу
 def _get_quiz_topics_keyboard() -> InlineKeyboardMarkup:
-    """Зчитує теми квізу з файлу та створює клавіатуру."""
+    """Повертає готову клавіатуру з темами квізу з реєстру ресурсів."""
     try:
-        with open(config.paths.menus / "quiz_topics.json", "r", encoding="utf-8") as file:
-            menu_data = json.load(file)
-
-        quiz_topics = {k: v for k, v in menu_data.items() if k != "start"}
-        keyboard = [
-            [InlineKeyboardButton(text, callback_data=key)]
-            for key, text in quiz_topics.items()
-        ]
-        keyboard.append([InlineKeyboardButton("Головне меню 🏠", callback_data="start")])
-        return InlineKeyboardMarkup(keyboard)
-    except (FileNotFound, json.JSONDecodeError) as e:
+        return resource_registry.get_keyboard("quiz_topics.json", _build_quiz_topics_keyboard)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
         logger.error(f"Помилка при завантаженні файлу quiz_topics.json: {e}")
         return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton("Почати", callback_data="start")]])
 
@@ -44,15 +57,14 @@ async def start_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     if update.callback_query:
         await update.callback_query.answer()
         reply_to = update.callback_query.message
-        logger.info(f"Користувач {update.callback_query.from_user.id} натиснув кнопку 'quiz'.")
+        logger.bind(event="button", user_id=update.callback_query.from_user.id).info("Користувач натиснув кнопку 'quiz'.")
     else:
         reply_to = update.message
-        logger.info(f"Користувач {update.effective_user.id} викликав команду /quiz.")
+        logger.bind(event="command", user_id=update.effective_user.id).info("Користувач викликав команду /quiz.")
 
     context.user_data['quiz_score'] = 0
 
-    image_path = config.paths.images / "quiz.jpg"
-    await reply_to.reply_photo(photo=open(image_path, 'rb'))
+    await media_registry.reply_photo(reply_to, "quiz.jpg")
 
     reply_markup = _get_quiz_topics_keyboard()
 
@@ -63,80 +75,124 @@ async def start_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     return QUIZ_SELECTING_TOPIC
 
 
-async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Генерує питання для квізу за допомогою ChatGPT та надсилає його користувачу."""
+def _take_pooled_question(context: ContextTypes.DEFAULT_TYPE, topic_key: str) -> dict | None:
+    """Бере з пулу питання, якого користувач ще не бачив, і запам'ятовує його як побачене."""
+    if not config.quiz_pool.enabled or not topic_key:
+        return None
+    seen = context.user_data.get('quiz_seen')
+    if seen is None:
+        seen = deque(maxlen=config.quiz_pool.seen_history)
+        context.user_data['quiz_seen'] = seen
+    question = quiz_pool.take(topic_key, seen)
+    if question is not None:
+        seen.append(question["id"])
+    return question
+
+
+async def ask_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int | None:
+    """Надсилає питання для квізу: з пулу готових питань або, якщо пул порожній, генерує його через ChatGPT."""
     query = update.callback_query
     await query.answer()
 
     # Логіка для "Ще питання" або нової теми
     if query.data == "ask_another_question":
+        topic_key = context.user_data.get('quiz_topic_key')
         topic_text = context.user_data.get('quiz_topic_text')
         if not topic_text:
             await query.message.reply_text("Невідома тема квізу. Будь ласка, оберіть тему знову.")
             return QUIZ_SELECTING_TOPIC
-
-        prompt = f"{QUIZ_SINGLE_PROMPT}\nКоманда: '{topic_text}'"
     else:
         # Нова тема вибрана, зберігаємо її
         topic_key = query.data
-        topic_mapping = {
-            "quiz_python": "програмування мовою Python",
-            "quiz_javascript": "програмування мовою JavaScript",
-            "quiz_docker": "Docker",
-            "quiz_web": "веб-технології"
-        }
-        topic_text = topic_mapping.get(topic_key)
+        topic_text = QUIZ_TOPIC_MAPPING.get(topic_key)
         if not topic_text:
             await query.message.reply_text("Невідома тема квізу.")
             return ConversationHandler.END
 
+        context.user_data['quiz_topic_key'] = topic_key
         context.user_data['quiz_topic_text'] = topic_text
-        prompt = f"{QUIZ_SINGLE_PROMPT}\nКоманда: '{topic_text}'"
 
-    try:
-        response = openai.chat.completions.create(
-            model=config.openai.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
+    pooled_question = _take_pooled_question(context, topic_key)
+    if pooled_question is not None:
+        context.user_data['last_question'] = pooled_question["question"]
+        context.user_data['last_answer'] = {"answer": pooled_question["answer"], "aliases": pooled_question["aliases"]}
+        await query.message.reply_text(pooled_question["question"])
+        return QUIZ_WAITING_FOR_ANSWER
 
-        question_text = response.choices[0].message.content.strip()
+    prompt = f"{_get_quiz_prompt()}\nКоманда: '{topic_text}'"
+    try:
+        # Однакові запити різних користувачів обслуговуються одним зверненням до моделі
+        messages = [{"role": "user", "content": prompt}]
+        question_text = (await llm.complete(
+            messages, task="quiz_question", cache_ttl=config.completion_cache.quiz_question_ttl
+        )).strip()
+        seen = context.user_data.setdefault('quiz_seen', deque(maxlen=config.quiz_pool.seen_history))
+        if question_id(question_text) in seen:
+            # Це питання користувач уже бачив — генеруємо нове в обхід кешу
+            question_text = (await llm.complete(messages, task="quiz_question")).strip()
+        seen.append(question_id(question_text))
 
         context.user_data['last_question'] = question_text
+        context.user_data.pop('last_answer', None)
 
         await query.message.reply_text(question_text)
 
         return QUIZ_WAITING_FOR_ANSWER
+    except AdmissionRejected as e:
+        await query.message.reply_text(e.user_message)
+        return None
+    except CircuitOpenError:
+        await query.message.reply_text(UNAVAILABLE_MESSAGE)
+        return None
     except openai.OpenAIError as e:
+        # Стан не змінюється, тож користувач може натиснути кнопку ще раз
         logger.error(f"Помилка OpenAI API при генерації питання: {e}")
         await query.message.reply_text("Вибач, сталася помилка з'єднання з AI. Спробуй ще раз.")
-        return ConversationHandler.END
+        return None
     except Exception as e:
         logger.error(f"Непередбачена помилка при генерації питання: {e}")
         await query.message.reply_text("Вибач, сталася помилка при генерації питання. Спробуй ще раз.")
         return ConversationHandler.END
 
 
+def _grade_locally(user_answer: str, expected: dict | None) -> str | None:
+    """
+    Перевіряє відповідь без звернення до моделі, якщо для питання відома правильна відповідь.
+    Повертає текст вердикту у форматі відповіді моделі або None, якщо випадок неоднозначний.
+    """
+    if not config.grading.enabled or not expected:
+        return None
+    result = grading.grade(user_answer, expected["answer"], expected.get("aliases", ()))
+    if result.verdict == grading.CORRECT:
+        return "Правильно!"
+    if result.verdict == grading.INCORRECT:
+        return f"Неправильно! Правильна відповідь - {expected['answer']}"
+    return None
+
+
 async def process_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Обробляє відповідь користувача, перевіряє її за допомогою ChatGPT."""
+    """Обробляє відповідь користувача: перевіряє її локально, а в неоднозначних випадках — за допомогою ChatGPT."""
     user_answer = update.message.text
     last_question = context.user_data.get('last_question', '')
+    expected = context.user_data.get('last_answer')
     score = context.user_data.get('quiz_score', 0)
 
-    prompt = f"{QUIZ_SINGLE_PROMPT}\nПитання: '{last_question}'\nВідповідь користувача: '{user_answer}'"
-
     try:
-        response = openai.chat.completions.create(
-            model=config.openai.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2
-        )
+        chatgpt_response = _grade_locally(user_answer, expected)
+        if chatgpt_response is None:
+            prompt = f"{_get_quiz_prompt()}\nПитання: '{last_question}'\nВідповідь користувача: '{user_answer}'"
+            if expected:
+                prompt += f"\nОчікувана відповідь: '{expected['answer']}'"
+            response = await llm.complete([{"role": "user", "content": prompt}], task="quiz_grade")
 
-        chatgpt_response = response.choices[0].message.content.strip()
+            chatgpt_response = response.strip()
 
         if chatgpt_response.startswith("Правильно!"):
             score += 1
             context.user_data['quiz_score'] = score
+            topic_key = context.user_data.get('quiz_topic_key')
+            if leaderboard is not None and topic_key:
+                leaderboard.record(update.effective_user.id, topic_key, update.effective_user.first_name)
             result_text = f"✅ {chatgpt_response}\nТвій рахунок: {score}"
         else:
             result_text = f"❌ {chatgpt_response}\nТвій рахунок: {score}"
@@ -154,10 +210,17 @@ async def process_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             reply_markup=reply_markup
         )
         return QUIZ_SHOWING_RESULT
+    except AdmissionRejected as e:
+        await update.message.reply_text(e.user_message)
+        return QUIZ_WAITING_FOR_ANSWER
+    except CircuitOpenError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
+        return QUIZ_WAITING_FOR_ANSWER
     except openai.OpenAIError as e:
+        # Відповідь можна надіслати ще раз — питання лишається тим самим
         logger.error(f"Помилка OpenAI API при перевірці відповіді: {e}")
-        await update.message.reply_text("Вибач, сталася помилка з'єднання з AI.")
-        return ConversationHandler.END
+        await update.message.reply_text("Вибач, сталася помилка з'єднання з AI. Спробуй надіслати відповідь ще раз.")
+        return QUIZ_WAITING_FOR_ANSWER
     except Exception as e:
         logger.error(f"Непередбачена помилка при перевірці відповіді: {e}")
         await update.message.reply_text("Вибач, сталася помилка при перевірці відповіді.")
@@ -184,8 +247,11 @@ async def end_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await query.answer()
 
     final_score = context.user_data.get('quiz_score', 0)
-    await query.message.reply_text(
-        f"Квіз завершено. Твій фінальний рахунок: {final_score}. Сподіваюсь, тобі сподобалось!")
+    text = f"Квіз завершено. Твій фінальний рахунок: {final_score}. Сподіваюсь, тобі сподобалось!"
+    rank = leaderboard.board().rank(query.from_user.id) if leaderboard is not None else None
+    if rank is not None:
+        text += f"\nТвоє місце в загальному рейтингу: {rank}. Переглянути рейтинг: /top"
+    await query.message.reply_text(text)
 
     # Викликаємо обробник головного меню, щоб показати кнопки
     await start(update, context)
@@ -197,3 +263,48 @@ async def cancel_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     """Завершує квіз, якщо користувач викликав команду /cancel."""
     await update.message.reply_text("Квіз завершено.")
     return ConversationHandler.END
+
+
+def _topic_by_name(name: str) -> str | None:
+    """Ключ теми за назвою з команди (/top python → quiz_python)."""
+    key = f"quiz_{name.lower()}"
+    return key if key in QUIZ_TOPIC_MAPPING else None
+
+
+async def show_leaderboard(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Обробляє команду /top [тема]: перші місця рейтингу квізу і місце користувача."""
+    logger.bind(event="command", user_id=update.effective_user.id).info("Користувач викликав команду /top.")
+    if leaderboard is None:
+        await update.message.reply_text("Рейтинг квізу вимкнено.")
+        return
+    if not leaderboard.loaded:
+        await update.message.reply_text("Рейтинг ще завантажується, спробуй за хвилину.")
+        return
+
+    topic, title = GLOBAL, "усі теми"
+    if context.args:
+        topic = _topic_by_name(context.args[0])
+        if topic is None:
+            names = ", ".join(key.removeprefix("quiz_") for key in QUIZ_TOPIC_MAPPING)
+            await update.message.reply_text(f"Невідома тема. Доступні теми: {names}")
+            return
+        title = QUIZ_TOPIC_MAPPING[topic]
+
+    board = leaderboard.board(topic)
+    top = board.top(config.leaderboard.top_size)
+    if not top:
+        await update.message.reply_text("У рейтингу ще нікого немає. Відповідай правильно в /quiz, щоб стати першим!")
+        return
+
+    names = await leaderboard.names([user_id for user_id, _ in top])
+    lines = [f"🏆 Рейтинг квізу: {title}"]
+    for place, (user_id, points) in enumerate(top, start=1):
+        lines.append(f"{place}. {names.get(user_id) or f'Гравець {user_id}'} — {points}")
+
+    user_id = update.effective_user.id
+    rank = board.rank(user_id)
+    if rank is None:
+        lines.append("\nТебе ще немає в цьому рейтингу.")
+    elif rank > len(top):
+        lines.append(f"\nТвоє місце: {rank} з {len(board)} ({board.score(user_id)})")
+    await update.message.reply_text("\n".join(lines))
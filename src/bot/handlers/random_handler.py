@@ -5,12 +5,16 @@ import openai
 from loguru import logger
 from src.settings.config import config
 from src.bot.handlers.common import get_menu_from_file
-
-openai.api_key = config.openai.api_key
+from src.bot.services import llm
+from src.bot.services.media import media_registry
+from src.bot.services.resources import resource_registry
+from src.bot.services.fact_buffer import fact_buffer
+from src.bot.services.resilience import CircuitOpenError, UNAVAILABLE_MESSAGE
+from src.bot.services.admission import AdmissionRejected
 
 async def get_random_fact(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Генерує випадковий факт за допомогою ChatGPT та надсилає його користувачеві."""
-    logger.info(f"Користувач {update.effective_user.id} викликав команду /random.")
+    """Надсилає користувачеві випадковий факт: з буфера готових фактів або згенерований ChatGPT."""
+    logger.bind(event="command", user_id=update.effective_user.id).info("Користувач викликав команду /random.")
 
     if update.callback_query:
         message_to_edit = update.callback_query.message
@@ -20,33 +24,38 @@ async def get_random_fact(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
     prompt = None
     try:
-        # Завантажуємо промпт
-        with open(config.paths.prompts / "random.txt", "r", encoding="utf-8") as file:
-            prompt = file.read().strip()
-
-        # Генеруємо факт за допомогою OpenAI
-        response = openai.chat.completions.create(
-            model=config.openai.model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=config.openai.temperature
-        )
-        chatgpt_response = response.choices[0].message.content
+        # Ключі фактів, які користувач уже отримав (обмежений список, зберігається разом із сесією)
+        seen = context.user_data.setdefault('seen_facts', [])
+        # Спершу беремо готовий факт з буфера, і лише якщо він порожній — звертаємось до OpenAI
+        chatgpt_response = fact_buffer.take(seen) if config.fact_buffer.enabled else None
+        if chatgpt_response is None:
+            prompt = resource_registry.get_prompt("random.txt")
+            messages = [{"role": "user", "content": prompt}]
+            chatgpt_response = await llm.complete(messages, task="random",
+                                                  cache_ttl=config.completion_cache.random_fact_ttl)
+            if fact_buffer.fact_key(chatgpt_response) in seen:
+                # Користувач уже отримав цей факт з кешу — просимо в моделі новий
+                chatgpt_response = await llm.complete(messages, task="random")
+        fact_buffer.remember(seen, chatgpt_response)
 
         # Завантажуємо клавіатуру з файлу за допомогою допоміжної функції
         reply_markup = get_menu_from_file(config.paths.menus / "random.json")
 
         # Відправляємо фото з підписом
-        image_path = config.paths.images / "random.jpg"
-        with open(image_path, 'rb') as image:
-            await message_to_edit.reply_photo(
-                photo=image,
-                caption=chatgpt_response,
-                reply_markup=reply_markup
-            )
+        await media_registry.reply_photo(
+            message_to_edit,
+            "random.jpg",
+            caption=chatgpt_response,
+            reply_markup=reply_markup
+        )
 
     except FileNotFoundError as e:
         logger.error(f"Помилка FileNotFoundError: {e}")
         await message_to_edit.reply_text("Вибачте, деякі файли (промпт, меню або зображення) не знайдено.")
+    except AdmissionRejected as e:
+        await message_to_edit.reply_text(e.user_message)
+    except CircuitOpenError:
+        await message_to_edit.reply_text(UNAVAILABLE_MESSAGE)
     except openai.OpenAIError as e:
         logger.error(f"Помилка OpenAI API: {e}")
         await message_to_edit.reply_text("Вибачте, сталася помилка з'єднання з AI. Спробуйте ще раз.")
@@ -5,21 +5,31 @@ from loguru import logger
 import openai
 from src.settings.config import config
 from src.bot.handlers.common import start
+from src.bot.services import llm
+from src.bot.services.streaming import reply_streaming
+from src.bot.services.media import media_registry
+from src.bot.services.resources import resource_registry
+from src.bot.services.history import DialogueHistory, schedule_summary
+from src.bot.services.coalescer import turn_coalescer, Superseded
+from src.bot.services.resilience import CircuitOpenError, UNAVAILABLE_MESSAGE
+from src.bot.services.admission import AdmissionRejected
 from src.bot.constants import (
     TALK_PERSONALITY_STATE,
     TALK_CONVERSING_STATE
 )
 
 
+def _build_personalities_keyboard(menu_data) -> InlineKeyboardMarkup:
+    """Створює клавіатуру з особистостями з даних talk.json."""
+    keyboard = [[InlineKeyboardButton(button["text"], callback_data=button["callback_data"])] for button in menu_data]
+    return InlineKeyboardMarkup(keyboard)
+
+
 # Допоміжна функція для отримання клавіатури з особистостями
 def _get_personalities_keyboard() -> InlineKeyboardMarkup:
-    """Зчитує дані з файлу та створює клавіатуру з особистостями."""
+    """Повертає готову клавіатуру з особистостями з реєстру ресурсів."""
     try:
-        with open(config.paths.menus / "talk.json", "r", encoding="utf-8") as file:
-            menu_data = json.load(file)
-
-        keyboard = [[InlineKeyboardButton(button["text"], callback_data=button["callback_data"])] for button in menu_data]
-        return InlineKeyboardMarkup(keyboard)
+        return resource_registry.get_keyboard("talk.json", _build_personalities_keyboard)
     except (FileNotFoundError, json.JSONDecodeError) as e:
         logger.error(f"Помилка при завантаженні talk.json: {e}")
         return None
@@ -33,11 +43,10 @@ async def start_talk(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     else:
         reply_to = update.message
 
-    logger.info(f"Користувач {update.effective_user.id} розпочав діалог з особистістю.")
+    logger.bind(event="command", user_id=update.effective_user.id).info("Користувач розпочав діалог з особистістю.")
 
     try:
-        image_path = config.paths.images / "talk.jpg"
-        await reply_to.reply_photo(photo=open(image_path, 'rb'))
+        await media_registry.reply_photo(reply_to, "talk.jpg")
     except FileNotFoundError:
         logger.error("Файл talk.jpg не знайдено.")
 
@@ -67,13 +76,12 @@ async def select_personality(update: Update, context: ContextTypes.DEFAULT_TYPE)
         return ConversationHandler.END
 
     try:
-        # Динамічно завантажуємо промпт з .txt файлу
-        prompt_file_path = config.paths.prompts / f"{personality_key}.txt"
-        with open(prompt_file_path, "r", encoding="utf-8") as file:
-            system_prompt = file.read().strip()
+        # Беремо промпт особистості з реєстру ресурсів; історія зберігає лише його номер,
+        # а в сесії лишається ключ особистості, щоб за потреби відновити історію
+        system_prompt = resource_registry.get_prompt(f"{personality_key}.txt")
 
-        context.user_data['personality_prompt'] = system_prompt
-        context.user_data['dialogue_history'] = [{"role": "system", "content": system_prompt}]
+        context.user_data['personality'] = personality_key
+        context.user_data['dialogue_history'] = DialogueHistory(system_prompt)
 
         # Додаємо кнопку "Завершити розмову"
         keyboard = [[InlineKeyboardButton("Завершити розмову 🚪", callback_data="end_talk")]]
@@ -81,9 +89,9 @@ async def select_personality(update: Update, context: ContextTypes.DEFAULT_TYPE)
 
         # Надсилаємо зображення конкретної особистості
         try:
-            image_path = config.paths.images / f"{personality_key}.jpg"
-            await query.message.reply_photo(
-                photo=open(image_path, 'rb'),
+            await media_registry.reply_photo(
+                query.message,
+                f"{personality_key}.jpg",
                 caption="Чудово! Тепер ти можеш ставити мені питання. Я відповім як обрана особистість.",
                 reply_markup=reply_markup
             )
@@ -108,37 +116,72 @@ async def select_personality(update: Update, context: ContextTypes.DEFAULT_TYPE)
 async def talk_with_personality(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Веде діалог з ChatGPT у ролі обраної особистості."""
     user_message = update.message.text
-    dialogue_history = context.user_data.get('dialogue_history', [])
-    personality_prompt = context.user_data.get('personality_prompt')
-
-    if not personality_prompt:
-        await update.message.reply_text("Будь ласка, спочатку оберіть особистість.")
-        return ConversationHandler.END
-
-    dialogue_history.append({"role": "user", "content": user_message})
-
-    try:
-        response = openai.chat.completions.create(
-            model=config.openai.model,
-            messages=dialogue_history,
-            temperature=config.openai.temperature
-        )
+    dialogue_history = context.user_data.get('dialogue_history')
+    personality = context.user_data.get('personality')
+    # Сесії, збережені до переходу на ключ особистості, містять повний текст промпта
+    context.user_data.pop('personality_prompt', None)
 
-        chatgpt_response = response.choices[0].message.content
-        dialogue_history.append({"role": "assistant", "content": chatgpt_response})
+    if not isinstance(dialogue_history, DialogueHistory):
+        if not personality:
+            await update.message.reply_text("Будь ласка, спочатку оберіть особистість.")
+            return ConversationHandler.END
+        try:
+            dialogue_history = DialogueHistory(resource_registry.get_prompt(f"{personality}.txt"))
+        except FileNotFoundError:
+            logger.error(f"Файл промпта {personality}.txt не знайдено.")
+            await update.message.reply_text("Вибач, не можу знайти інформацію про цю особистість.")
+            return ConversationHandler.END
         context.user_data['dialogue_history'] = dialogue_history
 
-        # Додаємо кнопку "Завершити розмову"
-        keyboard = [[InlineKeyboardButton("Завершити розмову 🚪", callback_data="end_talk")]]
-        reply_markup = InlineKeyboardMarkup(keyboard)
+    # Кілька швидких повідомлень поспіль обробляються як одна репліка
+    dialogue_key = (update.effective_chat.id, update.effective_user.id)
+    turn = await turn_coalescer.collect(dialogue_key, user_message)
+    if turn is None:
+        return TALK_CONVERSING_STATE
 
-        await update.message.reply_text(chatgpt_response, reply_markup=reply_markup)
+    # Кнопка "Завершити розмову" додається до остаточної відповіді
+    keyboard = [[InlineKeyboardButton("Завершити розмову 🚪", callback_data="end_talk")]]
+    reply_markup = InlineKeyboardMarkup(keyboard)
 
+    async def respond(text: str) -> None:
+        dialogue_history.append("user", text)
+        messages = dialogue_history.messages()
+        try:
+            if config.streaming.enabled:
+                chatgpt_response = await reply_streaming(update.message, messages, reply_markup=reply_markup,
+                                                         task="talk")
+            else:
+                chatgpt_response = await llm.complete(messages, task="talk")
+                await update.message.reply_text(chatgpt_response, reply_markup=reply_markup)
+        except BaseException:
+            # Відповіді немає (запит замінено новішим або стався збій): прибираємо репліку користувача,
+            # щоб вона потрапила в наступний запит і не залишилась без відповіді в історії
+            dialogue_history.pop_last()
+            raise
+
+        dialogue_history.append("assistant", chatgpt_response)
+        schedule_summary(context.application, dialogue_history)
+        logger.bind(event="token_stats", user_id=update.effective_user.id).debug(
+            f"Статистика токенів: {dialogue_history.stats()}"
+        )
+
+    try:
+        await turn_coalescer.run(dialogue_key, turn, respond)
+        return TALK_CONVERSING_STATE
+    except Superseded:
+        logger.bind(event="superseded", user_id=update.effective_user.id).info("Запит замінено новим повідомленням.")
+        return TALK_CONVERSING_STATE
+    except AdmissionRejected as e:
+        await update.message.reply_text(e.user_message)
+        return TALK_CONVERSING_STATE
+    except CircuitOpenError:
+        await update.message.reply_text(UNAVAILABLE_MESSAGE)
         return TALK_CONVERSING_STATE
     except openai.OpenAIError as e:
+        # Збій моделі не завершує розмову: користувач може просто повторити повідомлення
         logger.error(f"Помилка OpenAI API в діалозі: {e}")
         await update.message.reply_text("Вибач, сталася помилка з'єднання з AI. Спробуй ще раз.")
-        return ConversationHandler.END
+        return TALK_CONVERSING_STATE
     except Exception as e:
         logger.error(f"Непередбачена помилка в діалозі: {e}")
         await update.message.reply_text("Вибач, сталася помилка. Спробуй ще раз.")
@@ -151,7 +194,7 @@ async def end_talk(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     await query.answer()
 
     await query.message.reply_text("Розмова завершена. Повертаю до головного меню.")
-    context.user_data.pop('personality_prompt', None)
+    context.user_data.pop('personality', None)
     context.user_data.pop('dialogue_history', None)
 
     await start(update, context)
@@ -162,6 +205,6 @@ async def end_talk(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 async def cancel_talk(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Завершує розмову, якщо користувач викликав команду /cancel."""
     await update.message.reply_text("Розмову завершено.")
-    context.user_data.pop('personality_prompt', None)
+    context.user_data.pop('personality', None)
     context.user_data.pop('dialogue_history', None)
     return ConversationHandler.END
@@ -0,0 +1,278 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+import openai
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.metrics import registry, ADMISSION_REJECTED, ADMISSION_WAIT
+from src.bot.services.tracing import current_user
+
+# Причини відмови
+QUEUE_FULL = "queue_full"
+TIMEOUT = "timeout"
+QUOTA = "quota"
+
+
+class AdmissionRejected(openai.OpenAIError):
+    """Запит до моделі не допущено: бот перевантажений або користувач вичерпав квоту токенів."""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"Запит не допущено ({reason}), повторити через {self.retry_after} с")
+
+    @property
+    def user_message(self) -> str:
+        """Відповідь користувачу з часом, через який варто спробувати знову."""
+        if self.reason == QUOTA:
+            return f"Ви надсилаєте забагато запитів. Спробуйте, будь ласка, через {self.retry_after} с."
+        return f"Бот зараз дуже зайнятий. Спробуйте, будь ласка, через {self.retry_after} с."
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Наближена кількість токенів запиту (~4 байти UTF-8 на токен) — для обліку квоти потокових відповідей."""
+    return sum(len(str(message.get("content", "")).encode("utf-8")) // 4 + 4 for message in messages)
+
+
+class TokenQuota:
+    """
+    Квота токенів на користувача за алгоритмом GCRA.
+
+    Для кожного користувача зберігається одне число — момент, коли його «відро» знову стане
+    повним. Запит дозволено, поки борг не перевищує burst токенів; фактично витрачені токени
+    списуються після відповіді. Користувачі з повним відром не зберігаються зовсім, тож пам'ять
+    залежить лише від кількості користувачів, активних протягом останніх burst / rate секунд.
+    """
+
+    def __init__(self, tokens_per_minute: float, burst: int, prune_every: int = 1000):
+        self.rate = tokens_per_minute / 60
+        self.burst = burst
+        self.prune_every = prune_every
+        self._full_at: dict[int, float] = {}
+        self._charges = 0
+
+    def retry_after(self, user_id: int) -> float:
+        """Через скільки секунд користувач зможе надіслати наступний запит (0 — вже може)."""
+        full_at = self._full_at.get(user_id)
+        if full_at is None:
+            return 0.0
+        return max(0.0, full_at - time.monotonic() - self.burst / self.rate)
+
+    def charge(self, user_id: int, tokens: int) -> None:
+        now = time.monotonic()
+        self._full_at[user_id] = max(self._full_at.get(user_id, now), now) + tokens / self.rate
+        self._charges += 1
+        if self._charges % self.prune_every == 0:
+            self._prune(now)
+
+    def _prune(self, now: float) -> None:
+        for user_id in [user_id for user_id, full_at in self._full_at.items() if full_at <= now]:
+            del self._full_at[user_id]
+
+    def __len__(self) -> int:
+        return len(self._full_at)
+
+
+class _Waiter:
+    __slots__ = ("user_id", "background", "future")
+
+    def __init__(self, user_id: int | None, background: bool, future: asyncio.Future):
+        self.user_id = user_id
+        self.background = background
+        self.future = future
+
+
+class AdmissionController:
+    """
+    Допуск запитів до моделі під навантаженням.
+
+    - Одночасно виконується не більше max_concurrent запитів, з них не більше per_user_concurrent
+      від одного користувача і background_concurrent фонових (поповнення пулів, підсумки).
+    - Решта чекає в черзі довжиною до max_queue: спершу задачі з меншим числом пріоритету
+      (короткі інтерактивні), у межах пріоритету — за порядком надходження. Запит, що не отримав
+      місця за max_wait секунд або не вмістився в чергу, відхиляється з AdmissionRejected.
+    - Користувач, що вичерпав квоту токенів, отримує відмову одразу, без звернення до моделі.
+
+    Обробники, що чекають на модель, займають слоти concurrent_updates Application; оскільки їх
+    не більше max_concurrent + max_queue, решта слотів завжди лишається дешевим оновленням
+    (/start, кнопки меню).
+    """
+
+    def __init__(self, max_concurrent: int, per_user_concurrent: int, background_concurrent: int, max_queue: int,
+                 max_wait: float, priorities: dict[str, int], background_priority: int,
+                 quota: TokenQuota | None = None, enabled: bool = True):
+        self.max_concurrent = max_concurrent
+        self.per_user_concurrent = per_user_concurrent
+        self.background_concurrent = background_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.priorities = priorities
+        self.background_priority = background_priority
+        self.quota = quota
+        self.enabled = enabled
+        self.in_flight = 0
+        self.background_in_flight = 0
+        self.queued = 0
+        self._per_user: dict[int, int] = {}
+        self._queues: dict[int, deque[_Waiter]] = {}
+        # Середня тривалість запиту (експоненційне згладжування) для оцінки retry_after
+        self._hold_time = 2.0
+        self.admitted = 0
+        self.rejected = 0
+
+    def priority(self, task: str) -> int:
+        return self.priorities.get(task, self.priorities.get("default", 1))
+
+    def _can_run(self, user_id: int | None, background: bool) -> bool:
+        if self.in_flight >= self.max_concurrent:
+            return False
+        if background:
+            return self.background_in_flight < self.background_concurrent
+        return user_id is None or self._per_user.get(user_id, 0) < self.per_user_concurrent
+
+    def _acquire(self, user_id: int | None, background: bool) -> None:
+        self.in_flight += 1
+        self.admitted += 1
+        if background:
+            self.background_in_flight += 1
+        elif user_id is not None:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+
+    def _release(self, user_id: int | None, background: bool) -> None:
+        self.in_flight -= 1
+        if background:
+            self.background_in_flight -= 1
+        elif user_id is not None:
+            remaining = self._per_user[user_id] - 1
+            if remaining:
+                self._per_user[user_id] = remaining
+            else:
+                del self._per_user[user_id]
+        self._wake()
+
+    def _wake(self) -> None:
+        """Допускає запити з черги, для яких звільнилося місце, у порядку пріоритету."""
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            for waiter in list(queue):
+                if self.in_flight >= self.max_concurrent:
+                    return
+                if waiter.future.done():
+                    continue  # очікування скасовано; запис прибере сам запит
+                if self._can_run(waiter.user_id, waiter.background):
+                    queue.remove(waiter)
+                    self.queued -= 1
+                    self._acquire(waiter.user_id, waiter.background)
+                    waiter.future.set_result(None)
+
+    def _discard(self, priority: int, waiter: _Waiter) -> None:
+        queue = self._queues.get(priority)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self.queued -= 1
+
+    def _estimate_wait(self) -> float:
+        return self._hold_time * (self.queued + 1) / self.max_concurrent
+
+    def _reject(self, task: str, reason: str, retry_after: float) -> None:
+        self.rejected += 1
+        ADMISSION_REJECTED.inc(task=task, reason=reason)
+        logger.bind(event="admission_rejected", user_id=current_user.get()).info(
+            f"Запит {task} не допущено: {reason}."
+        )
+        raise AdmissionRejected(reason, retry_after)
+
+    @asynccontextmanager
+    async def slot(self, task: str):
+        """Місце для одного запиту до моделі задачі task; AdmissionRejected, якщо його не дали."""
+        if not self.enabled:
+            yield
+            return
+        user_id = current_user.get()
+        priority = self.priority(task)
+        background = priority >= self.background_priority
+        if self.quota is not None and user_id is not None and not background:
+            retry_after = self.quota.retry_after(user_id)
+            if retry_after > 0:
+                self._reject(task, QUOTA, retry_after)
+
+        if self._can_run(user_id, background):
+            self._acquire(user_id, background)
+        else:
+            # Фонові задачі не займають обробників Application, тож обмежуються лише background_concurrent
+            if not background and self.queued >= self.max_queue:
+                self._reject(task, QUEUE_FULL, self._estimate_wait())
+            waiter = _Waiter(user_id, background, asyncio.get_running_loop().create_future())
+            self._queues.setdefault(priority, deque()).append(waiter)
+            self.queued += 1
+            queued_at = time.monotonic()
+            try:
+                await asyncio.wait_for(waiter.future, self.max_wait)
+            except asyncio.TimeoutError:
+                self._discard(priority, waiter)
+                self._reject(task, TIMEOUT, self._estimate_wait())
+            except asyncio.CancelledError:
+                # Місце могло бути видане одночасно зі скасуванням — тоді його треба повернути
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._release(user_id, background)
+                else:
+                    self._discard(priority, waiter)
+                raise
+            ADMISSION_WAIT.observe(time.monotonic() - queued_at, task=task)
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold_time = 0.8 * self._hold_time + 0.2 * (time.monotonic() - started)
+            self._release(user_id, background)
+
+    def charge(self, tokens: int) -> None:
+        """Списує витрачені токени з квоти поточного користувача."""
+        user_id = current_user.get()
+        if self.enabled and self.quota is not None and user_id is not None and tokens > 0:
+            self.quota.charge(user_id, tokens)
+
+    def check_capacity(self, concurrent_updates: int) -> None:
+        """Попереджає, якщо обробники, що чекають на модель, можуть зайняти всі слоти Application."""
+        if self.enabled and self.max_concurrent + self.max_queue >= concurrent_updates:
+            logger.warning(
+                f"ADMISSION_MAX_CONCURRENT + ADMISSION_MAX_QUEUE ({self.max_concurrent + self.max_queue}) "
+                f"не менше CONCURRENT_UPDATES ({concurrent_updates}): дешеві оновлення можуть чекати на модель."
+            )
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "quota_users": len(self.quota) if self.quota is not None else 0,
+        }
+
+
+def _build_quota() -> TokenQuota | None:
+    settings = config.admission
+    if settings.user_tokens_per_minute <= 0:
+        return None
+    return TokenQuota(settings.user_tokens_per_minute, settings.user_token_burst)
+
+
+admission_controller = AdmissionController(
+    max_concurrent=config.admission.max_concurrent,
+    per_user_concurrent=config.admission.per_user_concurrent,
+    background_concurrent=config.admission.background_concurrent,
+    max_queue=config.admission.max_queue,
+    max_wait=config.admission.max_wait,
+    priorities=config.admission.priorities,
+    background_priority=config.admission.background_priority,
+    quota=_build_quota(),
+    enabled=config.admission.enabled
+)
+
+registry.gauge("bot_admission_in_flight", "Запити до моделі, що виконуються зараз",
+               function=lambda: admission_controller.in_flight)
+registry.gauge("bot_admission_queued", "Запити до моделі, що чекають у черзі допуску",
+               function=lambda: admission_controller.queued)
@@ -0,0 +1,132 @@
+import json
+from collections.abc import Mapping
+from typing import Any, Callable
+from telegram import Update
+from telegram.ext import Application, BaseHandler
+from loguru import logger
+from src.bot.services.resources import resource_registry
+
+
+class RouteConflict(ValueError):
+    """Один callback_data веде до двох різних дій або кнопка не має обробника."""
+
+
+class CallbackRouter:
+    """
+    Таблиця маршрутизації кнопок: callback_data → дія.
+
+    Точні ключі шукаються в словнику, решта — за префіксом до першого "_" включно (talk_, quiz_),
+    тож вартість маршрутизації не залежить від кількості кнопок і обробників. Таблиця будується під
+    час старту з файлів меню і клавіатур у коді; ключ, що веде до двох різних дій (зокрема точний
+    ключ, що перекриває префікс іншої дії), — RouteConflict.
+    """
+
+    def __init__(self):
+        self._exact: dict[str, str] = {}
+        self._prefixes: dict[str, str] = {}
+        self._sources: dict[str, str] = {}  # ключ або префікс → звідки його додано
+        self._handled: set[str] = set()
+
+    def _conflict(self, key: str, action: str, other: str, source: str, registered_as: str | None = None) -> None:
+        raise RouteConflict(
+            f"Кнопка {key!r} ({source}) веде до дії {action!r}, але вже зареєстрована для {other!r} "
+            f"({self._sources.get(registered_as or key, '?')})"
+        )
+
+    @staticmethod
+    def _prefix(key: str) -> str | None:
+        head, separator, _ = key.partition("_")
+        return head + separator if separator else None
+
+    def _prefix_action(self, key: str) -> str | None:
+        prefix = self._prefix(key)
+        return self._prefixes.get(prefix) if prefix else None
+
+    def add(self, key: str, action: str | None = None, source: str = "код") -> None:
+        """Точний ключ; дія за замовчуванням — сам ключ."""
+        action = action or key
+        existing = self._exact.get(key)
+        if existing is not None and existing != action:
+            self._conflict(key, action, existing, source)
+        prefix_action = self._prefix_action(key)
+        if prefix_action is not None and prefix_action != action:
+            self._conflict(key, action, prefix_action, source, registered_as=self._prefix(key))
+        self._exact[key] = action
+        self._sources.setdefault(key, source)
+
+    def add_prefix(self, prefix: str, action: str, source: str = "код") -> None:
+        """Усі ключі, що починаються з prefix (слово з "_" у кінці), ведуть до action."""
+        if not prefix.endswith("_") or "_" in prefix[:-1]:
+            raise ValueError(f"Префікс має бути одним словом із '_' у кінці: {prefix!r}")
+        existing = self._prefixes.get(prefix)
+        if existing is not None and existing != action:
+            self._conflict(prefix, action, existing, source)
+        for key, key_action in self._exact.items():
+            if self._prefix(key) == prefix and key_action != action:
+                self._conflict(key, action, key_action, source)
+        self._prefixes[prefix] = action
+        self._sources.setdefault(prefix, source)
+
+    def add_menu(self, name: str) -> None:
+        """Ключі кнопок з файлу меню: словник {callback_data: текст} або список кнопок."""
+        try:
+            data = resource_registry.get_menu_data(name)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error(f"Не вдалося завантажити {name} для маршрутизації кнопок: {e}")
+            return
+        keys = list(data) if isinstance(data, Mapping) else [button["callback_data"] for button in data]
+        for key in keys:
+            if self._prefix_action(key) is None:
+                self.add(key, source=name)
+
+    def resolve(self, data: str) -> str | None:
+        action = self._exact.get(data)
+        return action if action is not None else self._prefix_action(data)
+
+    def handler(self, callbacks: dict[str, Callable]) -> "CallbackDataHandler":
+        """Обробник PTB для кнопок з діями callbacks (дія → callback)."""
+        self._handled.update(callbacks)
+        return CallbackDataHandler(self, callbacks)
+
+    def check(self) -> None:
+        """Перевіряє після реєстрації обробників, що кожна дія з таблиці має обробник і навпаки."""
+        actions = set(self._exact.values()) | set(self._prefixes.values())
+        unhandled = sorted(actions - self._handled)
+        if unhandled:
+            raise RouteConflict(f"Кнопки без обробника: {', '.join(unhandled)}")
+        unreachable = sorted(self._handled - actions)
+        if unreachable:
+            raise RouteConflict(f"Обробники дій, до яких не веде жодна кнопка: {', '.join(unreachable)}")
+
+    def stats(self) -> dict:
+        return {"keys": len(self._exact), "prefixes": len(self._prefixes), "actions": len(self._handled)}
+
+
+class CallbackDataHandler(BaseHandler[Update, Any]):
+    """
+    Обробник натискань кнопок за таблицею CallbackRouter.
+
+    Замінює кілька CallbackQueryHandler з регулярними виразами одним пошуком у словнику: дія
+    визначається за callback_data, і обробник спрацьовує, якщо має callback для цієї дії.
+    """
+
+    __slots__ = ("router", "callbacks")
+
+    def __init__(self, router: CallbackRouter, callbacks: dict[str, Callable], block: bool = True):
+        # Спільний callback не потрібен: handle_update викликає callback знайденої дії
+        super().__init__(None, block=block)
+        self.router = router
+        self.callbacks = callbacks
+
+    def check_update(self, update: object) -> str | None:
+        if not isinstance(update, Update) or update.callback_query is None:
+            return None
+        data = update.callback_query.data
+        if not isinstance(data, str):
+            return None
+        action = self.router.resolve(data)
+        return action if action in self.callbacks else None
+
+    async def handle_update(self, update: Update, application: Application, check_result: str, context) -> Any:
+        self.collect_additional_context(context, update, application, check_result)
+        return await self.callbacks[check_result](update, context)
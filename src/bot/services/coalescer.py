@@ -0,0 +1,109 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable, NamedTuple
+from src.settings.config import config
+
+
+class Superseded(Exception):
+    """Запит до моделі скасовано, бо користувач надіслав нове повідомлення."""
+
+
+class Turn(NamedTuple):
+    text: str  # об'єднаний текст повідомлень пачки
+    version: int  # номер останнього повідомлення пачки
+    parts: int  # скільки повідомлень об'єднано
+
+
+class _ChatState:
+    __slots__ = ("parts", "version", "task", "lock")
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.version = 0
+        self.task: asyncio.Task | None = None
+        self.lock = asyncio.Lock()
+
+
+class TurnCoalescer:
+    """
+    Послідовна обробка повідомлень одного діалогу.
+
+    Повідомлення, що приходять з інтервалом менше debounce, об'єднуються в одну репліку, тож
+    модель отримує один запит замість кількох. Якщо нове повідомлення приходить, поки відповідь
+    на попередні ще генерується, генерація скасовується, а непідтверджені повідомлення
+    потрапляють у наступну репліку. Відповіді для одного діалогу генеруються строго по черзі,
+    тому історія не змінюється з кількох обробників одночасно.
+    """
+
+    def __init__(self, debounce: float, separator: str = "\n", enabled: bool = True):
+        self.debounce = debounce
+        self.separator = separator
+        self.enabled = enabled
+        self._states: dict[Hashable, _ChatState] = {}
+        self.merged = 0
+        self.cancelled = 0
+
+    async def collect(self, key: Hashable, text: str) -> Turn | None:
+        """
+        Додає повідомлення до пачки діалогу key.
+
+        Повертає Turn, якщо за час debounce нових повідомлень не було, або None, якщо
+        повідомлення буде оброблене разом з наступним.
+        """
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _ChatState()
+        state.parts.append(text)
+        state.version += 1
+        version = state.version
+        if not self.enabled:
+            return Turn(text, version, 1)
+
+        if state.task is not None and not state.task.done():
+            state.task.cancel()
+            self.cancelled += 1
+        if self.debounce > 0:
+            await asyncio.sleep(self.debounce)
+        if state.version != version:
+            self.merged += 1
+            return None
+        return Turn(self.separator.join(state.parts), version, len(state.parts))
+
+    async def run(self, key: Hashable, turn: Turn, respond: Callable[[str], Awaitable]):
+        """
+        Виконує respond(turn.text) після завершення попередніх реплік діалогу.
+
+        Якщо поки відповідь генерувалася надійшло нове повідомлення, respond скасовується
+        і піднімається Superseded; respond має сам відкотити свої зміни при CancelledError.
+        """
+        state = self._states[key]
+        async with state.lock:
+            if self.enabled and state.version != turn.version:
+                raise Superseded()
+            task = asyncio.create_task(respond(turn.text))
+            state.task = task
+            try:
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
+            finally:
+                state.task = None
+                if not task.cancelled():
+                    # Повідомлення пачки оброблено (успішно чи з помилкою) і більше не повторюються
+                    del state.parts[:turn.parts]
+                if not state.parts and state.version == turn.version:
+                    self._states.pop(key, None)
+
+        if task.cancelled():
+            raise Superseded()
+        return task.result()
+
+    def stats(self) -> dict:
+        return {"active_dialogues": len(self._states), "merged": self.merged, "cancelled": self.cancelled}
+
+
+turn_coalescer = TurnCoalescer(
+    debounce=config.coalescing.debounce,
+    separator=config.coalescing.separator,
+    enabled=config.coalescing.enabled
+)
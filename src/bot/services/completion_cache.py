@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.metrics import registry, COMPLETION_CACHE_LOOKUPS, COMPLETION_CACHE_COALESCED
+
+
+def normalize_messages(messages: list[dict]) -> list[dict]:
+    """Прибирає відмінності, що не впливають на відповідь: зайві пробіли та переноси рядків."""
+    return [{"role": m["role"], "content": " ".join(str(m.get("content", "")).split())} for m in messages]
+
+
+def cache_key(model: str, messages: list[dict], temperature: float, step: float | None = None, **kwargs) -> str:
+    """Ключ кешу: модель, нормалізовані повідомлення, округлена температура та інші параметри запиту."""
+    step = step or config.completion_cache.temperature_step
+    payload = {
+        "model": model,
+        "messages": normalize_messages(messages),
+        "temperature": round(round(temperature / step) * step, 3),
+        "params": kwargs,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class CompletionCache:
+    """
+    Кеш відповідей моделі для запитів, що не залежать від користувача.
+
+    - У пам'яті: LRU на max_entries записів, у кожного запису свій TTL.
+    - На диску (необов'язково): SQLite-таблиця, яка переживає перезапуск бота; читання і запис
+      виконуються в окремому потоці.
+    - Однакові запити, що надходять одночасно, чекають на один виклик моделі (single-flight).
+    """
+
+    def __init__(self, max_entries: int, disk_path: Path | None = None, busy_timeout: float = 10):
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.busy_timeout = busy_timeout
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # --- Дисковий рівень ---
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.disk_path.parent, exist_ok=True)
+            # Файл кешу спільний для процесів-обробників: чекаємо на блокування, а не отримуємо помилку
+            self._conn = sqlite3.connect(self.disk_path, timeout=self.busy_timeout, check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+        return self._conn
+
+    def _disk_get(self, key: str) -> tuple[float, str] | None:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT expires_at, value FROM completions WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def _disk_put(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            conn = self._connection()
+            conn.execute("INSERT OR REPLACE INTO completions (key, value, expires_at) VALUES (?, ?, ?)",
+                         (key, value, expires_at))
+            conn.execute("DELETE FROM completions WHERE expires_at <= ?", (time.time(),))
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- Основний інтерфейс ---
+
+    def _memory_get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _memory_put(self, key: str, value: str, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> str | None:
+        """Повертає збережену відповідь (з пам'яті або з диска) чи None."""
+        value = self._memory_get(key)
+        if value is not None:
+            self.hits += 1
+            COMPLETION_CACHE_LOOKUPS.inc(result="memory_hit")
+            return value
+        if self.disk_path is not None:
+            try:
+                entry = await asyncio.to_thread(self._disk_get, key)
+            except sqlite3.Error as e:
+                logger.warning(f"Не вдалося прочитати кеш відповідей з диска: {e}")
+                entry = None
+            if entry is not None:
+                self.disk_hits += 1
+                COMPLETION_CACHE_LOOKUPS.inc(result="disk_hit")
+                self._memory_put(key, entry[1], entry[0])
+                return entry[1]
+        self.misses += 1
+        COMPLETION_CACHE_LOOKUPS.inc(result="miss")
+        return None
+
+    async def put(self, key: str, value: str, ttl: float) -> None:
+        expires_at = time.time() + ttl
+        self._memory_put(key, value, expires_at)
+        if self.disk_path is not None:
+            try:
+                await asyncio.to_thread(self._disk_put, key, value, expires_at)
+            except sqlite3.Error as e:
+                logger.warning(f"Не вдалося записати кеш відповідей на диск: {e}")
+
+    async def get_or_compute(self, key: str, ttl: float, compute: Callable[[], Awaitable[str]],
+                             private_errors: tuple[type[Exception], ...] = ()) -> str:
+        """
+        Повертає відповідь з кешу або обчислює її через compute().
+
+        Поки відповідь обчислюється, інші запити з тим самим ключем чекають на неї,
+        а не звертаються до моделі вдруге. Помилка compute() передається всім, хто чекав,
+        крім помилок з private_errors (наприклад, відмови в допуску саме цьому користувачу):
+        тоді один із тих, хто чекав, обчислює відповідь сам.
+        """
+        while (inflight := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            COMPLETION_CACHE_COALESCED.inc()
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # Скасовано запит, на який ми чекали, а не нас — обчислюємо самі
+                if not inflight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self.get(key)
+            if value is None:
+                value = await compute()
+                await self.put(key, value, ttl)
+            future.set_result(value)
+            return value
+        except (asyncio.CancelledError, *private_errors):
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Позначаємо виняток як отриманий, якщо ніхто більше не чекав
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+
+completion_cache = CompletionCache(
+    max_entries=config.completion_cache.max_entries,
+    disk_path=config.completion_cache.disk_path if config.completion_cache.disk_enabled else None,
+    busy_timeout=config.completion_cache.busy_timeout
+)
+
+registry.gauge("bot_completion_cache_entries", "Відповіді моделі в кеші в пам'яті",
+               function=lambda: len(completion_cache._entries))
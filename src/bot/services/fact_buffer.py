@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import json
+import re
+from collections import deque
+from loguru import logger
+from src.settings.config import config
+from src.bot.services import llm
+from src.bot.services.resources import resource_registry
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class MinHashIndex:
+    """
+    Індекс MinHash з LSH-бакетами для пошуку майже однакових текстів.
+
+    Текст розбивається на шингли (послідовності shingle_size слів), для кожного тексту будується
+    сигнатура з num_perm мінімальних хешів. Сигнатура ділиться на bands смуг; тексти зі спільною
+    смугою стають кандидатами, і для них оцінюється схожість Жаккара. Індекс обмежений capacity
+    останніх записів.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, shingle_size: int = 3, capacity: int = 5000):
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.capacity = capacity
+        # Параметри незалежних хеш-функцій вигляду (a * x + b) mod p
+        seed = hashlib.sha256(b"minhash").digest()
+        self._params = []
+        for i in range(num_perm):
+            digest = hashlib.blake2b(seed + i.to_bytes(4, "little"), digest_size=16).digest()
+            a = int.from_bytes(digest[:8], "little") % _MERSENNE_PRIME or 1
+            b = int.from_bytes(digest[8:], "little") % _MERSENNE_PRIME
+            self._params.append((a, b))
+        self._buckets: dict[tuple, set[int]] = {}
+        self._signatures: dict[int, tuple] = {}
+        self._order: deque[int] = deque()
+        self._next_id = 0
+
+    def _shingles(self, text: str) -> set[int]:
+        words = _WORD.findall(text.lower())
+        if len(words) < self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        return {int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+                for s in shingles}
+
+    def signature(self, text: str) -> tuple:
+        shingles = self._shingles(text)
+        return tuple(
+            min(((a * s + b) % _MERSENNE_PRIME) & _MAX_HASH for s in shingles)
+            for a, b in self._params
+        )
+
+    def _band_keys(self, signature: tuple):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def max_similarity(self, signature: tuple) -> float:
+        """Найбільша оцінена схожість Жаккара з текстами в індексі."""
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates |= self._buckets.get(key, set())
+        best = 0.0
+        for candidate in candidates:
+            other = self._signatures[candidate]
+            matches = sum(1 for x, y in zip(signature, other) if x == y)
+            best = max(best, matches / self.num_perm)
+        return best
+
+    def add(self, signature: tuple) -> None:
+        entry_id = self._next_id
+        self._next_id += 1
+        self._signatures[entry_id] = signature
+        self._order.append(entry_id)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, set()).add(entry_id)
+        while len(self._order) > self.capacity:
+            self._remove(self._order.popleft())
+
+    def _remove(self, entry_id: int) -> None:
+        signature = self._signatures.pop(entry_id)
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+
+def parse_facts(raw: str) -> list[str]:
+    """Розбирає JSON-відповідь моделі зі списком фактів."""
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`")
+        raw = raw[raw.find("{"):]
+    data = json.loads(raw)
+    items = data.get("facts", []) if isinstance(data, dict) else data
+    return [str(item).strip() for item in items if str(item).strip()]
+
+
+class FactBuffer:
+    """
+    Буфер готових випадкових фактів.
+
+    Фонове завдання поповнює буфер пакетами (batch_size фактів за один запит до моделі),
+    відкидаючи майже однакові факти за допомогою MinHash-індексу всіх нещодавно згенерованих
+    фактів. Кожен факт видається лише один раз за O(1). Для кожного користувача зберігаються ключі
+    (хеші MinHash-сигнатур) останніх seen_per_user отриманих фактів, тож факт, який користувач уже
+    бачив (зокрема з кешу відповідей, коли буфер порожній), йому не видається повторно.
+    Поповнення починається, коли в буфері менше low_water фактів, і триває до capacity; якщо
+    пакет не дав нових фактів, наступна спроба відкладається з подвоєнням паузи.
+    """
+
+    def __init__(self, capacity: int, low_water: int, batch_size: int, refill_interval: float,
+                 dedup_threshold: float, dedup_history: int, refill_backoff_max: float = 300,
+                 seen_per_user: int = 200):
+        self.capacity = capacity
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.refill_interval = refill_interval
+        self.refill_backoff_max = refill_backoff_max
+        self.seen_per_user = seen_per_user
+        self.dedup_threshold = dedup_threshold
+        self.index = MinHashIndex(capacity=dedup_history)
+        self._facts: deque[tuple[str, int]] = deque()  # факт і його ключ
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.generated = 0
+        self.duplicates = 0
+        self.api_calls = 0
+        self.served = 0
+
+    def start(self) -> None:
+        """Запускає фонове поповнення буфера."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refill_loop())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def __len__(self) -> int:
+        return len(self._facts)
+
+    def take(self, seen: list[int] | None = None) -> str | None:
+        """Видає готовий факт, якого немає серед ключів seen, або None, якщо такого в буфері немає."""
+        fact = None
+        for position, (text, key) in enumerate(self._facts):
+            if seen is None or key not in seen:
+                del self._facts[position]
+                fact = text
+                self.served += 1
+                break
+        if len(self._facts) < self.low_water:
+            self._wakeup.set()
+        return fact
+
+    def add(self, fact: str) -> bool:
+        """Додає факт, якщо він не схожий на вже згенеровані; повертає True, якщо додано."""
+        self.generated += 1
+        signature = self.index.signature(fact)
+        if self.index.max_similarity(signature) >= self.dedup_threshold:
+            self.duplicates += 1
+            return False
+        self.index.add(signature)
+        self._facts.append((fact, hash(signature)))
+        return True
+
+    def fact_key(self, fact: str) -> int:
+        """Ключ факту для списку побаченого: хеш MinHash-сигнатури (однаковий в усіх процесах)."""
+        return hash(self.index.signature(fact))
+
+    def remember(self, seen: list[int], fact: str) -> None:
+        """
+        Запам'ятовує, що користувач отримав факт, і додає факт до індексу дублікатів, якщо він
+        згенерований поза буфером (запасний шлях через кеш відповідей) — тоді буфер не згенерує
+        його повтор.
+        """
+        signature = self.index.signature(fact)
+        if self.index.max_similarity(signature) < self.dedup_threshold:
+            self.index.add(signature)
+        key = hash(signature)
+        if key not in seen:
+            seen.append(key)
+            del seen[:-self.seen_per_user]
+
+    async def _fill(self) -> bool:
+        """Поповнює буфер до capacity; повертає False, якщо пакет не дав нових фактів або стався збій."""
+        while len(self._facts) < self.capacity:
+            try:
+                if not await self._generate_batch():
+                    return False
+            except Exception as e:
+                logger.warning(f"Не вдалося поповнити буфер фактів: {e}")
+                return False
+        return True
+
+    async def _refill_loop(self) -> None:
+        backoff = self.refill_interval
+        while True:
+            self._wakeup.clear()
+            if len(self._facts) < self.low_water:
+                if await self._fill():
+                    backoff = self.refill_interval
+                else:
+                    # Модель повертає лише повтори або недоступна — не звертаємось до неї на кожен take()
+                    logger.debug(f"Буфер фактів: наступна спроба поповнення через {backoff:.0f} с")
+                    await asyncio.sleep(backoff)
+                    backoff = min(self.refill_backoff_max, backoff * 2)
+                    continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _generate_batch(self) -> int:
+        prompt = resource_registry.get_prompt("random_batch.txt")
+        self.api_calls += 1
+        raw = await llm.complete(
+            [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": f"Кількість фактів: {self.batch_size}."}
+            ],
+            task="random_batch",
+            response_format={"type": "json_object"}
+        )
+        added = 0
+        for fact in parse_facts(raw):
+            if len(self._facts) >= self.capacity:
+                break
+            added += self.add(fact)
+        logger.debug(f"Буфер фактів: додано {added}, усього {len(self._facts)}")
+        return added
+
+    def stats(self) -> dict:
+        return {
+            "buffered": len(self._facts),
+            "served": self.served,
+            "generated": self.generated,
+            "duplicates": self.duplicates,
+            "api_calls": self.api_calls,
+            "api_calls_per_fact": self.api_calls / self.served if self.served else 0.0,
+        }
+
+
+fact_buffer = FactBuffer(
+    capacity=config.fact_buffer.capacity,
+    low_water=config.fact_buffer.low_water,
+    batch_size=config.fact_buffer.batch_size,
+    refill_interval=config.fact_buffer.refill_interval,
+    dedup_threshold=config.fact_buffer.dedup_threshold,
+    dedup_history=config.fact_buffer.dedup_history,
+    refill_backoff_max=config.fact_buffer.refill_backoff_max,
+    seen_per_user=config.fact_buffer.seen_per_user
+)
@@ -0,0 +1,160 @@
+import re
+import unicodedata
+from typing import NamedTuple
+from src.settings.config import config
+
+CORRECT = "correct"
+INCORRECT = "incorrect"
+AMBIGUOUS = "ambiguous"
+
+# Транслітерація українського алфавіту латиницею (спрощена офіційна схема 2010 р.)
+_TRANSLIT = {
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie", "ж": "zh", "з": "z",
+    "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n", "о": "o", "п": "p",
+    "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh",
+    "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "ъ": "", "ы": "y", "э": "e", "ё": "io",
+}
+_TRANSLIT_TABLE = str.maketrans(_TRANSLIT)
+_APOSTROPHES = str.maketrans({"’": "", "ʼ": "", "'": "", "`": ""})
+# «#» і «+» розрізняють відповіді («C», «C#», «C++»), тому їх не прибираємо
+_NON_WORD = re.compile(r"[^\w#+]+", re.UNICODE)
+_NUMBER = re.compile(r"\d+")
+# Найдовший префікс, який може змінити зміст слова на протилежний («a»synchronous, «не»стабільний)
+_MAX_PREFIX = 3
+# Слова, які можна додати до правильної відповіді, не змінюючи її змісту («це docker compose»);
+# будь-яке інше слово поруч з еталоном (заперечення, друга відповідь) вирішує модель
+_FILLER_WORDS = ("це", "є", "то", "ось", "відповідь", "звісно", "the", "a", "an", "is", "it", "its", "answer")
+
+
+class GradeResult(NamedTuple):
+    verdict: str
+    confidence: float
+    matched: str | None
+
+
+def normalize(text: str) -> str:
+    """Приводить відповідь до порівнюваного вигляду: регістр, пунктуація, пробіли, латиниця."""
+    text = unicodedata.normalize("NFKC", text).lower().translate(_APOSTROPHES)
+    text = _NON_WORD.sub(" ", text).translate(_TRANSLIT_TABLE)
+    return " ".join(text.split())
+
+
+def compact(text: str) -> str:
+    """Відповідь без пробілів і зі збереженими символами — для відповідей на кшталт «===» чи «=>»."""
+    return "".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+_FILLER = frozenset(normalize(word) for word in _FILLER_WORDS)
+
+
+def levenshtein_ratio(a: str, b: str) -> float:
+    """Схожість 0..1 на основі відстані редагування."""
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return 1.0 - previous[-1] / len(a)
+
+
+def token_overlap(a: str, b: str) -> float:
+    """Частка спільних слів (коефіцієнт Жаккара)."""
+    tokens_a, tokens_b = set(a.split()), set(b.split())
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def extra_words(candidate: str, reference: str) -> set[str] | None:
+    """Слова відповіді поза еталоном, якщо відповідь містить еталон цілими словами, інакше None."""
+    if candidate == reference or f" {reference} " not in f" {candidate} ":
+        return None
+    return set(candidate.split()) - set(reference.split())
+
+
+def near_miss(candidate: str, reference: str) -> bool:
+    """
+    Відповідь схожа на еталон, але може означати інше: відрізняються числа («python 2» і «python 3»)
+    або одне зі слів має зайвий короткий префікс («synchronous» і «asynchronous», «стабільний» і «нестабільний»).
+    """
+    if _NUMBER.findall(candidate) != _NUMBER.findall(reference):
+        return True
+    words_a, words_b = candidate.split(), reference.split()
+    if len(words_a) != len(words_b):
+        return False
+    for a, b in zip(words_a, words_b):
+        if len(a) < len(b):
+            a, b = b, a
+        if a != b and a.endswith(b) and len(a) - len(b) <= _MAX_PREFIX:
+            return True
+    return False
+
+
+def similarity(candidate: str, reference: str) -> float:
+    """Найкраща з оцінок схожості для вже нормалізованих рядків."""
+    if not candidate or not reference:
+        return 0.0
+    # Еталон цілими словами в оточенні лише службових слів («це docker compose») — збіг
+    extra = extra_words(candidate, reference)
+    if extra is not None and extra <= _FILLER:
+        return 1.0
+    return max(levenshtein_ratio(candidate, reference), token_overlap(candidate, reference))
+
+
+def grade(user_answer: str, answer: str, aliases: list[str] | tuple = (),
+          accept_threshold: float | None = None, reject_threshold: float | None = None) -> GradeResult:
+    """
+    Оцінює відповідь локально.
+
+    Повертає CORRECT, якщо схожість з еталоном чи одним із синонімів не нижче accept_threshold,
+    INCORRECT, якщо вона нижча за reject_threshold, і AMBIGUOUS в усіх інших випадках —
+    тоді рішення має прийняти модель. Відповіді з самих символів («===», «=>») порівнюються
+    дослівно, а неточні збіги з іншими числами чи префіксом («python 2», «synchronous»)
+    завжди передаються моделі.
+    """
+    accept = config.grading.accept_threshold if accept_threshold is None else accept_threshold
+    reject = config.grading.reject_threshold if reject_threshold is None else reject_threshold
+
+    if not user_answer.strip():
+        return GradeResult(INCORRECT, 1.0, None)
+    candidate = normalize(user_answer)
+
+    best_score, best_match = 0.0, None
+    min_reference_words = None
+    hedged = symbolic = near = False
+    for reference in (answer, *aliases):
+        normalized_reference = normalize(reference)
+        if not candidate or not normalized_reference:
+            # Після нормалізації нічого не лишилось (оператори, символи) — лише дослівний збіг
+            if compact(user_answer) == compact(reference):
+                return GradeResult(CORRECT, 1.0, reference)
+            symbolic = True
+            continue
+        words = len(normalized_reference.split())
+        min_reference_words = words if min_reference_words is None else min(min_reference_words, words)
+        # «не docker», «docker або kubernetes»: еталон є, але поруч заперечення чи інша відповідь
+        extra = extra_words(candidate, normalized_reference)
+        hedged = hedged or (extra is not None and not extra <= _FILLER)
+        score = similarity(candidate, normalized_reference)
+        if score > best_score:
+            best_score, best_match = score, reference
+            near = accept <= score < 1.0 and near_miss(candidate, normalized_reference)
+            if score == 1.0:
+                break
+
+    if best_score == 1.0 or (best_score >= accept and not hedged and not near):
+        return GradeResult(CORRECT, best_score, best_match)
+    if hedged or near or symbolic:
+        return GradeResult(AMBIGUOUS, best_score, best_match)
+    # Розгорнуту відповідь (наприклад, опис терміна замість абревіатури) не відхиляємо локально
+    descriptive = len(candidate.split()) > min_reference_words + 1
+    if best_score < reject and not descriptive:
+        return GradeResult(INCORRECT, 1.0 - best_score, best_match)
+    return GradeResult(AMBIGUOUS, best_score, best_match)
@@ -0,0 +1,278 @@
+import zlib
+from array import array
+from telegram.ext import Application
+from loguru import logger
+from src.settings.config import config
+from src.bot.services import llm
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken необов'язковий, без нього використовується наближена оцінка
+    tiktoken = None
+
+# Службові токени, які модель додає до кожного повідомлення
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = (
+    "Стисло підсумуй попередню частину розмови між користувачем і асистентом. "
+    "Збережи факти, імена, домовленості та питання, на які ще не відповіли. "
+    "Пиши українською, не більше кількох речень."
+)
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Рахує кількість токенів у тексті (точно з tiktoken або наближено за кількістю байтів)."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.encoding_for_model(config.openai.model)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text)) + MESSAGE_OVERHEAD_TOKENS
+    # Приблизно 4 байти UTF-8 на токен: ~4 латинські або ~2 кириличні символи
+    return len(text.encode("utf-8")) // 4 + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+class PromptTable:
+    """
+    Системні промпти, збережені один раз на процес.
+
+    Розмова зберігає лише номер промпта, тож тисячі сесій з однією особистістю посилаються на
+    один рядок, а кількість його токенів рахується один раз. Номери діють лише в межах процесу:
+    у знімок сесії потрапляє текст промпта, який при завантаженні інтернується знову.
+    """
+
+    def __init__(self):
+        self._ids: dict[str, int] = {}
+        self._texts: list[str] = []
+        self._tokens: list[int] = []
+
+    def intern(self, text: str) -> int:
+        prompt_id = self._ids.get(text)
+        if prompt_id is None:
+            prompt_id = len(self._texts)
+            self._ids[text] = prompt_id
+            self._texts.append(text)
+            self._tokens.append(count_tokens(text))
+        return prompt_id
+
+    def text(self, prompt_id: int) -> str:
+        return self._texts[prompt_id]
+
+    def tokens(self, prompt_id: int) -> int:
+        return self._tokens[prompt_id]
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+
+prompt_table = PromptTable()
+
+# Ролі реплік зберігаються одним байтом: індекс у цьому кортежі
+ROLES = ("user", "assistant")
+_ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+
+
+class DialogueHistory:
+    """
+    Історія діалогу з обмеженням за кількістю токенів.
+
+    Кількість токенів кожного повідомлення рахується один раз, під час додавання. Системний промпт
+    і останні репліки зберігаються дослівно, а старіші репліки згортаються у підсумок, який
+    генерується у фоні і не затримує відповідь користувачу.
+
+    Репліки зберігаються в паралельних масивах (роль — байт, токени — array, текст — рядок),
+    а не словниками; системний промпт — номером у prompt_table. Тексти реплік, старших за
+    compress_after останніх, стискаються zlib, якщо це зменшує їх розмір. Словники
+    {"role", "content"} створюються лише в messages(), безпосередньо перед запитом до API.
+    """
+
+    __slots__ = ("prompt_id", "token_budget", "keep_recent", "_roles", "_contents", "_tokens", "_compressed_upto",
+                 "summary", "summary_tokens", "summarized_turns", "prompt_tokens_sent", "requests", "_summarizing")
+
+    def __init__(self, system_prompt: str, token_budget: int | None = None, keep_recent: int | None = None):
+        self.prompt_id = prompt_table.intern(system_prompt)
+        self.token_budget = token_budget or config.history.token_budget
+        self.keep_recent = keep_recent or config.history.keep_recent_turns
+        self._roles = bytearray()
+        self._contents: list[str | bytes] = []  # bytes — текст, стиснутий zlib
+        self._tokens = array("I")
+        self._compressed_upto = 0  # репліки до цього номера вже розглянуто для стиснення
+        self.summary: str | None = None
+        self.summary_tokens = 0
+        self.summarized_turns = 0
+        self.prompt_tokens_sent = 0
+        self.requests = 0
+        self._summarizing = False
+
+    def __getstate__(self):
+        return {
+            "system_prompt": self.system_prompt,
+            "token_budget": self.token_budget,
+            "keep_recent": self.keep_recent,
+            "roles": bytes(self._roles),
+            "contents": self._contents,
+            "tokens": self._tokens.tobytes(),
+            "compressed_upto": self._compressed_upto,
+            "summary": self.summary,
+            "summary_tokens": self.summary_tokens,
+            "summarized_turns": self.summarized_turns,
+            "prompt_tokens_sent": self.prompt_tokens_sent,
+            "requests": self.requests,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.prompt_id = prompt_table.intern(state["system_prompt"])
+        self.token_budget = state["token_budget"]
+        self.keep_recent = state["keep_recent"]
+        self._tokens = array("I")
+        if "turns" in state:
+            # Сесії, збережені до переходу на масиви: список словників і список токенів
+            self._roles = bytearray(_ROLE_CODES[turn["role"]] for turn in state["turns"])
+            self._contents = [turn["content"] for turn in state["turns"]]
+            self._tokens.extend(state["turn_tokens"])
+            self._compressed_upto = 0
+        else:
+            self._roles = bytearray(state["roles"])
+            self._contents = state["contents"]
+            self._tokens.frombytes(state["tokens"])
+            self._compressed_upto = state["compressed_upto"]
+        self.summary = state["summary"]
+        self.summary_tokens = state["summary_tokens"]
+        self.summarized_turns = state["summarized_turns"]
+        self.prompt_tokens_sent = state["prompt_tokens_sent"]
+        self.requests = state["requests"]
+        self._summarizing = False
+
+    @property
+    def system_prompt(self) -> str:
+        return prompt_table.text(self.prompt_id)
+
+    @property
+    def system_tokens(self) -> int:
+        return prompt_table.tokens(self.prompt_id)
+
+    def __len__(self) -> int:
+        return len(self._roles)
+
+    def _text(self, index: int) -> str:
+        content = self._contents[index]
+        return zlib.decompress(content).decode("utf-8") if isinstance(content, bytes) else content
+
+    def _turn(self, index: int) -> dict:
+        return {"role": ROLES[self._roles[index]], "content": self._text(index)}
+
+    def _compress_old(self) -> None:
+        """Стискає тексти реплік, що вийшли за межі compress_after останніх."""
+        keep = config.history.compress_after_turns
+        if not keep:
+            return
+        while self._compressed_upto < len(self._contents) - keep:
+            content = self._contents[self._compressed_upto]
+            if isinstance(content, str) and len(content) >= config.history.compress_min_chars:
+                encoded = content.encode("utf-8")
+                compressed = zlib.compress(encoded)
+                if len(compressed) < len(encoded):
+                    self._contents[self._compressed_upto] = compressed
+            self._compressed_upto += 1
+
+    def append(self, role: str, content: str) -> None:
+        self._roles.append(_ROLE_CODES[role])
+        self._contents.append(content)
+        self._tokens.append(count_tokens(content))
+        self._compress_old()
+
+    def pop_last(self) -> dict | None:
+        """Прибирає останню репліку (наприклад, запит, відповідь на який було скасовано)."""
+        if not self._roles:
+            return None
+        turn = self._turn(len(self._roles) - 1)
+        self._roles.pop()
+        self._contents.pop()
+        self._tokens.pop()
+        self._compressed_upto = min(self._compressed_upto, len(self._roles))
+        return turn
+
+    @property
+    def total_tokens(self) -> int:
+        return self.system_tokens + self.summary_tokens + sum(self._tokens)
+
+    def messages(self) -> list[dict]:
+        """
+        Повертає повідомлення для запиту до API в межах бюджету токенів.
+
+        Якщо підсумок ще не готовий, а історія вже перевищує бюджет, найстаріші репліки
+        просто не надсилаються.
+        """
+        system_tokens = self.system_tokens
+        budget = self.token_budget - system_tokens - self.summary_tokens
+        used = 0
+        start = len(self._tokens)
+        # Останнє повідомлення (запит користувача) надсилається завжди
+        while start > 0 and (used + self._tokens[start - 1] <= budget or start == len(self._tokens)):
+            start -= 1
+            used += self._tokens[start]
+
+        messages = [{"role": "system", "content": self.system_prompt}]
+        if self.summary:
+            messages.append({"role": "system", "content": f"Підсумок попередньої розмови: {self.summary}"})
+        messages.extend(self._turn(index) for index in range(start, len(self._roles)))
+
+        self.requests += 1
+        self.prompt_tokens_sent += system_tokens + self.summary_tokens + used
+        return messages
+
+    def needs_summary(self) -> bool:
+        return (not self._summarizing
+                and len(self) > self.keep_recent
+                and self.total_tokens > self.token_budget * config.history.summarize_threshold)
+
+    async def summarize(self) -> None:
+        """Згортає старі репліки (крім keep_recent останніх) у підсумок."""
+        fold_count = len(self) - self.keep_recent
+        if fold_count <= 0:
+            self._summarizing = False
+            return
+        self._summarizing = True
+        try:
+            transcript = "\n".join(f"{ROLES[self._roles[index]]}: {self._text(index)}" for index in range(fold_count))
+            if self.summary:
+                transcript = f"Попередній підсумок: {self.summary}\n{transcript}"
+            summary = await llm.complete(
+                [{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}],
+                task="summary"
+            )
+            # За час генерації могли додатися нові репліки, але лише в кінець списку
+            del self._roles[:fold_count]
+            del self._contents[:fold_count]
+            del self._tokens[:fold_count]
+            self._compressed_upto = max(0, self._compressed_upto - fold_count)
+            self.summary = summary.strip()
+            self.summary_tokens = count_tokens(self.summary)
+            self.summarized_turns += fold_count
+        except Exception as e:
+            logger.warning(f"Не вдалося підсумувати історію діалогу: {e}")
+        finally:
+            self._summarizing = False
+
+    def stats(self) -> dict:
+        """Статистика токенів для поточної розмови."""
+        return {
+            "turns": len(self),
+            "summarized_turns": self.summarized_turns,
+            "history_tokens": self.total_tokens,
+            "summary_tokens": self.summary_tokens,
+            "token_budget": self.token_budget,
+            "requests": self.requests,
+            "prompt_tokens_sent": self.prompt_tokens_sent,
+        }
+
+
+def schedule_summary(application: Application, history: DialogueHistory) -> None:
+    """Запускає підсумовування у фоні, якщо історія наближається до бюджету."""
+    if history.needs_summary():
+        history._summarizing = True
+        application.create_task(history.summarize())
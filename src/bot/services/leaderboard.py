@@ -0,0 +1,334 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from sortedcontainers import SortedList
+from loguru import logger
+from src.settings.config import config
+
+# Ключ дошки "усі теми"; решта дошок — за ключами тем квізу (quiz_python, ...)
+GLOBAL = "all"
+
+# Ключ запису в SortedList — одне ціле число: бали, потім час останньої зміни (раніший — вище),
+# потім id користувача. Ціле займає вдвічі менше пам'яті, ніж кортеж, і порівнюється швидше
+_USER_BITS = 53  # id користувачів Telegram вміщаються у 52 біти
+_TIME_BITS = 43  # мілісекунди Unix-часу до 2248 року
+_USER_MASK = (1 << _USER_BITS) - 1
+_TIME_MAX = (1 << _TIME_BITS) - 1
+_SCORE_SHIFT = _USER_BITS + _TIME_BITS
+
+
+def _pack(score: int, updated_ms: int, user_id: int) -> int:
+    return (score << _SCORE_SHIFT) | ((_TIME_MAX - updated_ms) << _USER_BITS) | user_id
+
+
+def _score(key: int) -> int:
+    return key >> _SCORE_SHIFT
+
+
+def _updated_ms(key: int) -> int:
+    return _TIME_MAX - ((key >> _USER_BITS) & _TIME_MAX)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class Board:
+    """
+    Рейтинг однієї теми: дерево порядкової статистики (SortedList) і словник user_id → ключ.
+
+    Оновлення бала, місце користувача і перші n — O(log n). Більший бал — вище; за однакового
+    бала вище той, хто набрав його раніше.
+    """
+
+    __slots__ = ("_keys", "_by_user")
+
+    def __init__(self, keys: dict[int, int] | None = None):
+        self._by_user: dict[int, int] = keys or {}
+        # Побудова з готового набору — одне сортування замість n вставок
+        self._keys = SortedList(self._by_user.values())
+
+    def __len__(self) -> int:
+        return len(self._by_user)
+
+    def set(self, user_id: int, score: int, updated_ms: int) -> None:
+        old = self._by_user.get(user_id)
+        if old is not None:
+            self._keys.remove(old)
+        key = _pack(score, updated_ms, user_id)
+        self._by_user[user_id] = key
+        self._keys.add(key)
+
+    def score(self, user_id: int) -> int:
+        key = self._by_user.get(user_id)
+        return 0 if key is None else _score(key)
+
+    def updated_ms(self, user_id: int) -> int:
+        key = self._by_user.get(user_id)
+        return 0 if key is None else _updated_ms(key)
+
+    def rank(self, user_id: int) -> int | None:
+        """Місце користувача (1 — перше) або None, якщо його немає в рейтингу."""
+        key = self._by_user.get(user_id)
+        if key is None:
+            return None
+        return len(self._keys) - self._keys.bisect_left(key)
+
+    def top(self, n: int) -> list[tuple[int, int]]:
+        """Перші n записів: [(user_id, бали)]."""
+        return [(key & _USER_MASK, _score(key)) for key in self._keys.islice(-n, reverse=True)] if n > 0 else []
+
+
+class Leaderboard:
+    """
+    Постійний рейтинг квізу: загальний і для кожної теми.
+
+    - Бали всіх користувачів тримаються в пам'яті (Board для кожної теми і для всіх тем разом),
+      тож рейтинг і місце користувача рахуються без звернення до диска.
+    - Зміни записуються в SQLite пакетами (write-behind): раз на flush_interval секунд або щойно
+      набереться batch_size змін. Кілька відповідей одного користувача між записами стають одним
+      рядком, бо зберігається підсумковий бал теми.
+    - З кількома процесами-обробниками кожен процес після запису дочитує рядки, змінені іншими
+      процесами (за номером пакета seq), тож рейтинг у всіх процесах сходиться за flush_interval.
+    - Дані завантажуються у фоні під час старту; бали, набрані до завершення завантаження,
+      додаються після нього.
+    """
+
+    def __init__(self, db_path: Path, flush_interval: float, batch_size: int, shared: bool = False,
+                 busy_timeout: float = 30):
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.shared = shared
+        self.busy_timeout = busy_timeout
+
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._boards: dict[str, Board] = {GLOBAL: Board()}
+        self._loaded = False
+        self._backlog: list[tuple[int, str, str | None, int]] = []  # бали, набрані до завантаження
+        self._pending: dict[tuple[int, str], tuple[int, int]] = {}  # (user_id, тема) -> (бали, час)
+        self._pending_names: dict[int, str] = {}
+        self._synced_seq = 0
+        self._write_lock = asyncio.Lock()
+        self._flush_task: asyncio.Task | None = None
+        self._maintenance_task: asyncio.Task | None = None
+        self.writes = 0
+        self.rows_written = 0
+        self.write_errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.db_path.parent, exist_ok=True)
+            # Процеси-обробники пишуть у спільну базу: чекаємо на блокування, а не отримуємо «database is locked»
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False,
+                                   isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quiz_scores ("
+                "user_id INTEGER NOT NULL, topic TEXT NOT NULL, score INTEGER NOT NULL, "
+                "updated_ms INTEGER NOT NULL, seq INTEGER NOT NULL, PRIMARY KEY (user_id, topic))"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS quiz_scores_seq ON quiz_scores (seq)")
+            conn.execute("CREATE TABLE IF NOT EXISTS quiz_players (user_id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+            self._conn = conn
+        return self._conn
+
+    # --- Життєвий цикл ---
+
+    def _read_all(self) -> tuple[dict[str, Board], int]:
+        keys: dict[str, dict[int, int]] = {}
+        totals: dict[int, int] = {}
+        last_update: dict[int, int] = {}
+        with self._lock:
+            conn = self._connect()
+            seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM quiz_scores").fetchone()[0]
+            # Рядки читаються курсором, без проміжного списку на мільйони кортежів
+            for user_id, topic, score, updated_ms in conn.execute(
+                    "SELECT user_id, topic, score, updated_ms FROM quiz_scores"):
+                topic_keys = keys.get(topic)
+                if topic_keys is None:
+                    topic_keys = keys[topic] = {}
+                topic_keys[user_id] = _pack(score, updated_ms, user_id)
+                totals[user_id] = totals.get(user_id, 0) + score
+                if updated_ms > last_update.get(user_id, 0):
+                    last_update[user_id] = updated_ms
+        keys[GLOBAL] = {user_id: _pack(score, last_update[user_id], user_id) for user_id, score in totals.items()}
+        return {topic: Board(topic_keys) for topic, topic_keys in keys.items()}, seq
+
+    async def load(self) -> int:
+        """Завантажує рейтинг з диска в окремому потоці; повертає кількість користувачів."""
+        boards, self._synced_seq = await asyncio.to_thread(self._read_all)
+        self._boards = boards
+        self._loaded = True
+        backlog, self._backlog = self._backlog, []
+        for user_id, topic, name, points in backlog:
+            self.record(user_id, topic, name, points)
+        return len(self._boards[GLOBAL])
+
+    def start(self) -> None:
+        """Запускає періодичний запис змін (і читання змін інших процесів)."""
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if self.shared and self._loaded:
+                    await self.sync()
+            except Exception as e:
+                logger.error(f"Помилка запису рейтингу квізу: {e}")
+
+    async def close(self) -> None:
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        if self._backlog:
+            # Завантаження не встигло завершитись: без нього підсумкові бали тем невідомі
+            logger.warning(f"Рейтинг квізу не завантажено, не збережено балів: {len(self._backlog)}")
+        await self.flush()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- Оновлення ---
+
+    def record(self, user_id: int, topic: str, name: str | None = None, points: int = 1) -> None:
+        """Додає користувачу бали в темі (і в загальному рейтингу). Запис на диск — пізніше, пакетом."""
+        if not self._loaded:
+            self._backlog.append((user_id, topic, name, points))
+            return
+        now = _now_ms()
+        board = self._boards.get(topic)
+        if board is None:
+            board = self._boards[topic] = Board()
+        score = board.score(user_id) + points
+        board.set(user_id, score, now)
+        total = self._boards[GLOBAL]
+        total.set(user_id, total.score(user_id) + points, now)
+        self._pending[(user_id, topic)] = (score, now)
+        if name:
+            self._pending_names[user_id] = name
+        if len(self._pending) >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self) -> None:
+        async with self._write_lock:
+            if not self._pending and not self._pending_names:
+                return
+            scores, self._pending = self._pending, {}
+            names, self._pending_names = self._pending_names, {}
+            try:
+                await asyncio.to_thread(self._write_batch, scores, names)
+            except (sqlite3.Error, OSError) as e:
+                # Повертаємо пакет у чергу (новіші бали, набрані за час запису, мають перевагу) —
+                # він запишеться наступного разу, наприклад, коли інший процес звільнить базу
+                self._pending = {**scores, **self._pending}
+                self._pending_names = {**names, **self._pending_names}
+                self.write_errors += 1
+                logger.warning(f"Не вдалося записати рейтинг квізу ({len(scores)} змін відкладено): {e}")
+                return
+            self.writes += 1
+            self.rows_written += len(scores)
+
+    def _write_batch(self, scores: dict, names: dict) -> None:
+        with self._lock:
+            conn = self._connect()
+            # IMMEDIATE бере блокування запису до читання seq, тож номери пакетів зростають у порядку фіксації
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM quiz_scores").fetchone()[0]
+                conn.executemany(
+                    "INSERT OR REPLACE INTO quiz_scores (user_id, topic, score, updated_ms, seq) VALUES (?, ?, ?, ?, ?)",
+                    [(user_id, topic, score, updated_ms, seq) for (user_id, topic), (score, updated_ms) in scores.items()]
+                )
+                conn.executemany("INSERT OR REPLACE INTO quiz_players (user_id, name) VALUES (?, ?)", names.items())
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _read_changes(self, after: int) -> list[tuple]:
+        with self._lock:
+            return self._connect().execute(
+                "SELECT user_id, topic, score, updated_ms, seq FROM quiz_scores WHERE seq > ?", (after,)
+            ).fetchall()
+
+    async def sync(self) -> int:
+        """Застосовує зміни, записані іншими процесами; повертає кількість змінених записів."""
+        rows = await asyncio.to_thread(self._read_changes, self._synced_seq)
+        changed = 0
+        total = self._boards[GLOBAL]
+        for user_id, topic, score, updated_ms, seq in rows:
+            self._synced_seq = max(self._synced_seq, seq)
+            if (user_id, topic) in self._pending:
+                continue  # у цьому процесі є новіший бал, який ще не записано
+            board = self._boards.get(topic)
+            if board is None:
+                board = self._boards[topic] = Board()
+            old = board.score(user_id)
+            if old == score:
+                continue  # власний запис цього процесу
+            board.set(user_id, score, updated_ms)
+            total.set(user_id, total.score(user_id) - old + score, max(total.updated_ms(user_id), updated_ms))
+            changed += 1
+        return changed
+
+    # --- Запити ---
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def board(self, topic: str = GLOBAL) -> Board:
+        return self._boards.get(topic) or Board()
+
+    def _read_names(self, user_ids: list[int]) -> dict[int, str]:
+        placeholders = ", ".join("?" * len(user_ids))
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT user_id, name FROM quiz_players WHERE user_id IN ({placeholders})", user_ids
+            ).fetchall()
+        return dict(rows)
+
+    async def names(self, user_ids: list[int]) -> dict[int, str]:
+        """Імена користувачів для показу рейтингу (імена не тримаються в пам'яті)."""
+        names = {user_id: self._pending_names[user_id] for user_id in user_ids if user_id in self._pending_names}
+        missing = [user_id for user_id in user_ids if user_id not in names]
+        if missing:
+            names.update(await asyncio.to_thread(self._read_names, missing))
+        return names
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self._boards[GLOBAL]),
+            "topics": len(self._boards) - 1,
+            "pending": len(self._pending),
+            "writes": self.writes,
+            "rows_written": self.rows_written,
+            "write_errors": self.write_errors,
+        }
+
+
+def _build_leaderboard() -> Leaderboard | None:
+    settings = config.leaderboard
+    if not settings.enabled:
+        return None
+    return Leaderboard(
+        db_path=settings.db_path,
+        flush_interval=settings.flush_interval,
+        batch_size=settings.batch_size,
+        shared=config.workers.count > 1,
+        busy_timeout=settings.busy_timeout
+    )
+
+
+# None, якщо рейтинг вимкнено
+leaderboard = _build_leaderboard()
@@ -0,0 +1,190 @@
+import time
+from typing import Awaitable, Callable, TypeVar
+import httpx
+import openai
+from telegram.ext import Application
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.completion_cache import completion_cache, cache_key
+from src.bot.services.resilience import (
+    resilient_caller,
+    get_policy,
+    is_retryable,
+    CircuitOpenError,
+    DeadlineExceeded
+)
+from src.bot.services.routing import model_router, ModelRoute
+from src.bot.services.metrics import OPENAI_LATENCY, OPENAI_TOKENS, OPENAI_ERRORS
+from src.bot.services.tracing import span
+from src.bot.services.admission import admission_controller, estimate_tokens, AdmissionRejected
+
+T = TypeVar("T")
+
+# Єдиний асинхронний клієнт OpenAI на весь процес
+_client: openai.AsyncOpenAI | None = None
+
+
+def _build_client() -> openai.AsyncOpenAI:
+    """Створює клієнт OpenAI зі спільним пулом HTTP-з'єднань."""
+    http_client = openai.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=config.openai.max_connections,
+            max_keepalive_connections=config.openai.max_keepalive_connections
+        ),
+        timeout=config.openai.request_timeout
+    )
+    # Повтори виконує resilient_caller за політикою виклику, тому вбудовані повтори SDK вимкнено
+    return openai.AsyncOpenAI(
+        api_key=config.openai.api_key,
+        base_url=config.openai.base_url,
+        http_client=http_client,
+        max_retries=0
+    )
+
+
+def get_client() -> openai.AsyncOpenAI:
+    """Повертає спільний клієнт, створюючи його за потреби."""
+    global _client
+    if _client is None:
+        _client = _build_client()
+    return _client
+
+
+async def init_client(application: Application) -> None:
+    """Створює клієнт під час запуску бота (викликається з post_init)."""
+    application.bot_data['llm_client'] = get_client()
+    logger.info("Клієнт OpenAI ініціалізовано.")
+
+
+async def warm_up_connection() -> None:
+    """Відкриває з'єднання з API заздалегідь, щоб перший запит користувача не чекав на TLS-рукостискання."""
+    try:
+        await get_client().models.list(timeout=10)
+    except Exception as e:  # прогрів необов'язковий: перший запит просто відкриє з'єднання сам
+        logger.debug(f"Не вдалося прогріти з'єднання з OpenAI: {e!r}")
+
+
+async def close_client(application: Application) -> None:
+    """Закриває пул з'єднань під час зупинки бота (викликається з post_shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+    application.bot_data.pop('llm_client', None)
+    logger.info("Клієнт OpenAI закрито.")
+
+
+def _request_params(route: ModelRoute, model: str, kwargs: dict) -> dict:
+    params = {"model": model, "temperature": route.temperature, **kwargs}
+    if route.max_tokens:
+        params.setdefault("max_tokens", route.max_tokens)
+    return params
+
+
+def _should_fall_back(error: Exception) -> bool:
+    """Помилки, після яких варто спробувати резервну модель."""
+    return is_retryable(error) or isinstance(error, (CircuitOpenError, DeadlineExceeded, openai.NotFoundError))
+
+
+async def _routed(task: str, run: Callable[[str], Awaitable[T]], hedge: bool = True) -> T:
+    """Виконує run(model) для моделей маршруту задачі по черзі, доки одна з них не відповість."""
+    route = model_router.route(task)
+    deadline_at = time.monotonic() + get_policy(task).deadline
+    for index, model in enumerate(route.models):
+        try:
+            return await resilient_caller.call(
+                task, lambda: run(model), hedge=hedge, breaker_key=model,
+                attempt_timeout=route.timeout, deadline_at=deadline_at
+            )
+        except Exception as e:
+            if index == len(route.models) - 1 or not _should_fall_back(e):
+                raise
+            # Поки запобіжник моделі відкритий, перехід на резервну — звичайна ситуація
+            log = logger.debug if isinstance(e, CircuitOpenError) else logger.warning
+            log(f"Модель {model} недоступна для задачі {task}, пробуємо {route.models[index + 1]}: {e!r}")
+
+
+async def _observed(task: str, model: str, mode: str, call: Callable[[], Awaitable[T]]) -> T:
+    """Виконує одну спробу запиту до OpenAI з метриками та етапом трасування."""
+    start = time.perf_counter()
+    with span("openai", task=task, model=model, mode=mode) as current:
+        try:
+            result = await call()
+        except Exception as e:
+            OPENAI_ERRORS.inc(task=task, model=model, error=type(e).__name__)
+            if current is not None:
+                current.set(error=type(e).__name__)
+            raise
+    OPENAI_LATENCY.observe(time.perf_counter() - start, task=task, model=model, mode=mode)
+    usage = getattr(result, "usage", None)
+    if usage is not None:
+        OPENAI_TOKENS.inc(usage.prompt_tokens, task=task, model=model, kind="prompt")
+        OPENAI_TOKENS.inc(usage.completion_tokens, task=task, model=model, kind="completion")
+        admission_controller.charge(usage.prompt_tokens + usage.completion_tokens)
+    return result
+
+
+def request_key(messages: list[dict], task: str = "default", **kwargs) -> str:
+    """Ключ кешу відповідей для запиту задачі task з такими самими параметрами, як у complete() і stream()."""
+    route = model_router.route(task)
+    params = _request_params(route, route.models[0], kwargs)
+    return cache_key(params.pop("model"), messages, params.pop("temperature"), **params)
+
+
+async def complete(messages: list[dict], task: str = "default", cache_ttl: float = 0, **kwargs) -> str:
+    """
+    Надсилає запит до моделі задачі task без блокування циклу подій і повертає текст відповіді.
+
+    Модель, temperature і max_tokens беруться з таблиці маршрутів, дедлайн і повтори — з політики
+    Settings.openai.policies з тією ж назвою. cache_ttl > 0 дозволяє повторно використати відповідь
+    на такий самий запит протягом cache_ttl секунд; вмикайте лише там, де відповідь не залежить
+    від користувача. Якщо контроль допуску не дав місця для запиту, виникає AdmissionRejected.
+    """
+    route = model_router.route(task)
+
+    async def create(model: str) -> str:
+        response = await _observed(task, model, "complete", lambda: get_client().chat.completions.create(
+            messages=messages, **_request_params(route, model, kwargs)
+        ))
+        return response.choices[0].message.content
+
+    async def admitted() -> str:
+        async with admission_controller.slot(task):
+            return await _routed(task, create)
+
+    if cache_ttl <= 0 or not config.completion_cache.enabled:
+        return await admitted()
+    # Відповідь з кешу не займає місця в контролі допуску. Відмова в допуску стосується лише користувача,
+    # що обчислює відповідь (квота, ліміт одночасних запитів), тож іншим, хто чекає, вона не передається
+    key = request_key(messages, task, **kwargs)
+    return await completion_cache.get_or_compute(key, cache_ttl, admitted, private_errors=(AdmissionRejected,))
+
+
+async def stream(messages: list[dict], task: str = "default", **kwargs):
+    """
+    Запитує відповідь у потоковому режимі та повертає фрагменти тексту по мірі надходження.
+
+    Повтори і перехід на резервну модель можливі лише до початку потоку; обрив посеред
+    відповіді не повторюється.
+    """
+    route = model_router.route(task)
+
+    async def open_stream(model: str):
+        response = await _observed(task, model, "stream", lambda: get_client().chat.completions.create(
+            messages=messages, stream=True, **_request_params(route, model, kwargs)
+        ))
+        return model, response
+
+    # Місце в контролі допуску зайняте, доки потік не дочитано або не закрито
+    async with admission_controller.slot(task):
+        model, response = await _routed(task, open_stream, hedge=False)
+        chunks = 0
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    chunks += 1
+                    yield chunk.choices[0].delta.content
+        finally:
+            # У потоці OpenAI кожен фрагмент — приблизно один токен
+            OPENAI_TOKENS.inc(chunks, task=task, model=model, kind="completion")
+            admission_controller.charge(estimate_tokens(messages) + chunks)
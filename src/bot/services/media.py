@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from telegram import Bot, Message
+from telegram.error import BadRequest
+from loguru import logger
+from src.settings.config import config
+
+
+class MediaRegistry:
+    """
+    Реєстр статичних зображень з кешем file_id Telegram.
+
+    Кожне зображення завантажується в Telegram лише один раз, після чого надсилається
+    за отриманим file_id. Кеш зберігається на диску і стає недійсним при зміні вмісту файлу
+    (перевіряється за SHA-256).
+    """
+
+    def __init__(self, images_dir: Path, cache_file: Path):
+        self.images_dir = images_dir
+        self.cache_file = cache_file
+        self._file_ids: dict[str, dict] = self._load()
+        # Хеші файлів, перераховуються лише при зміні mtime
+        self._hashes: dict[str, tuple[float, str]] = {}
+
+    def _load(self) -> dict:
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"Не вдалося прочитати кеш зображень {self.cache_file}: {e}")
+            return {}
+
+    def _save(self) -> None:
+        try:
+            os.makedirs(self.cache_file.parent, exist_ok=True)
+            tmp_path = self.cache_file.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                json.dump(self._file_ids, file, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            logger.warning(f"Не вдалося зберегти кеш зображень {self.cache_file}: {e}")
+
+    def _content_hash(self, name: str) -> str:
+        """Повертає SHA-256 файлу; FileNotFoundError, якщо файлу немає."""
+        path = self.images_dir / name
+        mtime = path.stat().st_mtime
+        cached = self._hashes.get(name)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        digest = hashlib.sha256(path.read_bytes()).hexdigest()
+        self._hashes[name] = (mtime, digest)
+        return digest
+
+    def exists(self, name: str) -> bool:
+        return (self.images_dir / name).is_file()
+
+    def get_file_id(self, name: str) -> str | None:
+        """Повертає збережений file_id, якщо вміст файлу не змінився."""
+        entry = self._file_ids.get(name)
+        if entry and entry.get("sha256") == self._content_hash(name):
+            return entry.get("file_id")
+        return None
+
+    def _remember(self, name: str, message: Message) -> None:
+        if message and message.photo:
+            self._file_ids[name] = {
+                "sha256": self._content_hash(name),
+                "file_id": message.photo[-1].file_id
+            }
+            self._save()
+
+    def _forget(self, name: str) -> None:
+        if self._file_ids.pop(name, None) is not None:
+            self._save()
+
+    async def send_photo(self, bot: Bot, chat_id: int | str, name: str, **kwargs) -> Message:
+        """Надсилає зображення за file_id, а за його відсутності завантажує файл і запам'ятовує file_id."""
+        file_id = self.get_file_id(name)
+        if file_id:
+            try:
+                return await bot.send_photo(chat_id=chat_id, photo=file_id, **kwargs)
+            except BadRequest as e:
+                logger.warning(f"file_id для {name} недійсний, завантажую повторно: {e}")
+                self._forget(name)
+
+        with open(self.images_dir / name, "rb") as image:
+            message = await bot.send_photo(chat_id=chat_id, photo=image, **kwargs)
+        self._remember(name, message)
+        return message
+
+    async def reply_photo(self, target: Message, name: str, **kwargs) -> Message:
+        """Аналог Message.reply_photo, що використовує кеш file_id."""
+        return await self.send_photo(target.get_bot(), target.chat_id, name, **kwargs)
+
+    async def warm_up(self, bot: Bot, chat_id: int | str) -> None:
+        """Завантажує всі зображення, яких ще немає в кеші, і видаляє службові повідомлення."""
+        for path in sorted(self.images_dir.glob("*.jpg")):
+            if self.get_file_id(path.name):
+                continue
+            try:
+                message = await self.send_photo(bot, chat_id, path.name, disable_notification=True)
+                await message.delete()
+            except Exception as e:
+                logger.warning(f"Не вдалося прогріти кеш для {path.name}: {e}")
+        logger.info("Кеш зображень прогріто.")
+
+
+media_registry = MediaRegistry(config.paths.images, config.media.cache_file)
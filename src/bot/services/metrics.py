@@ -0,0 +1,324 @@
+import asyncio
+import functools
+import itertools
+import time
+from bisect import bisect_left
+from telegram.ext import Application, BaseHandler, ConversationHandler
+from telegram.request import HTTPXRequest
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.tracing import trace, span, user_scope
+from src.bot.services.callback_router import CallbackDataHandler
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Лічильник, що лише зростає."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in self._values.items()]
+
+
+class Gauge(_Metric):
+    """Значення, що може зростати і спадати; або функція, яка обчислює його під час збору метрик."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), function=None):
+        super().__init__(name, documentation, labelnames)
+        self._values: dict[tuple, float] = {}
+        self.function = function
+
+    def set(self, value: float, **labels) -> None:
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        if self.function is not None:
+            self._values = {(): float(self.function())}
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    """Розподіл значень (затримок) за кошиками; у форматі Prometheus кошики кумулятивні."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # ключ міток -> [лічильники кошиків (+Inf останній), сума, кількість]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def render(self) -> list[str]:
+        lines = self.header()
+        for key, (counts, total, count) in self._series.items():
+            for bound, cumulative in zip((*self.buckets, float("inf")), itertools.accumulate(counts)):
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Метрику {metric.name} вже зареєстровано")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), function=None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Усі метрики у текстовому форматі Prometheus (версія 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HANDLER_LATENCY = registry.histogram(
+    "bot_handler_duration_seconds", "Час виконання обробника оновлення", ("handler",))
+HANDLER_ERRORS = registry.counter(
+    "bot_handler_errors_total", "Обробники, що завершилися винятком", ("handler",))
+HANDLERS_IN_FLIGHT = registry.gauge(
+    "bot_handlers_in_flight", "Обробники, що виконуються зараз")
+OPENAI_LATENCY = registry.histogram(
+    "openai_request_duration_seconds",
+    "Тривалість запиту до OpenAI (для потоку — до початку відповіді)", ("task", "model", "mode"))
+OPENAI_TOKENS = registry.counter(
+    "openai_tokens_total", "Токени запитів і відповідей OpenAI", ("task", "model", "kind"))
+OPENAI_ERRORS = registry.counter(
+    "openai_errors_total", "Невдалі запити до OpenAI", ("task", "model", "error"))
+TELEGRAM_LATENCY = registry.histogram(
+    "telegram_api_duration_seconds", "Тривалість запиту до Bot API", ("method",))
+TELEGRAM_ERRORS = registry.counter(
+    "telegram_api_errors_total", "Невдалі запити до Bot API (код відповіді або тип винятку)", ("method", "error"))
+LOOP_LAG = registry.histogram(
+    "bot_event_loop_lag_seconds", "Наскільки пізніше запланованого прокидається цикл подій",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5))
+ADMISSION_REJECTED = registry.counter(
+    "bot_admission_rejected_total", "Запити до моделі, відхилені контролем допуску", ("task", "reason"))
+ADMISSION_WAIT = registry.histogram(
+    "bot_admission_wait_seconds", "Час очікування місця для запиту до моделі", ("task",))
+COMPLETION_CACHE_LOOKUPS = registry.counter(
+    "bot_completion_cache_lookups_total", "Звернення до кешу відповідей моделі", ("result",))
+COMPLETION_CACHE_COALESCED = registry.counter(
+    "bot_completion_cache_coalesced_total", "Запити, що дочекались однакового запиту замість виклику моделі")
+OUTBOUND_QUEUE = registry.gauge(
+    "bot_outbound_queue_depth", "Запити до Bot API, що чекають у черзі планувальника", ("lane",))
+OUTBOUND_WAIT = registry.histogram(
+    "bot_outbound_wait_seconds", "Час очікування запиту до Bot API в черзі планувальника", ("lane",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10))
+
+
+def instrument_callback(callback):
+    """Обгортає callback обробника: гістограма часу, лічильник помилок, кількість активних, трасування і користувач."""
+    if getattr(callback, "__instrumented__", False):
+        return callback
+    name = getattr(callback, "__name__", type(callback).__name__)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        HANDLERS_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        user = getattr(update, "effective_user", None)
+        try:
+            with trace(name, update_id=getattr(update, "update_id", None)), user_scope(getattr(user, "id", None)):
+                return await callback(update, context)
+        except Exception:
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            HANDLERS_IN_FLIGHT.dec()
+            HANDLER_LATENCY.observe(time.perf_counter() - start, handler=name)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_handlers(application: Application) -> None:
+    """Додає метрики до всіх зареєстрованих обробників, включно з вкладеними в ConversationHandler."""
+    def instrument(handler: BaseHandler) -> None:
+        if isinstance(handler, ConversationHandler):
+            for nested in itertools.chain(handler.entry_points, *handler.states.values(), handler.fallbacks):
+                instrument(nested)
+        elif isinstance(handler, CallbackDataHandler):
+            handler.callbacks = {action: instrument_callback(callback) for action, callback in handler.callbacks.items()}
+        else:
+            handler.callback = instrument_callback(handler.callback)
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            instrument(handler)
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest з метриками тривалості та помилок для кожного методу Bot API."""
+
+    async def do_request(self, url: str, method: str, request_data=None, *args, **kwargs) -> tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        start = time.perf_counter()
+        try:
+            with span("telegram", method=endpoint):
+                code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(method=endpoint, error=type(e).__name__)
+            raise
+        finally:
+            TELEGRAM_LATENCY.observe(time.perf_counter() - start, method=endpoint)
+        if code >= 400:
+            TELEGRAM_ERRORS.inc(method=endpoint, error=str(code))
+        return code, payload
+
+
+class LoopLagMonitor:
+    """Періодично вимірює, наскільки пізніше запланованого прокидається цикл подій."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            LOOP_LAG.observe(max(0.0, loop.time() - expected))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class MetricsServer:
+    """Мінімальний HTTP-сервер, що віддає метрики на GET <path>."""
+
+    def __init__(self, host: str, port: int, path: str):
+        self.host = host
+        self.port = port
+        self.path = path
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Метрики доступні на http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            method, target, _ = head.decode("latin-1").split("\r\n", 1)[0].split(" ", 2)
+            if method == "GET" and target.split("?", 1)[0] == self.path:
+                status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", \
+                    registry.render().encode("utf-8")
+            else:
+                status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", b"not found\n"
+            writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                         f"Connection: close\r\n\r\n".encode("latin-1") + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+loop_lag_monitor = LoopLagMonitor(config.metrics.loop_lag_interval)
+metrics_server = MetricsServer(config.metrics.host, config.metrics.port, config.metrics.path)
@@ -0,0 +1,280 @@
+import asyncio
+import contextvars
+import time
+from collections import deque
+from telegram import Bot
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.metrics import OUTBOUND_QUEUE, OUTBOUND_WAIT
+
+# Пріоритети вихідних запитів: відповіді користувачу йдуть раніше за проміжні редагування
+INTERACTIVE = 0
+BULK = 1
+LANE_NAMES = ("interactive", "bulk")  # мітки черг у метриках
+
+# Редагування одного повідомлення, що стоять у черзі, можна замінити останнім
+_COALESCED_ENDPOINTS = {"editMessageText", "editMessageCaption", "editMessageReplyMarkup"}
+# Службові запити, що не надсилають повідомлень у чат і не підпадають під ліміт чату
+_CHATLESS_ENDPOINTS = {"answerCallbackQuery", "getMe", "setMyCommands", "setChatMenuButton", "setWebhook",
+                       "deleteWebhook", "getFile"}
+# Після скількох відстежуваних чатів прибирати відра, що вже повністю наповнились
+_MAX_TRACKED_CHATS = 10_000
+
+
+class TokenBucket:
+    """Відро токенів: rate токенів на секунду, не більше burst одночасно."""
+
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Скільки секунд чекати до появи токена (0, якщо токен є)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+class _Request:
+    __slots__ = ("callback", "args", "kwargs", "endpoint", "chat_id", "key", "priority", "futures", "enqueued",
+                 "attempts", "context")
+
+    def __init__(self, callback, args, kwargs, endpoint: str, chat_id, key, priority: int):
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.endpoint = endpoint
+        self.chat_id = chat_id
+        self.key = key
+        self.priority = priority
+        self.futures = [asyncio.get_running_loop().create_future()]
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+        # Контекст обробника, що надіслав запит (для трасування)
+        self.context = contextvars.copy_context()
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """
+    Центральний планувальник усіх запитів до Bot API (підключається як rate_limiter у ApplicationBuilder).
+
+    - Відро токенів для кожного чату та глобальне відро на весь бот.
+    - Дві черги: INTERACTIVE (відповіді) обслуговується раніше за BULK (проміжні редагування).
+      Пріоритет передається через rate_limit_args={"priority": BULK}.
+    - Редагування одного й того самого повідомлення, що ще чекають у черзі, зливаються в одне.
+    - RetryAfter від Telegram автоматично призупиняє чат (або весь бот) і запит повторюється.
+    - Глибина кожної черги і час очікування в черзі експортуються в метрики
+      (bot_outbound_queue_depth, bot_outbound_wait_seconds); stats() повертає їх зведення.
+    """
+
+    def __init__(self, global_rate: float, global_burst: float, chat_rate: float, chat_burst: float,
+                 group_rate: float, max_retries: int, max_inflight: int, shutdown_timeout: float = 5.0):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.shutdown_timeout = shutdown_timeout
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: dict[int | str, TokenBucket] = {}
+        self._lanes: tuple[deque, deque] = (deque(), deque())
+        self._pending_edits: dict[tuple, _Request] = {}
+        self._paused_until: dict[int | str | None, float] = {}
+        self._inflight = asyncio.Semaphore(max_inflight)
+        self._wakeup = asyncio.Event()
+        self._worker: asyncio.Task | None = None
+        # Метрики
+        self._waits: deque[float] = deque(maxlen=1000)
+        self.sent = 0
+        self.coalesced = 0
+        self.retry_after_count = 0
+
+    async def initialize(self) -> None:
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def shutdown(self) -> None:
+        """Чекає, поки черги спорожніють (не довше shutdown_timeout), і зупиняє планувальник."""
+        deadline = time.monotonic() + self.shutdown_timeout
+        while any(self._lanes) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    def _bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= _MAX_TRACKED_CHATS:
+                self._prune(time.monotonic())
+            # Від'ємний chat_id — група або канал: там ліміт Telegram значно суворіший
+            is_group = isinstance(chat_id, int) and chat_id < 0 or isinstance(chat_id, str)
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = TokenBucket(rate, 1 if is_group else self.chat_burst)
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        """Забуває неактивні чати: повне відро еквівалентне новому."""
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.wait_time(now) == 0
+                        and bucket.tokens >= bucket.burst]:
+            del self._chats[chat_id]
+        for chat_id in [chat_id for chat_id, until in self._paused_until.items() if until <= now]:
+            del self._paused_until[chat_id]
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = None if endpoint in _CHATLESS_ENDPOINTS else data.get("chat_id")
+        priority = (rate_limit_args or {}).get("priority", INTERACTIVE)
+
+        key = None
+        if endpoint in _COALESCED_ENDPOINTS and data.get("message_id") is not None:
+            key = (endpoint, chat_id, data["message_id"])
+            pending = self._pending_edits.get(key)
+            if pending is not None:
+                # Ще не надіслане редагування замінюємо новішим; обидва виклики отримають один результат
+                pending.callback, pending.args, pending.kwargs = callback, args, kwargs
+                pending.priority = min(pending.priority, priority)
+                future = asyncio.get_running_loop().create_future()
+                pending.futures.append(future)
+                self.coalesced += 1
+                return await future
+
+        request = _Request(callback, args, kwargs, endpoint, chat_id, key, priority)
+        if key is not None:
+            self._pending_edits[key] = request
+        self._lanes[priority].append(request)
+        self._update_depth(priority)
+        self._wakeup.set()
+        return await request.futures[0]
+
+    def _update_depth(self, priority: int) -> None:
+        OUTBOUND_QUEUE.set(len(self._lanes[priority]), lane=LANE_NAMES[priority])
+
+    def _ready_delay(self, request: _Request, now: float) -> float:
+        delay = max(self._paused_until.get(None, 0.0), self._paused_until.get(request.chat_id, 0.0)) - now
+        if request.chat_id is not None:
+            delay = max(delay, self._bucket(request.chat_id).wait_time(now))
+        return max(delay, 0.0)
+
+    def _next_request(self) -> tuple[_Request | None, float]:
+        """Вибирає перший готовий запит з найвищим пріоритетом; інакше — час до найближчої готовності."""
+        now = time.monotonic()
+        global_delay = self._global.wait_time(now)
+        if global_delay > 0:
+            return None, global_delay
+        soonest = None
+        for priority, lane in enumerate(self._lanes):
+            for index, request in enumerate(lane):
+                delay = self._ready_delay(request, now)
+                if delay == 0:
+                    del lane[index]
+                    self._update_depth(priority)
+                    return request, 0.0
+                soonest = delay if soonest is None else min(soonest, delay)
+        return None, soonest
+
+    async def _run(self) -> None:
+        while True:
+            request, delay = self._next_request()
+            if request is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.monotonic()
+            self._global.consume(now)
+            if request.chat_id is not None:
+                self._bucket(request.chat_id).consume(now)
+            if request.key is not None:
+                self._pending_edits.pop(request.key, None)
+            waited = now - request.enqueued
+            self._waits.append(waited)
+            OUTBOUND_WAIT.observe(waited, lane=LANE_NAMES[request.priority])
+            await self._inflight.acquire()
+            asyncio.create_task(self._execute(request), context=request.context)
+
+    async def _execute(self, request: _Request) -> None:
+        try:
+            request.attempts += 1
+            result = await request.callback(*request.args, **request.kwargs)
+        except RetryAfter as e:
+            self.retry_after_count += 1
+            retry_after = e.retry_after if isinstance(e.retry_after, (int, float)) else e.retry_after.total_seconds()
+            self._paused_until[request.chat_id] = time.monotonic() + retry_after
+            logger.warning(f"Flood control для чату {request.chat_id}: пауза {retry_after} с "
+                           f"(спроба {request.attempts}/{self.max_retries})")
+            if request.attempts < self.max_retries:
+                self._lanes[request.priority].appendleft(request)
+                self._update_depth(request.priority)
+                self._wakeup.set()
+            else:
+                self._set_exception(request, e)
+        except Exception as e:
+            self._set_exception(request, e)
+        else:
+            self.sent += 1
+            for future in request.futures:
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self._inflight.release()
+
+    @staticmethod
+    def _set_exception(request: _Request, error: Exception) -> None:
+        for future in request.futures:
+            if not future.done():
+                future.set_exception(error)
+
+    def stats(self) -> dict:
+        """Глибина черг і статистика часу очікування в черзі (секунди)."""
+        waits = sorted(self._waits)
+        return {
+            "queue_interactive": len(self._lanes[INTERACTIVE]),
+            "queue_bulk": len(self._lanes[BULK]),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retry_after": self.retry_after_count,
+            "wait_avg": sum(waits) / len(waits) if waits else 0.0,
+            "wait_p95": waits[int(len(waits) * 0.95)] if waits else 0.0,
+            "wait_max": waits[-1] if waits else 0.0,
+        }
+
+
+def priority_kwargs(bot: Bot, priority: int) -> dict:
+    """Аргументи для методів Bot з пріоритетом планувальника (порожні, якщо планувальник вимкнено)."""
+    if getattr(bot, "rate_limiter", None) is None:
+        return {}
+    return {"rate_limit_args": {"priority": priority}}
+
+
+def build_scheduler() -> OutboundScheduler | None:
+    """Створює планувальник вихідних запитів згідно з налаштуваннями (None, якщо вимкнено)."""
+    settings = config.outbound
+    if not settings.enabled:
+        return None
+    return OutboundScheduler(
+        global_rate=settings.global_rate,
+        global_burst=settings.global_burst,
+        chat_rate=settings.chat_rate,
+        chat_burst=settings.chat_burst,
+        group_rate=settings.group_rate,
+        max_retries=settings.max_retries,
+        max_inflight=settings.max_inflight,
+        shutdown_timeout=settings.shutdown_timeout
+    )
@@ -0,0 +1,278 @@
+import asyncio
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from telegram.ext import Application, BasePersistence, PersistenceInput
+from loguru import logger
+from src.settings.config import config
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Збереження user_data та станів ConversationHandler у SQLite (режим WAL).
+
+    - Зміни накопичуються в пам'яті і записуються однією транзакцією: раз на flush_interval
+      секунд або щойно набереться batch_size записів. Запис виконується в окремому потоці.
+    - У пам'яті Application лишаються лише «гарячі» сесії. Сесії, неактивні довше за idle_ttl,
+      та найстаріші сесії понад max_hot_sessions вивантажуються з пам'яті.
+    - Вивантажена сесія ліниво підвантажується з диска при наступному оновленні від користувача
+      (через refresh_user_data).
+    """
+
+    def __init__(self, db_path: Path, flush_interval: float, batch_size: int, max_hot_sessions: int,
+                 idle_ttl: float, update_interval: float, busy_timeout: float = 30):
+        # bot_data містить конфігурацію та клієнт OpenAI, тому не зберігається
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.db_path = db_path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_hot_sessions = max_hot_sessions
+        self.idle_ttl = idle_ttl
+        self.busy_timeout = busy_timeout
+
+        self._lock = threading.Lock()
+        self._conn = self._connect()
+        self._pending_users: dict[int, bytes | None] = {}
+        self._pending_conversations: dict[tuple[str, str], bytes | None] = {}
+        # Гарячі сесії: user_id -> час останнього звернення (у порядку LRU)
+        self._hot: OrderedDict[int, float] = OrderedDict()
+        self._evicting: set[int] = set()
+        self._application: Application | None = None
+        self._maintenance_task: asyncio.Task | None = None
+        self._flush_task: asyncio.Task | None = None
+        # Пакети записуються строго по черзі, щоб старіші дані не перезаписали новіші
+        self._write_lock = asyncio.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(self.db_path.parent, exist_ok=True)
+        # Базу можуть одночасно писати кілька процесів-обробників: чекаємо на блокування, а не
+        # отримуємо «database is locked»
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS user_data ("
+            "user_id INTEGER PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "name TEXT NOT NULL, key TEXT NOT NULL, state BLOB NOT NULL, PRIMARY KEY (name, key))"
+        )
+        return conn
+
+    # --- Життєвий цикл ---
+
+    def start(self, application: Application) -> None:
+        """Запускає фонове обслуговування: періодичний запис і вивантаження неактивних сесій."""
+        self._application = application
+        if self._maintenance_task is None:
+            self._maintenance_task = asyncio.create_task(self._maintenance_loop())
+
+    async def _maintenance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self._write_pending()
+                self.evict_idle()
+            except Exception as e:
+                logger.error(f"Помилка обслуговування сховища сесій: {e}")
+
+    async def flush(self) -> None:
+        """Викликається Application під час зупинки: записує все, що ще не збережено."""
+        if self._maintenance_task is not None:
+            self._maintenance_task.cancel()
+            self._maintenance_task = None
+        await self._write_pending()
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # --- Запис пакетами ---
+
+    def _schedule_write(self) -> None:
+        pending = len(self._pending_users) + len(self._pending_conversations)
+        if pending >= self.batch_size and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        async with self._write_lock:
+            if not self._pending_users and not self._pending_conversations:
+                return
+            users, self._pending_users = self._pending_users, {}
+            conversations, self._pending_conversations = self._pending_conversations, {}
+            await asyncio.to_thread(self._write_batch, users, conversations)
+
+    def _write_batch(self, users: dict, conversations: dict) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO user_data (user_id, data, updated_at) VALUES (?, ?, ?)",
+                    [(user_id, blob, now) for user_id, blob in users.items() if blob is not None]
+                )
+                self._conn.executemany(
+                    "DELETE FROM user_data WHERE user_id = ?",
+                    [(user_id,) for user_id, blob in users.items() if blob is None]
+                )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)",
+                    [(name, key, state) for (name, key), state in conversations.items() if state is not None]
+                )
+                self._conn.executemany(
+                    "DELETE FROM conversations WHERE name = ? AND key = ?",
+                    [(name, key) for (name, key), state in conversations.items() if state is None]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    # --- Гарячі сесії ---
+
+    def _touch(self, user_id: int) -> None:
+        self._hot[user_id] = time.monotonic()
+        self._hot.move_to_end(user_id)
+
+    def evict_idle(self) -> int:
+        """
+        Вивантажує з пам'яті сесії, неактивні довше за idle_ttl, та найстаріші сесії понад
+        max_hot_sessions. Сесії, активні протягом останніх двох update_interval, не чіпаються,
+        щоб їхні зміни встигли потрапити в сховище.
+        """
+        if self._application is None:
+            return 0
+        now = time.monotonic()
+        safe_age = 2 * self.update_interval
+        evicted = 0
+        while self._hot:
+            user_id, last_seen = next(iter(self._hot.items()))
+            idle = now - last_seen
+            over_capacity = len(self._hot) > self.max_hot_sessions
+            if idle < safe_age or (idle < self.idle_ttl and not over_capacity):
+                break
+            self._hot.popitem(last=False)
+            # drop_user_data лише прибирає дані з пам'яті: сам запис у сховищі залишається
+            self._evicting.add(user_id)
+            self._application.drop_user_data(user_id)
+            evicted += 1
+        if evicted:
+            logger.debug(f"Вивантажено неактивних сесій: {evicted}, у пам'яті: {len(self._hot)}")
+        return evicted
+
+    def _load_user(self, user_id: int) -> bytes | None:
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM user_data WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else None
+
+    def _load_conversations(self, name: str) -> dict:
+        with self._lock:
+            rows = self._conn.execute("SELECT key, state FROM conversations WHERE name = ?", (name,)).fetchall()
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    # --- Інтерфейс BasePersistence ---
+
+    async def get_user_data(self) -> dict:
+        # Нічого не завантажуємо заздалегідь: сесії підвантажуються при першому зверненні
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        if user_id in self._hot:
+            self._touch(user_id)
+            return
+        self._touch(user_id)
+        if user_id in self._pending_users:
+            blob = self._pending_users[user_id]
+        else:
+            blob = await asyncio.to_thread(self._load_user, user_id)
+        if blob is not None and not user_data:
+            user_data.update(pickle.loads(blob))
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._pending_users[user_id] = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        self._schedule_write()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        if user_id in self._evicting:
+            self._evicting.discard(user_id)
+            # Користувач повернувся одразу після вивантаження: зберігаємо його поточні дані
+            if user_id in self._hot and self._application is not None:
+                await self.update_user_data(user_id, self._application.user_data[user_id])
+            return
+        self._hot.pop(user_id, None)
+        self._pending_users[user_id] = None
+        self._schedule_write()
+
+    async def get_conversations(self, name: str) -> dict:
+        return await asyncio.to_thread(self._load_conversations, name)
+
+    async def update_conversation(self, name: str, key: tuple, new_state: object | None) -> None:
+        state = None if new_state is None else pickle.dumps(new_state)
+        self._pending_conversations[(name, json.dumps(list(key)))] = state
+        self._schedule_write()
+
+    # chat_data, bot_data та callback_data не зберігаються (див. store_data)
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+
+# Доступні реалізації сховища; нові можна додавати за назвою
+PERSISTENCE_BACKENDS = {
+    "sqlite": SQLitePersistence,
+}
+
+
+def build_persistence() -> BasePersistence | None:
+    """Створює сховище сесій відповідно до Settings.persistence (None, якщо вимкнено)."""
+    settings = config.persistence
+    if not settings.enabled:
+        return None
+    backend = PERSISTENCE_BACKENDS.get(settings.backend)
+    if backend is None:
+        raise ValueError(f"Невідомий тип сховища сесій: {settings.backend}")
+    return backend(
+        db_path=settings.db_path,
+        flush_interval=settings.flush_interval,
+        batch_size=settings.batch_size,
+        max_hot_sessions=settings.max_hot_sessions,
+        idle_ttl=settings.idle_ttl,
+        update_interval=settings.update_interval,
+        busy_timeout=settings.busy_timeout
+    )
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+from collections import deque
+from loguru import logger
+from src.settings.config import config
+from src.bot.constants import QUIZ_TOPIC_MAPPING
+from src.bot.services import llm
+from src.bot.services.resources import resource_registry
+
+
+def question_id(question: str) -> str:
+    """Короткий ідентифікатор питання для дедуплікації (нечутливий до регістру та пробілів)."""
+    normalized = " ".join(question.lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def parse_questions(raw: str) -> list[dict]:
+    """Розбирає JSON-відповідь моделі зі списком питань, відкидаючи некоректні елементи."""
+    raw = raw.strip()
+    if raw.startswith("```"):
+        raw = raw.strip("`")
+        raw = raw[raw.find("{"):]
+    data = json.loads(raw)
+    items = data.get("questions", []) if isinstance(data, dict) else data
+    questions = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        question = str(item.get("question", "")).strip()
+        answer = str(item.get("answer", "")).strip()
+        if not question or not answer:
+            continue
+        aliases = [str(alias).strip() for alias in item.get("aliases", []) if str(alias).strip()]
+        questions.append({"id": question_id(question), "question": question, "answer": answer, "aliases": aliases})
+    return questions
+
+
+class QuizQuestionPool:
+    """
+    Пул заздалегідь згенерованих питань квізу для кожної теми.
+
+    Фонове завдання тримає кожну тему вище low_water, генеруючи питання пакетами (batch_size
+    питань за один запит, у форматі JSON з правильною відповіддю). Питання видається з пулу
+    миттєво, без очікування на модель; питання, які користувач уже бачив, пропускаються.
+    """
+
+    def __init__(self, topics: dict[str, str], pool_size: int, low_water: int, batch_size: int,
+                 refill_concurrency: int, refill_interval: float):
+        self.topics = topics
+        self.pool_size = pool_size
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.refill_interval = refill_interval
+        self._pools: dict[str, deque] = {key: deque() for key in topics}
+        self._ids: dict[str, set[str]] = {key: set() for key in topics}
+        self._semaphore = asyncio.Semaphore(refill_concurrency)
+        self._refilling: set[str] = set()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._refill_tasks: set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        """Запускає фонове поповнення пулу."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refill_loop())
+
+    def stop(self) -> None:
+        """Зупиняє фонове поповнення, зокрема запити до моделі, що ще виконуються."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for task in self._refill_tasks:
+            task.cancel()
+
+    def size(self, topic_key: str) -> int:
+        return len(self._pools.get(topic_key, ()))
+
+    def take(self, topic_key: str, seen: set | deque | None = None) -> dict | None:
+        """Видає питання з пулу теми, якого користувач ще не бачив; None, якщо таких немає."""
+        pool = self._pools.get(topic_key)
+        if not pool:
+            return None
+        seen = seen or ()
+        question = None
+        for index, candidate in enumerate(pool):
+            if candidate["id"] not in seen:
+                question = candidate
+                del pool[index]
+                break
+        if question is not None:
+            self._ids[topic_key].discard(question["id"])
+        if len(pool) < self.low_water:
+            self._wakeup.set()
+        return question
+
+    async def _refill_loop(self) -> None:
+        while True:
+            for topic_key in self.topics:
+                if len(self._pools[topic_key]) < self.low_water and topic_key not in self._refilling:
+                    self._refilling.add(topic_key)
+                    task = asyncio.create_task(self._refill(topic_key))
+                    self._refill_tasks.add(task)
+                    task.add_done_callback(self._refill_tasks.discard)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.refill_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refill(self, topic_key: str) -> None:
+        """Поповнює тему до pool_size пакетами, не більше refill_concurrency запитів одночасно."""
+        try:
+            while len(self._pools[topic_key]) < self.pool_size:
+                async with self._semaphore:
+                    added = await self._generate_batch(topic_key)
+                if not added:
+                    break
+        except Exception as e:
+            logger.warning(f"Не вдалося поповнити пул питань для {topic_key}: {e}")
+        finally:
+            self._refilling.discard(topic_key)
+
+    async def _generate_batch(self, topic_key: str) -> int:
+        prompt = resource_registry.get_prompt("quiz_batch.txt")
+        raw = await llm.complete(
+            [
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": f"Тема: {self.topics[topic_key]}. Кількість питань: {self.batch_size}."}
+            ],
+            task="quiz_batch",
+            response_format={"type": "json_object"}
+        )
+        added = 0
+        for question in parse_questions(raw):
+            if question["id"] in self._ids[topic_key]:
+                continue
+            self._pools[topic_key].append(question)
+            self._ids[topic_key].add(question["id"])
+            added += 1
+        logger.debug(f"Пул {topic_key}: додано {added} питань, усього {len(self._pools[topic_key])}")
+        return added
+
+
+def _load_topics() -> dict[str, str]:
+    """Теми пулу: кнопки з quiz_topics.json, для яких відомий опис теми."""
+    try:
+        keys = resource_registry.get_menu_data("quiz_topics.json").keys()
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        logger.error(f"Помилка при завантаженні файлу quiz_topics.json: {e}")
+        keys = QUIZ_TOPIC_MAPPING.keys()
+    return {key: QUIZ_TOPIC_MAPPING[key] for key in keys if key in QUIZ_TOPIC_MAPPING}
+
+
+quiz_pool = QuizQuestionPool(
+    topics=_load_topics(),
+    pool_size=config.quiz_pool.pool_size,
+    low_water=config.quiz_pool.low_water,
+    batch_size=config.quiz_pool.batch_size,
+    refill_concurrency=config.quiz_pool.refill_concurrency,
+    refill_interval=config.quiz_pool.refill_interval
+)
@@ -0,0 +1,246 @@
+import asyncio
+import random
+import time
+from collections import defaultdict, deque
+from typing import Awaitable, Callable, NamedTuple, TypeVar
+import openai
+from loguru import logger
+from src.settings.config import config
+
+T = TypeVar("T")
+
+# Повідомлення користувачу, поки модель недоступна і запити відхиляються одразу
+UNAVAILABLE_MESSAGE = "AI зараз тимчасово недоступний. Спробуйте, будь ласка, за хвилину."
+
+
+class DeadlineExceeded(openai.OpenAIError):
+    """Запит до моделі не вклався у відведений час (з урахуванням повторів)."""
+
+
+class CircuitOpenError(openai.OpenAIError):
+    """Модель недоступна: після серії помилок запити тимчасово не надсилаються."""
+
+
+class CallPolicy(NamedTuple):
+    deadline: float = 30  # загальний час на виклик разом з повторами, секунди
+    attempt_timeout: float = 20  # час на одну спробу
+    max_attempts: int = 3
+    backoff_base: float = 0.5  # перша пауза перед повтором (далі подвоюється)
+    backoff_max: float = 8
+    hedge: bool = False  # дублювати повільний запит
+    hedge_after: float | None = None  # через скільки секунд дублювати; None — за p95 затримки
+
+
+def get_policy(name: str) -> CallPolicy:
+    """Політика з Settings.openai.policies: значення за замовчуванням, перевизначені для name."""
+    policies = config.openai.policies
+    return CallPolicy(**{**policies.get("default", {}), **policies.get(name, {})})
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Тимчасові помилки, після яких запит має сенс повторити."""
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                          asyncio.TimeoutError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+class LatencyTracker:
+    """Затримки останніх успішних спроб для обчислення p95."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples: deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def p95(self) -> float | None:
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[int(len(ordered) * 0.95)]
+
+
+class CircuitBreaker:
+    """
+    Запобіжник: після failure_threshold тимчасових помилок поспіль запити відхиляються одразу.
+
+    Через reset_timeout пропускається один пробний запит: успіх закриває запобіжник,
+    помилка знову відкриває його.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, name: str = "OpenAI"):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.name = name
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self) -> None:
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError("Модель тимчасово недоступна")
+            self.state = self.HALF_OPEN
+        if self._probe_in_flight:
+            raise CircuitOpenError("Модель тимчасово недоступна")
+        self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info(f"Запобіжник {self.name} закрито: модель знову відповідає.")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Пробний запит скасовано до отримання результату — дозволяємо наступну пробу."""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Запобіжник {self.name} відкрито після {self.failures} помилок поспіль.")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+
+class ResilientCaller:
+    """
+    Виконує виклики моделі за політикою: дедлайн, повтори з джитером, хеджування, запобіжник.
+
+    Запобіжники окремі для кожного ключа (моделі), тож перевантаження однієї моделі не блокує
+    перехід на резервну.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.breakers: dict[str, CircuitBreaker] = {}
+        # Затримки рахуються окремо для кожної політики і моделі: діалог і перевірка відповіді мають різний p95
+        self.latency: dict[tuple[str, str], LatencyTracker] = defaultdict(LatencyTracker)
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.rejected = 0
+        self.failures = 0
+
+    def breaker(self, key: str) -> CircuitBreaker:
+        breaker = self.breakers.get(key)
+        if breaker is None:
+            breaker = self.breakers[key] = CircuitBreaker(self.failure_threshold, self.reset_timeout, name=key)
+        return breaker
+
+    async def call(self, policy_name: str, attempt: Callable[[], Awaitable[T]], hedge: bool = True,
+                   breaker_key: str = "default", attempt_timeout: float | None = None,
+                   deadline_at: float | None = None) -> T:
+        """
+        Виконує attempt() за політикою policy_name.
+
+        hedge=False вимикає дублювання (наприклад, для потокових відповідей).
+        attempt_timeout перевизначає час однієї спроби з політики; deadline_at (time.monotonic())
+        дозволяє кільком викликам ділити один дедлайн.
+        """
+        policy = get_policy(policy_name)
+        breaker = self.breaker(breaker_key)
+        attempt_timeout = attempt_timeout or policy.attempt_timeout
+        self.calls += 1
+        deadline = deadline_at or time.monotonic() + policy.deadline
+        attempt_no = 0
+        while True:
+            attempt_no += 1
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                self.rejected += 1
+                raise
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                breaker.release()
+                raise DeadlineExceeded(f"Модель не відповіла за {policy.deadline} с")
+            try:
+                result = await asyncio.wait_for(
+                    self._attempt(policy, self.latency[policy_name, breaker_key], attempt, hedge and policy.hedge),
+                    timeout=min(attempt_timeout, remaining)
+                )
+            except asyncio.CancelledError:
+                breaker.release()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    # Модель відповіла, але запит некоректний — це не збій сервісу
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                self.failures += 1
+                delay = random.uniform(0, min(policy.backoff_max, policy.backoff_base * 2 ** (attempt_no - 1)))
+                remaining = deadline - time.monotonic()
+                if attempt_no >= policy.max_attempts or delay >= remaining:
+                    logger.warning(f"Виклик {breaker_key} ({policy_name}) не вдався після {attempt_no} спроб: {e!r}")
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise DeadlineExceeded(f"Модель не відповіла за {policy.deadline} с") from e
+                    raise
+                self.retries += 1
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+
+    @staticmethod
+    async def _timed(latency: LatencyTracker, attempt: Callable[[], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        result = await attempt()
+        latency.record(time.monotonic() - start)
+        return result
+
+    async def _attempt(self, policy: CallPolicy, latency: LatencyTracker, attempt: Callable[[], Awaitable[T]],
+                       hedge: bool) -> T:
+        hedge_after = policy.hedge_after or latency.p95()
+        if not hedge or hedge_after is None:
+            return await self._timed(latency, attempt)
+
+        # Якщо відповідь не прийшла за hedge_after, надсилаємо другий такий самий запит
+        # і беремо ту відповідь, що прийде першою
+        pending = {asyncio.create_task(self._timed(latency, attempt))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_after)
+            if not done:
+                self.hedges += 1
+                pending.add(asyncio.create_task(self._timed(latency, attempt)))
+            error = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "circuit": {key: breaker.state for key, breaker in self.breakers.items()},
+            "p95": {f"{policy}@{key}": tracker.p95() for (policy, key), tracker in self.latency.items()},
+        }
+
+
+resilient_caller = ResilientCaller(
+    failure_threshold=config.openai.circuit_failure_threshold,
+    reset_timeout=config.openai.circuit_reset_timeout
+)
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Callable
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from loguru import logger
+from src.settings.config import config
+
+
+def build_menu(menu_data) -> InlineKeyboardMarkup | None:
+    """Генерує клавіатуру з даних меню, адаптуючись до структури (словник або список кнопок)."""
+    keyboard = []
+    if isinstance(menu_data, (dict, MappingProxyType)):
+        # Обробка формату словника
+        for key, text in menu_data.items():
+            keyboard.append([InlineKeyboardButton(text=text, callback_data=key)])
+    elif isinstance(menu_data, (list, tuple)):
+        # Обробка формату списку
+        for item in menu_data:
+            if "text" in item and "callback_data" in item:
+                keyboard.append([InlineKeyboardButton(item["text"], callback_data=item["callback_data"])])
+    else:
+        return None
+    return InlineKeyboardMarkup(keyboard)
+
+
+def _freeze(value):
+    """Робить розібраний JSON незмінним, щоб його можна було безпечно роздавати обробникам."""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class _Resource:
+    __slots__ = ("path", "mtime", "digest", "value", "keyboards", "checked_at")
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.mtime = None
+        self.digest = None
+        self.value = None
+        self.keyboards = {}
+        self.checked_at = 0.0
+
+
+class ResourceRegistry:
+    """
+    Кеш меню та промптів у пам'яті.
+
+    Файли з Paths.menus і Paths.prompts читаються один раз. Повторно файл перечитується лише
+    тоді, коли змінився його mtime і вміст (SHA-256), тож промпти можна редагувати без перезапуску.
+    Перевірка mtime виконується не частіше, ніж раз на check_interval секунд.
+    """
+
+    def __init__(self, menus_dir: Path, prompts_dir: Path, check_interval: float):
+        self.menus_dir = menus_dir
+        self.prompts_dir = prompts_dir
+        self.check_interval = check_interval
+        self._menus: dict[str, _Resource] = {}
+        self._prompts: dict[str, _Resource] = {}
+        self._data: dict[str, _Resource] = {}
+
+    def load_all(self) -> None:
+        """Завантажує всі меню та промпти (викликається під час запуску)."""
+        for cache, pattern, parser in ((self._menus, self.menus_dir.glob("*.json"), self._parse_menu),
+                                       (self._prompts, self.prompts_dir.glob("*.txt"), self._parse_prompt)):
+            for path in sorted(pattern):
+                try:
+                    self._get(cache, path, parser)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Не вдалося завантажити ресурс {path.name}: {e}")
+        logger.info(f"Завантажено меню: {len(self._menus)}, промптів: {len(self._prompts)}.")
+
+    @staticmethod
+    def _parse_menu(raw: bytes):
+        return _freeze(json.loads(raw.decode("utf-8")))
+
+    @staticmethod
+    def _parse_prompt(raw: bytes) -> str:
+        return raw.decode("utf-8").strip()
+
+    def _get(self, cache: dict[str, _Resource], path: Path, parser: Callable) -> _Resource:
+        """Повертає ресурс, перечитуючи файл лише за зміни mtime та вмісту."""
+        resource = cache.get(path.name)
+        now = time.monotonic()
+        if resource is not None and now - resource.checked_at < self.check_interval:
+            return resource
+
+        if resource is None:
+            resource = _Resource(path)
+
+        mtime = path.stat().st_mtime
+        resource.checked_at = now
+        if mtime != resource.mtime:
+            raw = path.read_bytes()
+            digest = hashlib.sha256(raw).hexdigest()
+            if digest != resource.digest:
+                try:
+                    value = parser(raw)
+                except (ValueError, UnicodeDecodeError) as e:
+                    if resource.value is None:
+                        raise
+                    # Залишаємо попередню версію, доки файл не виправлять
+                    logger.error(f"Не вдалося перезавантажити {path.name}, використовується попередня версія: {e}")
+                    resource.mtime = mtime
+                    return resource
+                resource.value = value
+                resource.keyboards = {}
+                if resource.digest is not None:
+                    logger.info(f"Ресурс {path.name} змінено, перезавантажено.")
+                resource.digest = digest
+            resource.mtime = mtime
+        cache[path.name] = resource
+        return resource
+
+    def get_prompt(self, name: str) -> str:
+        """Повертає текст промпта; FileNotFoundError, якщо файлу немає."""
+        try:
+            return self._get(self._prompts, self.prompts_dir / name, self._parse_prompt).value
+        except FileNotFoundError:
+            self._prompts.pop(name, None)
+            raise
+
+    def _menu(self, name: str) -> _Resource:
+        try:
+            return self._get(self._menus, self.menus_dir / name, self._parse_menu)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._menus.pop(name, None)
+            raise
+
+    def get_menu_data(self, name: str):
+        """Повертає незмінні дані меню; FileNotFoundError або json.JSONDecodeError при помилці."""
+        return self._menu(name).value
+
+    def get_json(self, path: Path):
+        """
+        Повертає незмінні дані довільного JSON-файлу (наприклад, налаштувань), перечитуючи його
+        за тими самими правилами, що й меню; FileNotFoundError або json.JSONDecodeError при помилці.
+        """
+        try:
+            return self._get(self._data, path, self._parse_menu).value
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._data.pop(path.name, None)
+            raise
+
+    def get_keyboard(self, name: str, builder: Callable = build_menu) -> InlineKeyboardMarkup | None:
+        """
+        Повертає готову клавіатуру для меню. Клавіатура будується один раз для кожного builder
+        і перебудовується лише після зміни файлу.
+        """
+        resource = self._menu(name)
+        keyboard = resource.keyboards.get(builder)
+        if keyboard is None:
+            keyboard = builder(resource.value)
+            resource.keyboards[builder] = keyboard
+        return keyboard
+
+
+resource_registry = ResourceRegistry(config.paths.menus, config.paths.prompts, config.resources.check_interval)
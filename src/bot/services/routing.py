@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+from typing import NamedTuple
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.resources import resource_registry
+
+
+class ModelRoute(NamedTuple):
+    models: tuple[str, ...]  # основна модель і резервні, у порядку спроб
+    temperature: float
+    max_tokens: int | None = None
+    timeout: float | None = None  # час однієї спроби; None — з політики виклику
+
+
+class ModelRouter:
+    """
+    Таблиця маршрутизації задач на моделі (model_routing.json).
+
+    Для кожної задачі (gpt, talk, quiz_question, quiz_grade, random, summary, ...) задаються
+    моделі з резервними, max_tokens, temperature і timeout; незазначені поля беруться з "default".
+    Файл перечитується реєстром ресурсів після зміни, тож маршрути можна міняти без перезапуску.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._load_failed = False
+
+    def _table(self) -> dict:
+        try:
+            table = resource_registry.get_json(self.path)
+            self._load_failed = False
+            return table
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            if not self._load_failed:
+                logger.error(f"Не вдалося завантажити {self.path.name}, використовується модель за замовчуванням: {e}")
+                self._load_failed = True
+            return {}
+
+    def route(self, task: str) -> ModelRoute:
+        table = self._table()
+        entry = {**table.get("default", {}), **table.get(task, {})}
+        models = tuple(entry.get("models") or ()) or (config.openai.model,)
+        max_tokens = entry.get("max_tokens")
+        timeout = entry.get("timeout")
+        return ModelRoute(
+            models=models,
+            temperature=float(entry.get("temperature", config.openai.temperature)),
+            max_tokens=int(max_tokens) if max_tokens else None,
+            timeout=float(timeout) if timeout else None
+        )
+
+
+model_router = ModelRouter(config.openai.routing_file)
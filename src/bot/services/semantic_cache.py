@@ -0,0 +1,358 @@
+import asyncio
+import json
+import os
+import re
+import time
+import unicodedata
+import zlib
+from pathlib import Path
+from loguru import logger
+from src.settings.config import config
+
+try:
+    import numpy as np
+except ImportError:  # numpy необов'язковий, без нього семантичний кеш вимкнено
+    np = None
+
+SNAPSHOT_VERSION = 3
+
+_APOSTROPHES = str.maketrans({"’": "", "ʼ": "", "'": "", "`": ""})
+# «#» і «+» розрізняють питання про C, C# і C++, тому їх не прибираємо
+_NON_WORD = re.compile(r"[^\w#+]+", re.UNICODE)
+
+# Службові слова і ввічливі звороти, що не змінюють змісту питання (у нормалізованому вигляді).
+# Решта слів, зокрема заперечення («не», «not») і числа, мають збігатися у двох питаннях
+_FILLER_WORDS = (
+    "що", "таке", "як", "чи", "і", "й", "та", "а", "в", "у", "з", "із", "на", "до", "для", "про", "це", "є",
+    "мені", "будь", "ласка", "скажи", "поясни", "підкажи", "розкажи", "ну", "ось", "от",
+    "what", "is", "are", "the", "a", "an", "of", "in", "on", "for", "to", "and", "how", "does", "do", "can",
+    "you", "me", "please", "tell", "explain",
+)
+
+
+def normalize(text: str) -> str:
+    """
+    Питання без відмінностей у написанні: регістр, форма Unicode, апострофи, пунктуація, пробіли.
+
+    На відміну від нормалізації відповідей квізу, тут немає транслітерації і злиття схожих літер:
+    «холод» і «голод», «hat» і «chat» мають лишатися різними питаннями.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold().translate(_APOSTROPHES)
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+_FILLER = frozenset(normalize(word) for word in _FILLER_WORDS)
+_GUARD_CANDIDATES = 8  # скільки найсхожіших записів перевіряти лексично
+
+
+def _ngram_hashes(text: str, ngram: int) -> list[int]:
+    padded = f" {text} "
+    hashes = [zlib.crc32(padded[i:i + ngram].encode("utf-8")) for i in range(max(1, len(padded) - ngram + 1))]
+    # Цілі слова як окремі ознаки: збіг слів важить більше, ніж збіг окремих трійок символів
+    hashes.extend(zlib.crc32(b"w:" + word.encode("utf-8")) for word in text.split())
+    return hashes
+
+
+def embed(text: str, dim: int, ngram: int = 3):
+    """
+    Вектор питання з хешованих n-грам символів і слів (без моделі і мережі), нормований до довжини 1.
+
+    Текст спершу нормалізується (регістр, пунктуація, пробіли), тож питання, що відрізняються
+    лише написанням, отримують однаковий вектор.
+    """
+    hashes = np.fromiter(_ngram_hashes(normalize(text), ngram), dtype=np.uint32)
+    # Знак із окремого біта хешу зменшує вплив колізій на скалярний добуток
+    signs = np.where(hashes & (1 << 31), -1.0, 1.0).astype(np.float32)
+    vector = np.zeros(dim, dtype=np.float32)
+    np.add.at(vector, hashes % dim, signs)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+def content_words(text: str) -> list[str]:
+    """Слова питання, що визначають його зміст: без службових слів і ввічливих зворотів."""
+    return [word for word in normalize(text).split() if word not in _FILLER]
+
+
+def _close_words(a: str, b: str) -> bool:
+    """
+    Те саме слово з можливою одною помилкою (заміна, пропуск, перестановка сусідніх літер)
+    всередині слова; перша літера має збігатися («холод» і «голод» — різні слова).
+    """
+    if a == b:
+        return True
+    if (min(len(a), len(b)) < 5 or a[0] != b[0] or abs(len(a) - len(b)) > 1
+            or any(char.isdigit() for char in a + b)):
+        return False
+    # Відстань Дамерау — Левенштейна (обмежена), перевіряємо лише, чи вона не більша за 1
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1] <= 1
+
+
+def same_content(a: list[str], b: list[str]) -> bool:
+    """
+    Лексична перевірка перед видачею збереженої відповіді: змістові слова двох питань збігаються
+    по черзі, з допуском на одну помилку в довгих словах. Числа, слова з цифрами і короткі слова
+    (UDP/HTTP, «не», C/C#) мають збігатися точно.
+
+    Векторна схожість не відрізняє «за зростанням» від «за спаданням», Australia від Austria
+    чи «з A на B» від «з B на A» — такі питання відрізняються одним словом або порядком слів,
+    а відповіді на них різні.
+    """
+    return len(a) == len(b) and all(_close_words(x, y) for x, y in zip(a, b))
+
+
+def _quantize(vectors):
+    """int8-представлення рядків vectors і масштаб, на який треба поділити скалярний добуток."""
+    peak = np.abs(vectors).max(axis=1)
+    scales = np.where(peak > 0, 127 / np.maximum(peak, 1e-12), 1.0).astype(np.float32)
+    return np.round(vectors * scales[:, None]).astype(np.int8), scales
+
+
+class SemanticCache:
+    """
+    Кеш відповідей на перефразовані питання з локальним індексом найближчих сусідів.
+
+    - Вектори питань зберігаються в матриці int8 (capacity × dim) з масштабом для кожного рядка —
+      учетверо менше пам'яті, ніж float32, а похибка косинуса не перевищує кількох тисячних.
+      Відповіді — у списку з тими самими номерами рядків.
+    - Пошук наближений (LSH випадковими гіперплощинами): для кожної з tables таблиць рядок
+      потрапляє в кошик за bits знаками проєкцій, і косинусна схожість рахується лише для
+      рядків зі спільних кошиків. Відповідь повертається, якщо схожість не менша за threshold,
+      запис належить тій самій області (scope: системний промпт, модель) і питання збігаються
+      за змістовими словами (same_content): числа, заперечення, назви, їхній порядок.
+    - Коли місця немає, витісняється запис, який найдовше не використовувався; записи старші
+      за ttl не повертаються і займаються першими.
+    - Знімок (вектори, відповіді, строки дії) зберігається на диск і завантажується при старті;
+      таблиці LSH відновлюються з векторів.
+    """
+
+    def __init__(self, capacity: int, dim: int = 512, tables: int = 24, bits: int = 14, threshold: float = 0.9,
+                 ttl: float = 86400, snapshot_path: Path | None = None, seed: int = 7):
+        self.capacity = capacity
+        self.dim = dim
+        self.tables = tables
+        self.bits = bits
+        self.threshold = threshold
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.seed = seed
+        self._vectors = np.zeros((capacity, dim), dtype=np.int8)
+        self._scales = np.ones(capacity, dtype=np.float32)
+        self._signatures = np.zeros((capacity, tables), dtype=np.int64)
+        self._scopes = np.zeros(capacity, dtype=np.int64)
+        self._expires_at = np.zeros(capacity, dtype=np.float64)  # time.time(); 0 — вільний рядок
+        self._last_used = np.zeros(capacity, dtype=np.float64)
+        self._answers: list[str | None] = [None] * capacity
+        self._words: list[list[str] | None] = [None] * capacity  # змістові слова збережених питань
+        self._buckets: list[dict[int, list[int]]] = [{} for _ in range(tables)]
+        planes = np.random.default_rng(seed).standard_normal((dim, tables * bits)).astype(np.float32)
+        self._planes = planes
+        self._powers = (1 << np.arange(bits, dtype=np.int64))
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def scope(*parts: str) -> int:
+        """Числовий ідентифікатор області кешу (наприклад, системний промпт і модель)."""
+        return zlib.crc32("\x1f".join(parts).encode("utf-8"))
+
+    def _signature(self, vectors):
+        """Номери кошиків LSH для кожного рядка vectors (n × dim) у кожній таблиці."""
+        bits = (np.asarray(vectors, dtype=np.float32) @ self._planes) > 0
+        return bits.reshape(len(bits), self.tables, self.bits) @ self._powers
+
+    def _index(self, row: int) -> None:
+        for table, key in enumerate(self._signatures[row].tolist()):
+            self._buckets[table].setdefault(key, []).append(row)
+
+    def _unindex(self, row: int) -> None:
+        for table, key in enumerate(self._signatures[row].tolist()):
+            bucket = self._buckets[table].get(key)
+            if bucket is not None:
+                bucket.remove(row)
+                if not bucket:
+                    del self._buckets[table][key]
+
+    def _candidates(self, signature) -> list[int]:
+        rows: set[int] = set()
+        for table, key in enumerate(signature.tolist()):
+            bucket = self._buckets[table].get(key)
+            if bucket:
+                rows.update(bucket)
+        return list(rows)
+
+    def search(self, text: str, scope: int = 0) -> tuple[str, float] | None:
+        """
+        Найсхожіше збережене питання тієї самої області з тими самими змістовими словами:
+        (відповідь, схожість) або None.
+        """
+        if not self.size:
+            return None
+        vector = embed(text, self.dim)
+        candidates = self._candidates(self._signature(vector[None, :])[0])
+        if not candidates:
+            return None
+        rows = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        now = time.time()
+        valid = (self._scopes[rows] == scope) & (self._expires_at[rows] > now)
+        rows = rows[valid]
+        if not len(rows):
+            return None
+        similarities = (self._vectors[rows] @ vector) / self._scales[rows]
+        words = content_words(text)
+        order = np.argsort(similarities)[::-1][:_GUARD_CANDIDATES]
+        for best in order.tolist():
+            row = int(rows[best])
+            if same_content(words, self._words[row]):
+                self._last_used[row] = now
+                return self._answers[row], float(similarities[best])
+        return None
+
+    def lookup(self, text: str, scope: int = 0) -> str | None:
+        """Збережена відповідь на таке саме або перефразоване питання (схожість ≥ threshold)."""
+        found = self.search(text, scope)
+        if found is not None and found[1] >= self.threshold:
+            self.hits += 1
+            return found[0]
+        self.misses += 1
+        return None
+
+    def _free_row(self) -> int:
+        if self.size < self.capacity:
+            row = self.size
+            self.size += 1
+            return row
+        # Прострочені записи мають найменший пріоритет, далі — ті, що найдовше не використовувались
+        expired = self._expires_at <= time.time()
+        row = int(np.argmax(expired)) if expired.any() else int(np.argmin(self._last_used))
+        self._unindex(row)
+        self.evictions += 1
+        return row
+
+    def add(self, text: str, answer: str, scope: int = 0) -> None:
+        vector = embed(text, self.dim)
+        row = self._free_row()
+        now = time.time()
+        quantized, scales = _quantize(vector[None, :])
+        self._vectors[row], self._scales[row] = quantized[0], scales[0]
+        self._signatures[row] = self._signature(vector[None, :])[0]
+        self._scopes[row] = scope
+        self._expires_at[row] = now + self.ttl
+        self._last_used[row] = now
+        self._answers[row] = answer
+        self._words[row] = content_words(text)
+        self._index(row)
+
+    # --- Знімок на диску ---
+
+    def _snapshot(self) -> dict:
+        """Копія стану для запису у фоновому потоці (робиться в циклі подій)."""
+        size = self.size
+        return {
+            "meta": np.array([SNAPSHOT_VERSION, self.dim, self.tables, self.bits, self.seed], dtype=np.int64),
+            "vectors": self._vectors[:size].copy(),
+            "scales": self._scales[:size].copy(),
+            "scopes": self._scopes[:size].copy(),
+            "expires_at": self._expires_at[:size].copy(),
+            "last_used": self._last_used[:size].copy(),
+            "answers": np.frombuffer(json.dumps(self._answers[:size], ensure_ascii=False).encode("utf-8"),
+                                     dtype=np.uint8),
+            "words": np.frombuffer(json.dumps(self._words[:size], ensure_ascii=False).encode("utf-8"),
+                                   dtype=np.uint8),
+        }
+
+    def _write_snapshot(self, snapshot: dict) -> None:
+        os.makedirs(self.snapshot_path.parent, exist_ok=True)
+        temp_path = self.snapshot_path.with_suffix(".tmp.npz")
+        np.savez(temp_path, **snapshot)
+        os.replace(temp_path, self.snapshot_path)
+
+    async def save(self) -> None:
+        """Записує знімок на диск (запис виконується в окремому потоці)."""
+        if self.snapshot_path is None or not self.size:
+            return
+        snapshot = self._snapshot()
+        try:
+            await asyncio.to_thread(self._write_snapshot, snapshot)
+            logger.info(f"Знімок семантичного кешу збережено: {self.size} записів.")
+        except OSError as e:
+            logger.warning(f"Не вдалося зберегти знімок семантичного кешу: {e}")
+
+    def load(self) -> int:
+        """Завантажує знімок, пропускаючи прострочені записи; повертає кількість завантажених."""
+        if self.snapshot_path is None or not self.snapshot_path.exists():
+            return 0
+        try:
+            with np.load(self.snapshot_path) as data:
+                meta = data["meta"].tolist()
+                if meta != [SNAPSHOT_VERSION, self.dim, self.tables, self.bits, self.seed]:
+                    logger.warning("Знімок семантичного кешу створено з іншими параметрами, його пропущено.")
+                    return 0
+                keep = data["expires_at"] > time.time()
+                vectors = data["vectors"][keep][:self.capacity]
+                scales = data["scales"][keep][:self.capacity]
+                scopes = data["scopes"][keep][:self.capacity]
+                expires_at = data["expires_at"][keep][:self.capacity]
+                last_used = data["last_used"][keep][:self.capacity]
+                answers = json.loads(data["answers"].tobytes().decode("utf-8"))
+                words = json.loads(data["words"].tobytes().decode("utf-8"))
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Не вдалося завантажити знімок семантичного кешу: {e}")
+            return 0
+        answers = [answer for answer, kept in zip(answers, keep.tolist()) if kept][:self.capacity]
+        words = [row_words for row_words, kept in zip(words, keep.tolist()) if kept][:self.capacity]
+        size = len(vectors)
+        self._vectors[:size] = vectors
+        self._scales[:size] = scales
+        self._signatures[:size] = self._signature(vectors / scales[:, None])
+        self._scopes[:size] = scopes
+        self._expires_at[:size] = expires_at
+        self._last_used[:size] = last_used
+        self._answers[:size] = answers
+        self._words[:size] = words
+        self.size = size
+        for row in range(size):
+            self._index(row)
+        return size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _build_semantic_cache() -> SemanticCache | None:
+    settings = config.semantic_cache
+    if not settings.enabled:
+        return None
+    if np is None:
+        logger.warning("Семантичний кеш увімкнено, але numpy не встановлено — кеш вимкнено.")
+        return None
+    return SemanticCache(
+        capacity=settings.capacity,
+        dim=settings.dim,
+        tables=settings.tables,
+        bits=settings.bits,
+        threshold=settings.threshold,
+        ttl=settings.ttl,
+        snapshot_path=settings.snapshot_path
+    )
+
+
+# None, якщо кеш вимкнено або numpy недоступний
+semantic_cache = _build_semantic_cache()
@@ -0,0 +1,152 @@
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import time
+from pathlib import Path
+from telegram import BotCommand, MenuButton
+from telegram.error import TelegramError
+from telegram.ext import Application
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.media import media_registry
+
+# Модулі, що тягнуть за собою openai, numpy та решту шару моделі; імпортуються у фоні після старту
+HEAVY_MODULES = (
+    "src.bot.handlers.gpt_handler",
+    "src.bot.handlers.talk_handler",
+    "src.bot.handlers.quiz_handler",
+    "src.bot.handlers.random_handler",
+    "src.bot.services.quiz_pool",
+    "src.bot.services.fact_buffer",
+    "src.bot.services.leaderboard",
+)
+
+
+class LazyHandlers:
+    """
+    Обробники з модуля, який імпортується лише під час першого виклику одного з них.
+
+    handlers = LazyHandlers("src.bot.handlers.gpt_handler"); handlers.start_gpt_conversation —
+    callback для реєстрації в Application, що за першого виклику імпортує модуль і далі викликає
+    справжню функцію. Якщо фоновий прогрів уже імпортував модуль, імпорт нічого не коштує.
+    """
+
+    def __init__(self, module: str):
+        self.module = module
+
+    def __getattr__(self, name: str):
+        module_name = self.module
+        target = None
+
+        async def callback(update, context):
+            nonlocal target
+            if target is None:
+                target = getattr(importlib.import_module(module_name), name)
+            return await target(update, context)
+
+        callback.__name__ = callback.__qualname__ = name
+        callback.__module__ = module_name
+        setattr(self, name, callback)  # наступні звернення не проходять через __getattr__
+        return callback
+
+
+def _import_all(modules: tuple[str, ...]) -> None:
+    for module in modules:
+        importlib.import_module(module)
+
+
+async def preload_modules(modules: tuple[str, ...] = HEAVY_MODULES) -> float:
+    """Імпортує модулі в окремому потоці; повертає тривалість у секундах."""
+    start = time.perf_counter()
+    await asyncio.to_thread(_import_all, modules)
+    return time.perf_counter() - start
+
+
+def commands_fingerprint(bot_id: int, commands: list[BotCommand], menu_button: MenuButton) -> str:
+    payload = json.dumps(
+        [bot_id, [command.to_dict() for command in commands], menu_button.to_dict()],
+        ensure_ascii=False, sort_keys=True
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def sync_commands(application: Application, commands: list[BotCommand], menu_button: MenuButton,
+                        hash_file: Path) -> bool:
+    """
+    Встановлює команди та кнопку меню бота, лише якщо вони змінилися з минулого запуску.
+
+    Відбиток команд (разом з id бота) зберігається у hash_file; повертає True, якщо запити
+    до Bot API було надіслано.
+    """
+    fingerprint = commands_fingerprint(application.bot.id, commands, menu_button)
+    try:
+        if hash_file.read_text(encoding="utf-8").strip() == fingerprint:
+            logger.info("Команди бота та меню не змінилися, оновлення пропущено.")
+            return False
+    except OSError:
+        pass
+    try:
+        await application.bot.set_my_commands(commands)
+        await application.bot.set_chat_menu_button(menu_button=menu_button)
+    except TelegramError as e:
+        logger.warning(f"Не вдалося встановити команди бота: {e}")
+        return False
+    try:
+        os.makedirs(hash_file.parent, exist_ok=True)
+        hash_file.write_text(fingerprint, encoding="utf-8")
+    except OSError as e:
+        logger.warning(f"Не вдалося зберегти відбиток команд бота: {e}")
+    logger.info("Команди бота та меню успішно встановлено.")
+    return True
+
+
+async def warm_up(application: Application, commands: list[BotCommand], menu_button: MenuButton) -> None:
+    """
+    Прогрів після старту: команди бота, імпорт шару моделі, клієнт OpenAI і з'єднання з ним,
+    фонові пули, семантичний кеш, рейтинг квізу і кеш зображень. Оновлення вже обробляються паралельно.
+    """
+    start = time.perf_counter()
+    try:
+        await _warm_up(application, commands, menu_button)
+    except Exception as e:  # без прогріву все ініціалізується під час першого використання
+        logger.error(f"Помилка фонового прогріву: {e!r}")
+        return
+    logger.info(f"Прогрів завершено за {time.perf_counter() - start:.2f} с.")
+
+    # Попередньо завантажуємо зображення, щоб перші відповіді йшли за file_id
+    if config.media.warmup_chat_id:
+        await media_registry.warm_up(application.bot, config.media.warmup_chat_id)
+
+
+async def _warm_up(application: Application, commands: list[BotCommand], menu_button: MenuButton) -> None:
+    _, imported = await asyncio.gather(
+        sync_commands(application, commands, menu_button, config.startup.commands_hash_file),
+        preload_modules()
+    )
+    logger.info(f"Модулі обробників завантажено за {imported:.2f} с.")
+
+    # Модулі вже імпортовано в preload_modules, тож тут імпорт нічого не коштує
+    from src.bot.services import llm
+    from src.bot.services.admission import admission_controller
+    from src.bot.services.quiz_pool import quiz_pool
+    from src.bot.services.fact_buffer import fact_buffer
+    from src.bot.services.semantic_cache import semantic_cache
+    from src.bot.services.leaderboard import leaderboard
+
+    await llm.init_client(application)
+    admission_controller.check_capacity(application.update_processor.max_concurrent_updates)
+    if config.quiz_pool.enabled:
+        quiz_pool.start()
+    if config.fact_buffer.enabled:
+        fact_buffer.start()
+    if semantic_cache is not None:
+        loaded = await asyncio.to_thread(semantic_cache.load)
+        logger.info(f"Семантичний кеш: завантажено {loaded} записів.")
+    if leaderboard is not None:
+        users = await leaderboard.load()
+        leaderboard.start()
+        logger.info(f"Рейтинг квізу: завантажено {users} користувачів.")
+    if config.startup.warm_up_connections:
+        await llm.warm_up_connection()
@@ -0,0 +1,100 @@
+import asyncio
+import contextlib
+import time
+from telegram import Message, InlineKeyboardMarkup
+from telegram.error import BadRequest, RetryAfter
+from loguru import logger
+from src.settings.config import config
+from src.bot.services import llm
+from src.bot.services.completion_cache import completion_cache
+from src.bot.services.outbound import BULK, INTERACTIVE, priority_kwargs
+
+# Максимальна довжина тексту одного повідомлення Telegram
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+
+async def _safe_edit(message: Message, text: str, reply_markup: InlineKeyboardMarkup | None = None,
+                     priority: int = INTERACTIVE) -> None:
+    """Редагує повідомлення, ігноруючи помилку 'message is not modified' та чекаючи при RetryAfter."""
+    bot = message.get_bot()
+    edit_kwargs = {"chat_id": message.chat_id, "message_id": message.message_id, "reply_markup": reply_markup,
+                   **priority_kwargs(bot, priority)}
+    try:
+        await bot.edit_message_text(text, **edit_kwargs)
+    except RetryAfter as e:
+        await asyncio.sleep(e.retry_after)
+        await bot.edit_message_text(text, **edit_kwargs)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+
+
+async def reply_streaming(target: Message, messages: list[dict], reply_markup: InlineKeyboardMarkup | None = None,
+                          task: str = "default", cache_ttl: float = 0, **kwargs) -> str:
+    """
+    Надсилає заглушку одразу, а потім поступово редагує її текстом відповіді моделі.
+
+    Редагування обмежуються за часом (edit_interval) і за приростом тексту (min_chunk_chars),
+    щоб не перевищувати ліміти Telegram. Клавіатура додається лише до останнього редагування.
+    Якщо генерацію скасовано або вона завершилась помилкою, усі повідомлення недописаної відповіді
+    видаляються.
+    При cache_ttl > 0 збережена відповідь на такий самий запит надсилається одразу, без моделі.
+    Повертає повний текст відповіді.
+    """
+    settings = config.streaming
+    key = None
+    if cache_ttl > 0 and config.completion_cache.enabled:
+        key = llm.request_key(messages, task, **kwargs)
+        cached = await completion_cache.get(key)
+        if cached is not None and len(cached) <= TELEGRAM_MESSAGE_LIMIT:
+            await target.reply_text(cached, reply_markup=reply_markup)
+            return cached
+    message = await target.reply_text(settings.placeholder)
+    sent = [message]  # усі повідомлення відповіді, якщо її довелося розбити
+
+    full_text = ""
+    chunk_start = 0  # початок тексту поточного повідомлення у full_text
+    sent_len = 0
+    last_edit = time.monotonic()
+
+    try:
+        # Потік тримає місце в контролі допуску, тож закриваємо його одразу, а не під час збирання сміття
+        async with contextlib.aclosing(llm.stream(messages, task=task, **kwargs)) as chunks:
+            async for delta in chunks:
+                full_text += delta
+
+                # Текст не вміщується в одне повідомлення: фіксуємо поточне і продовжуємо в новому
+                while len(full_text) - chunk_start > TELEGRAM_MESSAGE_LIMIT:
+                    await _safe_edit(message, full_text[chunk_start:chunk_start + TELEGRAM_MESSAGE_LIMIT])
+                    chunk_start += TELEGRAM_MESSAGE_LIMIT
+                    message = await target.reply_text(settings.placeholder)
+                    sent.append(message)
+                    sent_len = chunk_start
+                    last_edit = time.monotonic()
+
+                now = time.monotonic()
+                if (now - last_edit >= settings.edit_interval
+                        and len(full_text) - sent_len >= settings.min_chunk_chars
+                        and full_text[chunk_start:].strip()):
+                    sent_len = len(full_text)
+                    # Проміжні редагування мають нижчий пріоритет за відповіді іншим користувачам
+                    await _safe_edit(message, full_text[chunk_start:], priority=BULK)
+                    last_edit = now
+    except (asyncio.CancelledError, Exception):
+        # Відповідь застаріла (користувач надіслав нове повідомлення), запит не допущено через
+        # перевантаження або генерація зірвалась — прибираємо її залишки, а повідомлення про
+        # помилку надсилає обробник
+        for part in sent:
+            try:
+                await part.delete()
+            except Exception as e:
+                logger.debug(f"Не вдалося видалити скасовану відповідь: {e}")
+        raise
+
+    final_text = full_text[chunk_start:]
+    if not final_text.strip():
+        final_text = "..."
+    await _safe_edit(message, final_text, reply_markup=reply_markup)
+    if key is not None:
+        await completion_cache.put(key, full_text, cache_ttl)
+    return full_text
@@ -0,0 +1,92 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from loguru import logger
+from src.settings.config import config
+
+
+class Span:
+    """Етап обробки оновлення: назва, атрибути, тривалість і вкладені етапи."""
+
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: float | None = None
+        self.children: list[Span] = []
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def format(self, root_start: float | None = None, depth: int = 0) -> list[str]:
+        """Рядки дерева етапів: зсув від початку оновлення, тривалість, назва та атрибути."""
+        root_start = self.start if root_start is None else root_start
+        attrs = " ".join(f"{key}={value}" for key, value in self.attrs.items())
+        lines = [f"{'  ' * depth}+{(self.start - root_start) * 1000:.0f} мс "
+                 f"{self.duration * 1000:.0f} мс {self.name} {attrs}".rstrip()]
+        for child in self.children:
+            lines.extend(child.format(root_start, depth + 1))
+        return lines
+
+
+# Поточний етап; створені з обробника задачі успадковують його разом з контекстом
+_current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+# Користувач, чиє оновлення обробляється (None — фонові задачі); успадковується так само
+current_user: ContextVar[int | None] = ContextVar("current_user", default=None)
+
+
+@contextmanager
+def user_scope(user_id: int | None):
+    """Прив'язує все, що виконується в межах блоку (зокрема запити до моделі), до користувача user_id."""
+    token = current_user.set(user_id)
+    try:
+        yield
+    finally:
+        current_user.reset(token)
+
+
+@contextmanager
+def trace(name: str, update_id: int | None = None):
+    """
+    Кореневий етап обробки одного оновлення.
+
+    Якщо трасування ввімкнене і оновлення оброблялося довше за Settings.tracing.slow_threshold,
+    дерево етапів записується в лог з update_id.
+    """
+    if not config.tracing.enabled or _current.get() is not None:
+        with span(name) as current:
+            yield current
+        return
+    root = Span(name, {"update_id": update_id})
+    token = _current.set(root)
+    try:
+        yield root
+    finally:
+        root.end = time.perf_counter()
+        _current.reset(token)
+        if root.duration >= config.tracing.slow_threshold:
+            logger.info(f"Повільне оновлення update_id={update_id} ({root.duration:.2f} с):\n"
+                        + "\n".join(root.format()))
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Вкладений етап поточного оновлення; поза трасуванням нічого не робить і повертає None."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    current = Span(name, attrs)
+    parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
@@ -0,0 +1,244 @@
+import asyncio
+import hmac
+import json
+import signal
+from telegram import Update
+from telegram.ext import Application
+from loguru import logger
+from src.settings.config import config
+
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+MAX_BODY_SIZE = 1024 * 1024
+
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 503: "Service Unavailable"}
+
+
+class Overloaded(Exception):
+    """Оновлення зараз не може бути прийняте (черга переповнена); Telegram повторить запит пізніше."""
+
+
+class MalformedRequest(Exception):
+    """HTTP-запит неможливо розібрати; відповідаємо 400 і закриваємо з'єднання."""
+
+
+class ApplicationReceiver:
+    """Передає оновлення в чергу Application цього процесу."""
+
+    def __init__(self, application: Application):
+        self.application = application
+
+    @property
+    def ready(self) -> bool:
+        return self.application.running
+
+    async def receive(self, data: dict) -> None:
+        try:
+            update = Update.de_json(data, self.application.bot)
+        except (TypeError, KeyError) as e:
+            raise ValueError(e) from e
+        await self.application.update_queue.put(update)
+
+
+class WebhookServer:
+    """
+    Мінімальний асинхронний HTTP-сервер для прийому оновлень від Telegram.
+
+    Маршрути:
+        POST <path>   — приймає JSON оновлення, перевіряє секретний токен і передає оновлення receiver
+                        (черга Application або пул процесів-обробників);
+        GET  /healthz — процес живий;
+        GET  /readyz  — бот запущений і приймає оновлення (503 під час зупинки).
+    """
+
+    def __init__(self, receiver, host: str, port: int, path: str, secret_token: str):
+        if not secret_token:
+            # Порожній токен збігається з відсутнім заголовком, тобто сервер приймав би будь-які запити
+            raise ValueError("Для webhook-сервера потрібен непорожній секретний токен")
+        self.receiver = receiver
+        self.host = host
+        self.port = port
+        self.path = path
+        self.secret_token = secret_token.encode("utf-8")
+        self.draining = False
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: set[asyncio.Task] = set()
+        # З'єднання, які саме зараз обробляють запит
+        self._busy: set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"Webhook-сервер слухає http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self, timeout: float) -> None:
+        """Перестає приймати з'єднання і чекає завершення запитів, що вже обробляються."""
+        self.draining = True
+        if self._server is not None:
+            self._server.close()
+        # Неактивні keep-alive з'єднання закриваємо одразу, активні — чекаємо до timeout
+        for task in self._connections - self._busy:
+            task.cancel()
+        if self._busy:
+            await asyncio.wait(self._busy, timeout=timeout)
+        for task in list(self._connections):
+            task.cancel()
+        logger.info("Webhook-сервер зупинено.")
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            keep_alive = True
+            while keep_alive and not self.draining:
+                try:
+                    request = await self._read_request(reader)
+                except MalformedRequest as e:
+                    logger.warning(f"Некоректний HTTP-запит на webhook: {e}")
+                    await self._write_response(writer, 400, {"error": "bad request"}, False)
+                    break
+                if request is None:
+                    break
+                self._busy.add(task)
+                method, target, headers, body = request
+                # Непрочитане тіло лишилося в з'єднанні, тож наступний запит з нього не розібрати
+                keep_alive = body is not None and headers.get("connection", "").lower() != "close"
+                status, payload = await self._dispatch(method, target, headers, body)
+                await self._write_response(writer, status, payload, keep_alive and not self.draining)
+                self._busy.discard(task)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"Помилка обробки запиту webhook: {e}")
+        finally:
+            self._connections.discard(task)
+            self._busy.discard(task)
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        """Читає один HTTP-запит; повертає None, якщо клієнт закрив з'єднання."""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise MalformedRequest(f"некоректний рядок запиту {lines[0][:100]!r}") from None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise MalformedRequest(f"некоректний Content-Length {headers['content-length'][:100]!r}")
+        if length > MAX_BODY_SIZE:
+            return method, target, headers, None
+        body = await reader.readexactly(length) if length else b""
+        return method, target, headers, body
+
+    async def _dispatch(self, method: str, target: str, headers: dict, body: bytes | None) -> tuple[int, dict]:
+        path = target.split("?", 1)[0]
+        if path == "/healthz":
+            return 200, {"status": "ok"}
+        if path == "/readyz":
+            ready = self.receiver.ready and not self.draining
+            return (200, {"status": "ready"}) if ready else (503, {"status": "draining"})
+        if path != self.path:
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "method not allowed"}
+        # Заголовки декодовані з latin-1: порівнюємо байти, бо compare_digest не приймає рядки з не-ASCII символами
+        if not hmac.compare_digest(headers.get(SECRET_HEADER, "").encode("latin-1"), self.secret_token):
+            logger.warning("Запит на webhook з неправильним секретним токеном.")
+            return 403, {"error": "forbidden"}
+        if self.draining:
+            return 503, {"error": "draining"}
+        if body is None:
+            return 413, {"error": "payload too large"}
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                raise ValueError(f"очікувався JSON-об'єкт, отримано {type(data).__name__}")
+            await self.receiver.receive(data)
+        except ValueError as e:
+            logger.warning(f"Некоректне оновлення у webhook: {e}")
+            return 400, {"error": "bad update"}
+        except Overloaded:
+            return 503, {"error": "overloaded"}
+        return 200, {"ok": True}
+
+    @staticmethod
+    async def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        head = (
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+
+def stop_on_signals() -> asyncio.Event:
+    """Подія, що встановлюється при SIGINT/SIGTERM (викликати з запущеного циклу подій)."""
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:  # Windows
+            pass
+    return stop_event
+
+
+async def register_webhook(bot) -> None:
+    """Реєструє адресу webhook у Telegram, якщо задано Settings.webhook.url."""
+    settings = config.webhook
+    if settings.url:
+        await bot.set_webhook(
+            url=settings.url.rstrip("/") + settings.path,
+            secret_token=settings.secret_token,
+            allowed_updates=Update.ALL_TYPES
+        )
+        logger.info(f"Webhook зареєстровано: {settings.url.rstrip('/')}{settings.path}")
+
+
+async def run_webhook(application: Application) -> None:
+    """
+    Запускає бота в режимі webhook: власний HTTP-сервер замість long polling.
+
+    Під час зупинки (SIGINT/SIGTERM) сервер перестає приймати оновлення, /readyz повертає 503,
+    а оновлення, що вже в черзі, обробляються до кінця перед завершенням Application.
+    """
+    settings = config.webhook
+    stop_event = stop_on_signals()
+    server = WebhookServer(
+        ApplicationReceiver(application), settings.listen, settings.port, settings.path, settings.secret_token
+    )
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await register_webhook(application.bot)
+        await application.start()
+        await server.start()
+
+        await stop_event.wait()
+        logger.info("Отримано сигнал зупинки, завершую обробку оновлень...")
+
+        await server.stop(settings.drain_timeout)
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
@@ -0,0 +1,407 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+from telegram import Bot, Update
+from telegram.error import NetworkError
+from loguru import logger
+from src.settings.config import config
+from src.bot.services.webhook import Overloaded, WebhookServer, stop_on_signals, register_webhook
+
+# Секунди, які Telegram тримає запит getUpdates відкритим, якщо нових оновлень немає
+POLL_TIMEOUT = 30
+
+# Де в оновленні шукати чат; для оновлень без чату використовується користувач
+_CHAT_PATHS = (
+    ("message", "chat"), ("edited_message", "chat"), ("channel_post", "chat"), ("edited_channel_post", "chat"),
+    ("callback_query", "message", "chat"), ("my_chat_member", "chat"), ("chat_member", "chat"),
+    ("chat_join_request", "chat"), ("message_reaction", "chat"),
+)
+_USER_PATHS = (
+    ("callback_query", "from"), ("inline_query", "from"), ("chosen_inline_result", "from"),
+    ("shipping_query", "from"), ("pre_checkout_query", "from"), ("poll_answer", "user"),
+)
+
+
+def _lookup(data: dict, path: tuple[str, ...]):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def chat_key(data: dict) -> int:
+    """id чату оновлення (або користувача, якщо чату немає); 0 — для службових оновлень."""
+    for paths in (_CHAT_PATHS, _USER_PATHS):
+        for path in paths:
+            entity = _lookup(data, path)
+            if isinstance(entity, dict) and "id" in entity:
+                return int(entity["id"])
+    return 0
+
+
+def shard_for(key: int, count: int) -> int:
+    """Номер обробника для чату; не залежить від процесу і PYTHONHASHSEED."""
+    return zlib.crc32(str(key).encode("ascii")) % count
+
+
+def apply_overrides(overrides: dict) -> None:
+    """Перевизначає налаштування за шляхами на кшталт {"openai.base_url": "..."}."""
+    for path, value in overrides.items():
+        *parents, name = path.split(".")
+        target = config
+        for parent in parents:
+            target = getattr(target, parent)
+        setattr(target, name, value)
+
+
+class WorkerSpec(NamedTuple):
+    index: int
+    count: int
+    inbox: multiprocessing.Queue
+    events: multiprocessing.Queue
+    bot_api_url: str | None = None
+    overrides: dict = {}
+    # Повідомляти головний процес про кожне оброблене оновлення (для навантажувальних тестів)
+    ack: bool = False
+
+
+def _configure_worker(index: int, count: int) -> None:
+    """Налаштування, що мають відрізнятися між процесами-обробниками."""
+    config.paths.logs = config.paths.logs / f"worker-{index}"
+    if config.metrics.port:
+        config.metrics.port += index
+    # Ліміт Telegram діє на весь бот, тож ділиться між процесами
+    config.outbound.global_rate /= count
+    config.outbound.global_burst = max(1, config.outbound.global_burst // count)
+    if index:
+        config.media.warmup_chat_id = None
+
+
+def worker_main(spec: WorkerSpec) -> None:
+    """Точка входу процесу-обробника."""
+    # Ctrl+C отримує вся група процесів, а зупинкою керує головний процес
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    apply_overrides(spec.overrides)
+    _configure_worker(spec.index, spec.count)
+    from src.settings.logging_config import setup_logging
+    setup_logging()
+    asyncio.run(_serve_worker(spec))
+
+
+def _report_processed(application, spec: WorkerSpec) -> None:
+    original = application.process_update
+
+    async def process_update(update: object) -> None:
+        started = time.perf_counter()
+        try:
+            await original(update)
+        finally:
+            spec.events.put(("done", spec.index, getattr(update, "update_id", None), time.perf_counter() - started))
+
+    application.process_update = process_update
+
+
+async def _serve_worker(spec: WorkerSpec) -> None:
+    # Модулі з об'єктами-одинаками імпортуються лише після перевизначення налаштувань
+    from src.main import build_application
+    from src.bot.services.resources import resource_registry
+
+    resource_registry.load_all()
+    application = build_application(use_updater=False, bot_api_url=spec.bot_api_url)
+    if spec.ack:
+        _report_processed(application, spec)
+    loop = asyncio.get_running_loop()
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        spec.events.put(("ready", spec.index, os.getpid()))
+        logger.info(f"Обробник {spec.index} запущено (pid {os.getpid()}).")
+
+        while True:
+            item = await loop.run_in_executor(None, spec.inbox.get)
+            if item is None:
+                break
+            sequence, data = item
+            # Після підтвердження головний процес більше не надсилатиме це оновлення повторно
+            spec.events.put(("taken", spec.index, sequence))
+            try:
+                update = Update.de_json(data, application.bot)
+            except (TypeError, KeyError, ValueError) as e:
+                logger.warning(f"Некоректне оновлення для обробника {spec.index}: {e}")
+                continue
+            await application.update_queue.put(update)
+
+        logger.info(f"Обробник {spec.index}: зупинка, завершую обробку оновлень з черги...")
+        await application.stop()
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+class WorkerPool:
+    """
+    Пул процесів-обробників, кожен зі своїм Application і циклом подій.
+
+    - Оновлення розподіляються за стабільним хешем chat_id, тож усі оновлення одного чату
+      обробляє той самий процес і стан ConversationHandler залишається в ньому.
+    - Процес, що завершився, перезапускається з експоненційною паузою. Головний процес зберігає
+      кожне оновлення, доки обробник не підтвердить, що взяв його з черги, і новий процес отримує
+      нову чергу з усіма непідтвердженими оновленнями — вони не губляться.
+    - drain() перестає приймати оновлення, чекає, поки обробники завершать свої черги, і зупиняє їх.
+    """
+
+    def __init__(self, count: int, queue_size: int, restart_backoff: float, restart_backoff_max: float,
+                 stable_after: float, bot_api_url: str | None = None, overrides: dict | None = None,
+                 ack: bool = False, on_processed: Callable[[int, float], None] | None = None):
+        self.count = count
+        self.queue_size = queue_size
+        self.restart_backoff = restart_backoff
+        self.restart_backoff_max = restart_backoff_max
+        self.stable_after = stable_after
+        self.bot_api_url = bot_api_url
+        self.overrides = overrides or {}
+        self.ack = ack
+        self.on_processed = on_processed
+        self._context = multiprocessing.get_context("spawn")
+        # Місце для сигналу зупинки понад queue_size оновлень
+        self.inboxes = [self._context.Queue(queue_size + 1) for _ in range(count)]
+        # Надіслані, але ще не взяті обробником оновлення: номер -> оновлення
+        self._unacked: list[OrderedDict[int, dict]] = [OrderedDict() for _ in range(count)]
+        self._sequence = 0
+        self.events = self._context.Queue()
+        self._processes: list = [None] * count
+        self._started_at = [0.0] * count
+        self._backoff = [restart_backoff] * count
+        self._restart_at: list[float | None] = [None] * count
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._monitor_task: asyncio.Task | None = None
+        self._events_thread: threading.Thread | None = None
+        self.ready_workers: set[int] = set()
+        self.dispatched = [0] * count
+        self.restarts = 0
+        self.draining = False
+
+    @property
+    def ready(self) -> bool:
+        return not self.draining and bool(self.ready_workers)
+
+    def pids(self) -> list[int]:
+        return [process.pid for process in self._processes if process is not None and process.is_alive()]
+
+    def _spawn(self, index: int) -> None:
+        if self._processes[index] is not None:
+            self._replace_inbox(index)
+        spec = WorkerSpec(index, self.count, self.inboxes[index], self.events, self.bot_api_url, self.overrides,
+                          self.ack)
+        process = self._context.Process(target=worker_main, args=(spec,), name=f"bot-worker-{index}")
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+
+    def _replace_inbox(self, index: int) -> None:
+        """
+        Нова черга для перезапущеного обробника з усіма непідтвердженими оновленнями.
+
+        Старою чергою користуватися не можна: процес міг загинути всередині get(), лишивши
+        захопленим блокування читання або недочитане повідомлення в каналі.
+        """
+        old = self.inboxes[index]
+        inbox = self._context.Queue(self.queue_size + 1)
+        for item in self._unacked[index].items():
+            inbox.put_nowait(item)
+        self.inboxes[index] = inbox
+        old.close()
+        old.cancel_join_thread()
+        if self._unacked[index]:
+            logger.info(f"Обробнику {index} повторно надіслано {len(self._unacked[index])} оновлень.")
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._events_thread = threading.Thread(target=self._read_events, name="worker-events", daemon=True)
+        self._events_thread.start()
+        for index in range(self.count):
+            self._spawn(index)
+        self._monitor_task = asyncio.create_task(self._monitor())
+        logger.info(f"Запущено {self.count} процесів-обробників.")
+
+    def _read_events(self) -> None:
+        while True:
+            event = self.events.get()
+            if event is None:
+                return
+            self._loop.call_soon_threadsafe(self._on_event, event)
+
+    def _on_event(self, event: tuple) -> None:
+        kind, index = event[0], event[1]
+        if kind == "taken":
+            self._unacked[index].pop(event[2], None)
+        elif kind == "ready":
+            self.ready_workers.add(index)
+        elif kind == "done" and self.on_processed is not None:
+            self.on_processed(event[2], event[3])
+
+    async def receive(self, data: dict) -> None:
+        """Приймає оновлення від WebhookServer."""
+        self.dispatch(data)
+
+    def dispatch(self, data: dict) -> int:
+        """Ставить оновлення в чергу його обробника; Overloaded, якщо черга переповнена або йде зупинка."""
+        if self.draining:
+            raise Overloaded("Обробники зупиняються")
+        index = shard_for(chat_key(data), self.count)
+        unacked = self._unacked[index]
+        if len(unacked) >= self.queue_size:
+            raise Overloaded(f"Черга обробника {index} переповнена")
+        self._sequence += 1
+        try:
+            self.inboxes[index].put_nowait((self._sequence, data))
+        except queue.Full:
+            raise Overloaded(f"Черга обробника {index} переповнена") from None
+        unacked[self._sequence] = data
+        self.dispatched[index] += 1
+        return index
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(0.5)
+            now = time.monotonic()
+            for index, process in enumerate(self._processes):
+                restart_at = self._restart_at[index]
+                if restart_at is not None:
+                    if now >= restart_at:
+                        self._restart_at[index] = None
+                        self._spawn(index)
+                    continue
+                if process.is_alive():
+                    if now - self._started_at[index] >= self.stable_after:
+                        self._backoff[index] = self.restart_backoff
+                    continue
+                if self.draining:
+                    continue
+                self.ready_workers.discard(index)
+                delay = self._backoff[index]
+                self._backoff[index] = min(self.restart_backoff_max, delay * 2)
+                self._restart_at[index] = now + delay
+                self.restarts += 1
+                logger.error(f"Обробник {index} завершився з кодом {process.exitcode}; перезапуск через {delay:.0f} с.")
+
+    async def drain(self, timeout: float) -> None:
+        """Перестає приймати оновлення, чекає завершення черг (не довше timeout) і зупиняє процеси."""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        for index, process in enumerate(self._processes):
+            if process is None or not process.is_alive():
+                # Процес чекав на перезапуск або завершився після останньої перевірки монітора,
+                # але в його черзі можуть бути оновлення
+                self._restart_at[index] = None
+                self._spawn(index)
+        for index, inbox in enumerate(self.inboxes):
+            try:
+                await asyncio.to_thread(inbox.put, None, True, max(0.1, deadline - time.monotonic()))
+            except queue.Full:
+                # Обробник не розібрав чергу до дедлайну; нижче його буде зупинено примусово
+                logger.warning(f"Черга обробника {index} переповнена, сигнал зупинки не надіслано.")
+        while any(process.is_alive() for process in self._processes) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for index, process in enumerate(self._processes):
+            if process.is_alive():
+                logger.warning(f"Обробник {index} не завершився за {timeout} с, зупиняю примусово.")
+                process.terminate()
+            await asyncio.to_thread(process.join, 5)
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+        self.events.put(None)
+        logger.info("Усі процеси-обробники зупинено.")
+
+    def stats(self) -> dict:
+        return {
+            "alive": [process is not None and process.is_alive() for process in self._processes],
+            "dispatched": list(self.dispatched),
+            "queued": [len(unacked) for unacked in self._unacked],
+            "restarts": self.restarts,
+        }
+
+
+def build_pool(**kwargs) -> WorkerPool:
+    """Створює пул згідно з Settings.workers; kwargs передаються WorkerPool."""
+    settings = config.workers
+    return WorkerPool(
+        count=settings.count,
+        queue_size=settings.queue_size,
+        restart_backoff=settings.restart_backoff,
+        restart_backoff_max=settings.restart_backoff_max,
+        stable_after=settings.stable_after,
+        **kwargs
+    )
+
+
+async def poll_updates(bot: Bot, pool: WorkerPool, stop_event: asyncio.Event) -> None:
+    """Лідер long polling: отримує оновлення від Telegram і розподіляє їх між обробниками."""
+    await bot.delete_webhook()
+    offset = None
+    while not stop_event.is_set():
+        fetch = asyncio.create_task(
+            bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES)
+        )
+        stop = asyncio.create_task(stop_event.wait())
+        await asyncio.wait({fetch, stop}, return_when=asyncio.FIRST_COMPLETED)
+        stop.cancel()
+        if not fetch.done():
+            fetch.cancel()
+            break
+        try:
+            updates = fetch.result()
+        except NetworkError as e:
+            logger.warning(f"Помилка отримання оновлень: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            while not stop_event.is_set():
+                try:
+                    pool.dispatch(update.to_dict())
+                    break
+                except Overloaded:
+                    # Черга обробника переповнена: не підтверджуємо оновлення, доки вона не звільниться
+                    await asyncio.sleep(0.1)
+            else:
+                break
+            offset = update.update_id + 1
+    if offset is not None:
+        # Підтверджуємо вже розподілені оновлення, щоб Telegram не надіслав їх повторно
+        await bot.get_updates(offset=offset, timeout=0)
+
+
+async def run_sharded() -> None:
+    """
+    Головний процес у режимі кількох обробників: приймає оновлення (webhook або long polling)
+    і розподіляє їх між процесами за chat_id. SIGINT/SIGTERM запускають плавну зупинку.
+    """
+    stop_event = stop_on_signals()
+    pool = build_pool()
+    await pool.start()
+    try:
+        async with Bot(config.bot_api_key) as bot:
+            if config.webhook.mode == "webhook":
+                settings = config.webhook
+                server = WebhookServer(pool, settings.listen, settings.port, settings.path, settings.secret_token)
+                await register_webhook(bot)
+                await server.start()
+                await stop_event.wait()
+                logger.info("Отримано сигнал зупинки, завершую обробку оновлень...")
+                await server.stop(settings.drain_timeout)
+            else:
+                await poll_updates(bot, pool, stop_event)
+    finally:
+        await pool.drain(config.workers.drain_timeout)
@@ -1,19 +1,26 @@
+import asyncio
 import os
 import sys
 from telegram import BotCommand, MenuButtonCommands
 from telegram.ext import (
     Application,
     CommandHandler,
-    CallbackQueryHandler,
     MessageHandler,
     filters,
     ConversationHandler
 )
 from loguru import logger
 from src.settings.config import config
-from src.settings.logging_config import setup_logging
-from src.bot.handlers import gpt_handler, talk_handler, quiz_handler, random_handler
+from src.settings.logging_config import setup_logging, flush_logging
 from src.bot.handlers.common import start
+from src.bot.services.resources import resource_registry
+from src.bot.services.persistence import build_persistence
+from src.bot.services.outbound import build_scheduler
+from src.bot.services.webhook import run_webhook
+from src.bot.services.workers import run_sharded
+from src.bot.services.callback_router import CallbackRouter
+from src.bot.services.startup import LazyHandlers, warm_up
+from src.bot.services.metrics import InstrumentedRequest, instrument_handlers, loop_lag_monitor, metrics_server
 from src.bot.constants import (
     GPT_DIALOGUE_STATE,
     TALK_PERSONALITY_STATE,
@@ -24,43 +31,131 @@ from src.bot.constants import (
 )
 
 
+# Модулі з обробниками, що працюють з моделлю, імпортуються у фоні після старту (startup.warm_up)
+# або під час першого виклику обробника, тож openai не затримує початок обробки оновлень
+gpt_handler = LazyHandlers("src.bot.handlers.gpt_handler")
+talk_handler = LazyHandlers("src.bot.handlers.talk_handler")
+quiz_handler = LazyHandlers("src.bot.handlers.quiz_handler")
+random_handler = LazyHandlers("src.bot.handlers.random_handler")
+
+BOT_COMMANDS = [
+    BotCommand("start", "Головне меню 🏠"),
+    BotCommand("random", "Отримати випадковий цікавий факт 🧠"),
+    BotCommand("gpt", "Запитати у ChatGPT 🤖"),
+    BotCommand("quiz", "Пройти тест ❓"),
+    BotCommand("top", "Рейтинг квізу 🏆"),
+    BotCommand("talk", "Діалог з відомою особистістю 👤")
+]
+
+
 async def post_init(application: Application):
-    """Ініціалізує команди бота та меню після запуску."""
-    commands = [
-        BotCommand("start", "Головне меню 🏠"),
-        BotCommand("random", "Отримати випадковий цікавий факт 🧠"),
-        BotCommand("gpt", "Запитати у ChatGPT 🤖"),
-        BotCommand("quiz", "Пройти тест ❓"),
-        BotCommand("talk", "Діалог з відомою особистістю 👤")
-    ]
-    await application.bot.set_my_commands(commands)
-    await application.bot.set_chat_menu_button(menu_button=MenuButtonCommands())
-    logger.info("Команди бота та меню успішно встановлено.")
+    """Запускає службові компоненти; команди бота, клієнт OpenAI і фонові пули прогріваються у фоні."""
+    loop_lag_monitor.start()
+    if config.metrics.enabled:
+        try:
+            await metrics_server.start()
+        except OSError as e:
+            logger.warning(f"Не вдалося запустити сервер метрик: {e}")
+    if application.persistence is not None:
+        application.persistence.start(application)
 
+    warmup = warm_up(application, BOT_COMMANDS, MenuButtonCommands())
+    if config.startup.background_warmup:
+        application.bot_data['warmup_task'] = asyncio.create_task(warmup)
+    else:
+        await warmup
 
-def main() -> None:
-    """Основна функція для запуску бота."""
-    setup_logging()
 
-    if not config.bot_api_key:
-        logger.error("Токен бота не знайдено. Перевірте файл .env")
-        sys.exit(1)
+async def post_shutdown(application: Application):
+    """Звільняє ресурси після зупинки бота."""
+    from src.bot.services import llm
+    from src.bot.services.quiz_pool import quiz_pool
+    from src.bot.services.fact_buffer import fact_buffer
+    from src.bot.services.completion_cache import completion_cache
+    from src.bot.services.admission import admission_controller
+    from src.bot.services.semantic_cache import semantic_cache
+    from src.bot.services.leaderboard import leaderboard
+
+    warmup_task = application.bot_data.pop('warmup_task', None)
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    loop_lag_monitor.stop()
+    await metrics_server.stop()
+    quiz_pool.stop()
+    fact_buffer.stop()
+    await llm.close_client(application)
+    logger.info(f"Кеш відповідей моделі: {completion_cache.stats()}")
+    logger.info(f"Контроль допуску: {admission_controller.stats()}")
+    if application.bot.rate_limiter is not None:
+        logger.info(f"Планувальник запитів до Bot API: {application.bot.rate_limiter.stats()}")
+    completion_cache.close()
+    if semantic_cache is not None:
+        logger.info(f"Семантичний кеш: {semantic_cache.stats()}")
+        await semantic_cache.save()
+    if leaderboard is not None:
+        logger.info(f"Рейтинг квізу: {leaderboard.stats()}")
+        await leaderboard.close()
+    if application.persistence is not None:
+        application.persistence.close()
+    # Дочекатися запису повідомлень, що ще в черзі логування
+    await asyncio.to_thread(flush_logging)
 
-    application = Application.builder().token(config.bot_api_key).post_init(post_init).build()
+
+def build_application(use_updater: bool = True, bot_api_url: str | None = None) -> Application:
+    """
+    Створює Application з усіма обробниками, але не запускає його.
+
+    use_updater=False — оновлення передаються ззовні (webhook, навантажувальні тести);
+    bot_api_url замінює адресу Bot API (наприклад, локальним фейковим сервером).
+    """
+    builder = (
+        Application.builder()
+        .token(config.bot_api_key)
+        .concurrent_updates(config.concurrent_updates)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Метрики тривалості та помилок для кожного методу Bot API
+        .request(InstrumentedRequest(connection_pool_size=256))
+    )
+    if bot_api_url:
+        builder = builder.base_url(bot_api_url)
+    if not use_updater:
+        builder = builder.updater(None)
+    scheduler = build_scheduler()
+    if scheduler is not None:
+        # Усі запити до Bot API проходять через планувальник з лімітами Telegram
+        builder = builder.rate_limiter(scheduler)
+    persistence = build_persistence()
+    if persistence is not None:
+        builder = builder.persistence(persistence)
+    application = builder.build()
+    persistent = persistence is not None
 
     # Виправлення: Зберігаємо об'єкт конфігурації в bot_data
     application.bot_data['config'] = config
 
+    # Таблиця маршрутизації кнопок: ключі з файлів меню і клавіатур у коді,
+    # особистості й теми квізу — за префіксом
+    router = CallbackRouter()
+    router.add_prefix("talk_", "talk_personality", source="talk.json")
+    router.add_prefix("quiz_", "quiz_topic", source="quiz_topics.json")
+    for menu in ("main.json", "talk.json", "quiz_topics.json", "random.json"):
+        router.add_menu(menu)
+    for key in ("end_gpt_dialogue", "end_talk", "ask_another_question", "change_topic", "end_quiz"):
+        router.add(key)
+
     # Обробник для діалогу з GPT
     gpt_conversation_handler = ConversationHandler(
+        name="gpt_conversation",
+        persistent=persistent,
         entry_points=[
             CommandHandler("gpt", gpt_handler.start_gpt_conversation),
-            CallbackQueryHandler(gpt_handler.start_gpt_conversation, pattern="^gpt$")
+            router.handler({"gpt": gpt_handler.start_gpt_conversation})
         ],
         states={
             GPT_DIALOGUE_STATE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, gpt_handler.gpt_message_handler),
-                CallbackQueryHandler(gpt_handler.end_gpt_dialogue, pattern="^end_gpt_dialogue$")
+                router.handler({"end_gpt_dialogue": gpt_handler.end_gpt_dialogue})
             ]
         },
         fallbacks=[
@@ -71,15 +166,19 @@ def main() -> None:
 
     # Обробник для діалогу з особистістю
     talk_conversation_handler = ConversationHandler(
+        name="talk_conversation",
+        persistent=persistent,
         entry_points=[
             CommandHandler("talk", talk_handler.start_talk),
-            CallbackQueryHandler(talk_handler.start_talk, pattern="^talk$")
+            router.handler({"talk": talk_handler.start_talk})
         ],
         states={
-            TALK_PERSONALITY_STATE: [CallbackQueryHandler(talk_handler.select_personality, pattern="^talk_.*")],
+            TALK_PERSONALITY_STATE: [
+                router.handler({"talk_personality": talk_handler.select_personality, "end_talk": talk_handler.end_talk})
+            ],
             TALK_CONVERSING_STATE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, talk_handler.talk_with_personality),
-                CallbackQueryHandler(talk_handler.end_talk, pattern="^end_talk$")
+                router.handler({"end_talk": talk_handler.end_talk})
             ]
         },
         fallbacks=[
@@ -90,27 +189,31 @@ def main() -> None:
 
     # Обробник для квізу
     quiz_conversation_handler = ConversationHandler(
+        name="quiz_conversation",
+        persistent=persistent,
         entry_points=[
             CommandHandler("quiz", quiz_handler.start_quiz),
-            CallbackQueryHandler(quiz_handler.start_quiz, pattern="^quiz$")
+            router.handler({"quiz": quiz_handler.start_quiz})
         ],
         states={
             QUIZ_SELECTING_TOPIC: [
-                CallbackQueryHandler(quiz_handler.ask_question, pattern="^quiz_.*")
+                router.handler({"quiz_topic": quiz_handler.ask_question})
             ],
             QUIZ_WAITING_FOR_ANSWER: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, quiz_handler.process_answer)
             ],
             QUIZ_SHOWING_RESULT: [
-                CallbackQueryHandler(quiz_handler.ask_question, pattern="^ask_another_question$"),
-                CallbackQueryHandler(quiz_handler.change_topic, pattern="^change_topic$"),
-                CallbackQueryHandler(quiz_handler.end_quiz, pattern="^end_quiz$")
+                router.handler({
+                    "ask_another_question": quiz_handler.ask_question,
+                    "change_topic": quiz_handler.change_topic,
+                    "end_quiz": quiz_handler.end_quiz
+                })
             ]
         },
         fallbacks=[
             CommandHandler("cancel", quiz_handler.cancel_quiz),
             CommandHandler("start", start),
-            CallbackQueryHandler(start, pattern="^start$")
+            router.handler({"start": start})
         ]
     )
 
@@ -120,16 +223,53 @@ def main() -> None:
     application.add_handler(quiz_conversation_handler)
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("random", random_handler.get_random_fact))
-    application.add_handler(CallbackQueryHandler(random_handler.get_random_fact, pattern="^random$"))
+    application.add_handler(CommandHandler("top", quiz_handler.show_leaderboard))
+
+    # Кнопки головного меню та /random: поза діалогами або з іншого діалогу
+    application.add_handler(router.handler({
+        "start": start,
+        "random": random_handler.get_random_fact,
+        "gpt": gpt_handler.start_gpt_conversation,
+        "talk": talk_handler.start_talk,
+        "quiz": quiz_handler.start_quiz
+    }))
+    router.check()
+
+    instrument_handlers(application)
+    return application
+
+
+def main() -> None:
+    """Основна функція для запуску бота."""
+    setup_logging()
+
+    if not config.bot_api_key:
+        logger.error("Токен бота не знайдено. Перевірте файл .env")
+        sys.exit(1)
+
+    webhook_mode = config.webhook.mode == "webhook"
+    if webhook_mode and not config.webhook.secret_token:
+        logger.error("Для режиму webhook потрібен WEBHOOK_SECRET_TOKEN. Перевірте файл .env")
+        sys.exit(1)
+
+    if config.workers.count > 1:
+        # Головний процес лише приймає оновлення і розподіляє їх між процесами-обробниками
+        logger.info(f"Бот запущено з {config.workers.count} процесами-обробниками ({config.webhook.mode}).")
+        asyncio.run(run_sharded())
+        return
+
+    # Завантажуємо меню та промпти в пам'ять
+    resource_registry.load_all()
 
-    # Обробка кнопок головного меню
-    application.add_handler(CallbackQueryHandler(start, pattern="^start$"))
-    application.add_handler(CallbackQueryHandler(gpt_handler.start_gpt_conversation, pattern="^gpt$"))
-    application.add_handler(CallbackQueryHandler(talk_handler.start_talk, pattern="^talk$"))
-    application.add_handler(CallbackQueryHandler(quiz_handler.start_quiz, pattern="^quiz$"))
+    # Оновлення в режимі webhook приходять через власний HTTP-сервер, Updater не потрібен
+    application = build_application(use_updater=not webhook_mode)
 
-    logger.info("Бот запущено!")
-    application.run_polling()
+    if webhook_mode:
+        logger.info("Бот запущено в режимі webhook!")
+        asyncio.run(run_webhook(application))
+    else:
+        logger.info("Бот запущено!")
+        application.run_polling()
 
 
 if __name__ == "__main__":
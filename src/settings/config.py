@@ -15,15 +15,265 @@ class Paths:
     prompts = BASE_DIR / 'resources' / 'prompts'
     menus = BASE_DIR / 'resources' / 'menus'
     logs = BASE_DIR / 'logs'
+    cache = BASE_DIR / 'cache'
+    data = BASE_DIR / 'data'
 
 class OpenAI:
     api_key: str = os.getenv('OPENAI_API_KEY')
+    # Модель за замовчуванням, якщо в таблиці маршрутів її не задано
     model: str = "gpt-3.5-turbo"
     temperature: float = 1.2
+    # Розмір спільного пулу HTTP-з'єднань до OpenAI
+    max_connections: int = int(os.getenv('OPENAI_MAX_CONNECTIONS', 20))
+    max_keepalive_connections: int = int(os.getenv('OPENAI_MAX_KEEPALIVE', 10))
+    request_timeout: float = float(os.getenv('OPENAI_TIMEOUT', 60))
+    # Моделі, max_tokens, temperature і timeout для кожної задачі (перечитується без перезапуску)
+    routing_file: Path = Path(os.getenv('MODEL_ROUTING_FILE', Paths.settings / 'model_routing.json'))
+    # Альтернативна адреса API (наприклад, локальний фейковий сервер для перевірки)
+    base_url: str | None = os.getenv('OPENAI_BASE_URL')
+    # Політики викликів для кожного обробника: загальний дедлайн і час однієї спроби (секунди),
+    # кількість спроб і дублювання повільних запитів. Незазначені поля беруться з "default"
+    policies: dict[str, dict] = {
+        "default": {"deadline": 30, "attempt_timeout": 20, "max_attempts": 3},
+        "gpt": {"deadline": 60, "attempt_timeout": 30},
+        "talk": {"deadline": 60, "attempt_timeout": 30},
+        "quiz_question": {"deadline": 20, "attempt_timeout": 10, "hedge": True},
+        "quiz_grade": {"deadline": 15, "attempt_timeout": 8, "hedge": True},
+        "random": {"deadline": 20, "attempt_timeout": 10, "hedge": True},
+        "summary": {"deadline": 60, "attempt_timeout": 30, "max_attempts": 2},
+        "quiz_batch": {"deadline": 90, "attempt_timeout": 60, "max_attempts": 2},
+        "random_batch": {"deadline": 90, "attempt_timeout": 60, "max_attempts": 2},
+    }
+    # Запобіжник: скільки помилок поспіль відкривають його і через скільки секунд пробувати знову
+    circuit_failure_threshold: int = int(os.getenv('OPENAI_CIRCUIT_THRESHOLD', 5))
+    circuit_reset_timeout: float = float(os.getenv('OPENAI_CIRCUIT_RESET', 30))
+
+class Streaming:
+    # Потокова доставка відповідей у /gpt та /talk через редагування повідомлення
+    enabled: bool = os.getenv('STREAMING_ENABLED', '1') == '1'
+    edit_interval: float = 1.0  # мінімальна пауза між редагуваннями, секунди
+    min_chunk_chars: int = 40  # мінімальний приріст тексту для чергового редагування
+    placeholder: str = "✍️ ..."
+
+class Media:
+    # Кеш file_id зображень, які вже завантажено в Telegram
+    cache_file: Path = Paths.cache / 'media_file_ids.json'
+    # Чат, у який завантажуються зображення для попереднього прогріву кешу (необов'язково)
+    warmup_chat_id: str | None = os.getenv('MEDIA_WARMUP_CHAT_ID')
+
+class Resources:
+    # Як часто (секунди) перевіряти mtime меню та промптів для гарячого перезавантаження
+    check_interval: float = float(os.getenv('RESOURCES_CHECK_INTERVAL', 2.0))
+
+class History:
+    # Максимальна кількість токенів історії в одному запиті до моделі
+    token_budget: int = int(os.getenv('HISTORY_TOKEN_BUDGET', 3000))
+    # Скільки останніх реплік завжди надсилати дослівно
+    keep_recent_turns: int = 6
+    # Частка бюджету, після якої старі репліки згортаються в підсумок
+    summarize_threshold: float = 0.8
+    # Тексти реплік, старших за стільки останніх, стискаються zlib (0 — не стискати)
+    compress_after_turns: int = int(os.getenv('HISTORY_COMPRESS_AFTER', 6))
+    compress_min_chars: int = 400  # коротші тексти zlib не зменшує
+
+class Persistence:
+    # Збереження сесій користувачів і станів діалогів між перезапусками
+    enabled: bool = os.getenv('PERSISTENCE_ENABLED', '1') == '1'
+    backend: str = os.getenv('PERSISTENCE_BACKEND', 'sqlite')
+    db_path: Path = Path(os.getenv('PERSISTENCE_DB_PATH', Paths.data / 'bot_state.sqlite3'))
+    update_interval: float = 10  # як часто Application передає зміни у сховище, секунди
+    flush_interval: float = 5  # як часто накопичені зміни записуються на диск, секунди
+    batch_size: int = 500  # записати одразу, якщо накопичилось стільки змін
+    max_hot_sessions: int = int(os.getenv('PERSISTENCE_MAX_HOT_SESSIONS', 10000))
+    idle_ttl: float = float(os.getenv('PERSISTENCE_IDLE_TTL', 1800))
+    busy_timeout: float = 30  # скільки чекати, поки інший процес-обробник допише в базу, секунди
+
+class Webhook:
+    # Режим отримання оновлень: "polling" (для розробки) або "webhook"
+    mode: str = os.getenv('BOT_MODE', 'polling')
+    # Публічна адреса, на яку Telegram надсилатиме оновлення (без шляху). Якщо порожня,
+    # webhook не реєструється в Telegram — зручно для локальної перевірки
+    url: str | None = os.getenv('WEBHOOK_URL')
+    listen: str = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+    port: int = int(os.getenv('WEBHOOK_PORT', 8080))
+    path: str = os.getenv('WEBHOOK_PATH', '/telegram')
+    secret_token: str | None = os.getenv('WEBHOOK_SECRET_TOKEN')
+    # Скільки секунд чекати завершення запитів під час зупинки
+    drain_timeout: float = 10
+
+class QuizPool:
+    # Заздалегідь згенеровані питання квізу для кожної теми
+    enabled: bool = os.getenv('QUIZ_POOL_ENABLED', '1') == '1'
+    pool_size: int = int(os.getenv('QUIZ_POOL_SIZE', 20))  # до скількох питань поповнювати тему
+    low_water: int = int(os.getenv('QUIZ_POOL_LOW_WATER', 5))  # поріг, нижче якого починається поповнення
+    batch_size: int = 5  # питань за один запит до моделі
+    refill_concurrency: int = int(os.getenv('QUIZ_POOL_REFILL_CONCURRENCY', 2))
+    refill_interval: float = 5  # як часто перевіряти рівень пулу, секунди
+    seen_history: int = 200  # скільки останніх питань пам'ятати для кожного користувача
+
+class Grading:
+    # Локальна перевірка відповідей квізу; неоднозначні випадки перевіряє модель
+    enabled: bool = os.getenv('LOCAL_GRADING_ENABLED', '1') == '1'
+    accept_threshold: float = 0.85  # схожість, з якої відповідь зараховується
+    reject_threshold: float = 0.45  # схожість, нижче якої відповідь вважається неправильною
+
+class FactBuffer:
+    # Буфер заздалегідь згенерованих випадкових фактів
+    enabled: bool = os.getenv('FACT_BUFFER_ENABLED', '1') == '1'
+    capacity: int = int(os.getenv('FACT_BUFFER_CAPACITY', 30))
+    low_water: int = 10  # поріг, нижче якого буфер поповнюється негайно
+    batch_size: int = 10  # фактів за один запит до моделі
+    refill_interval: float = 5
+    refill_backoff_max: float = 300  # найбільша пауза, коли модель не дає нових фактів (пауза подвоюється)
+    dedup_threshold: float = 0.5  # схожість Жаккара, з якої факт вважається повтором
+    dedup_history: int = 5000  # скільки останніх фактів пам'ятає індекс дублікатів
+    seen_per_user: int = 200  # скільки останніх отриманих фактів пам'ятається для кожного користувача
+
+class Outbound:
+    # Планувальник вихідних запитів до Telegram (ліміти Bot API)
+    enabled: bool = os.getenv('OUTBOUND_SCHEDULER_ENABLED', '1') == '1'
+    global_rate: float = float(os.getenv('OUTBOUND_GLOBAL_RATE', 30))  # повідомлень на секунду для всього бота
+    global_burst: int = 30
+    chat_rate: float = 1.0  # повідомлень на секунду в особистому чаті
+    chat_burst: int = 3
+    group_rate: float = 20 / 60  # у групах Telegram дозволяє близько 20 повідомлень на хвилину
+    max_retries: int = 3  # скільки разів повторювати запит після RetryAfter
+    max_inflight: int = 64  # одночасних HTTP-запитів до Bot API
+    shutdown_timeout: float = 5  # скільки чекати на спорожнення черги при зупинці
+
+class Coalescing:
+    # Об'єднання кількох швидких повідомлень користувача в один запит до моделі
+    enabled: bool = os.getenv('COALESCING_ENABLED', '1') == '1'
+    debounce: float = float(os.getenv('COALESCING_DEBOUNCE', 0.7))  # скільки чекати на наступне повідомлення, секунди
+    separator: str = "\n"
+
+class CompletionCache:
+    # Кеш відповідей моделі для однакових запитів різних користувачів
+    enabled: bool = os.getenv('COMPLETION_CACHE_ENABLED', '1') == '1'
+    max_entries: int = int(os.getenv('COMPLETION_CACHE_MAX_ENTRIES', 2000))
+    disk_enabled: bool = os.getenv('COMPLETION_CACHE_DISK', '0') == '1'
+    disk_path: Path = Paths.cache / 'completions.sqlite3'
+    busy_timeout: float = 10  # скільки чекати, поки інший процес-обробник допише в базу, секунди
+    temperature_step: float = 0.1  # температури, що відрізняються менше ніж на крок, мають спільний запис
+    # Час життя записів для кожного місця виклику, секунди (0 — не кешувати)
+    quiz_question_ttl: float = 120
+    random_fact_ttl: float = 60
+    gpt_first_turn_ttl: float = 3600
+
+class SemanticCache:
+    # Відповіді на перефразовані перші питання /gpt (потрібен numpy); вимкнено за замовчуванням
+    enabled: bool = os.getenv('SEMANTIC_CACHE_ENABLED', '0') == '1'
+    capacity: int = int(os.getenv('SEMANTIC_CACHE_CAPACITY', 20000))
+    threshold: float = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.9))  # косинусна схожість питань
+    ttl: float = float(os.getenv('SEMANTIC_CACHE_TTL', 86400))
+    dim: int = 512  # розмірність хешованих векторів n-грам
+    tables: int = 24  # таблиць LSH: більше — точніший пошук, але більше кандидатів
+    bits: int = 14  # бітів у ключі кошика LSH
+    snapshot_path: Path = Paths.cache / 'semantic_cache.npz'
+
+class Metrics:
+    # Метрики у форматі Prometheus на локальному HTTP-ендпоінті
+    enabled: bool = os.getenv('METRICS_ENABLED', '1') == '1'
+    host: str = os.getenv('METRICS_HOST', '127.0.0.1')
+    port: int = int(os.getenv('METRICS_PORT', 9464))
+    path: str = '/metrics'
+    loop_lag_interval: float = 0.5  # як часто вимірювати затримку циклу подій, секунди
+
+class Tracing:
+    # Трасування обробки оновлень: дерево етапів логується для повільних оновлень
+    enabled: bool = os.getenv('TRACING_ENABLED', '0') == '1'
+    slow_threshold: float = float(os.getenv('TRACING_SLOW_THRESHOLD', 2.0))  # секунди
+
+class Logging:
+    # Логування: записи у файли пишуться з окремого потоку, файли у форматі JSON Lines
+    level: str = os.getenv('LOG_LEVEL', 'INFO')
+    structured: bool = os.getenv('LOG_JSON', '1') == '1'
+    enqueue: bool = True
+    rotation: str = os.getenv('LOG_ROTATION', '20 MB')
+    retention: str = os.getenv('LOG_RETENTION', '14 days')
+    compression: str = 'gz'
+    max_message_length: int = 2000  # довші повідомлення обрізаються
+    max_field_length: int = 200  # так само для рядкових полів (logger.bind)
+    # Поля з текстом користувачів: у лог потрапляє лише хеш і довжина
+    hashed_fields: tuple[str, ...] = ('text',)
+    hash_user_text: bool = os.getenv('LOG_HASH_USER_TEXT', '1') == '1'
+    # Частка записів подій (logger.bind(event=...)), що потрапляють у лог, для кожного рівня;
+    # WARNING і вище та записи без event не відкидаються
+    sample_rates: dict[str, float] = {
+        'DEBUG': float(os.getenv('LOG_SAMPLE_DEBUG', 0.05)),
+        'INFO': float(os.getenv('LOG_SAMPLE_INFO', 0.25)),
+    }
+
+class Workers:
+    # Кілька процесів-обробників: оновлення розподіляються між ними за хешем chat_id
+    count: int = int(os.getenv('WORKERS', 1))  # 1 — усе в одному процесі
+    queue_size: int = int(os.getenv('WORKER_QUEUE_SIZE', 10_000))  # черга оновлень одного обробника
+    restart_backoff: float = 1.0  # пауза перед перезапуском процесу, що впав (далі подвоюється)
+    restart_backoff_max: float = 30
+    stable_after: float = 60  # після скількох секунд роботи процес вважається стабільним (пауза скидається)
+    drain_timeout: float = float(os.getenv('WORKER_DRAIN_TIMEOUT', 30))  # скільки чекати, поки обробники завершать чергу під час зупинки
+
+class Admission:
+    # Допуск запитів до моделі під навантаженням: ліміти одночасних запитів, черга з дедлайном і квоти
+    enabled: bool = os.getenv('ADMISSION_ENABLED', '1') == '1'
+    max_concurrent: int = int(os.getenv('ADMISSION_MAX_CONCURRENT', 12))  # одночасних запитів до моделі
+    per_user_concurrent: int = int(os.getenv('ADMISSION_PER_USER', 1))  # з них від одного користувача
+    background_concurrent: int = 2  # з них фонових (поповнення пулів, підсумки історії)
+    # max_concurrent + max_queue має бути менше за CONCURRENT_UPDATES: решта слотів — для дешевих оновлень
+    max_queue: int = int(os.getenv('ADMISSION_MAX_QUEUE', 12))
+    max_wait: float = float(os.getenv('ADMISSION_MAX_WAIT', 8))  # скільки запит може чекати на місце, секунди
+    # Пріоритет задач у черзі (менше — раніше); задачі з пріоритетом background_priority і більше — фонові
+    priorities: dict[str, int] = {
+        "quiz_grade": 0, "quiz_question": 0, "random": 0,
+        "default": 1, "gpt": 1, "talk": 1,
+        "summary": 2, "quiz_batch": 2, "random_batch": 2,
+    }
+    background_priority: int = 2
+    # Квота токенів на користувача: середня швидкість і запас (0 — без квоти)
+    user_tokens_per_minute: float = float(os.getenv('USER_TOKENS_PER_MINUTE', 6000))
+    user_token_burst: int = int(os.getenv('USER_TOKEN_BURST', 12000))
+
+class Startup:
+    # Швидкий старт: шар моделі імпортується і прогрівається у фоні, коли бот уже приймає оновлення
+    background_warmup: bool = os.getenv('STARTUP_BACKGROUND_WARMUP', '1') == '1'
+    warm_up_connections: bool = os.getenv('STARTUP_WARM_UP_CONNECTIONS', '1') == '1'
+    # Відбиток команд бота: set_my_commands викликається, лише якщо команди змінилися
+    commands_hash_file: Path = Paths.cache / 'bot_commands.sha256'
+
+class Leaderboard:
+    # Рейтинг квізу (/top): бали в пам'яті, запис у SQLite пакетами
+    enabled: bool = os.getenv('LEADERBOARD_ENABLED', '1') == '1'
+    db_path: Path = Path(os.getenv('LEADERBOARD_DB_PATH', Paths.data / 'leaderboard.sqlite3'))
+    flush_interval: float = 5  # як часто накопичені бали записуються на диск, секунди
+    batch_size: int = 1000  # записати одразу, якщо накопичилось стільки змін
+    top_size: int = 10  # скільки перших місць показує /top
+    busy_timeout: float = 30  # скільки чекати, поки інший процес-обробник допише в базу, секунди
 
 class Settings:
     bot_api_key: str = os.getenv('TELEGRAM_BOT_TOKEN')
+    # Кількість оновлень, які обробляються одночасно
+    concurrent_updates: int = int(os.getenv('CONCURRENT_UPDATES', 32))
     paths: Paths = Paths()
     openai: OpenAI = OpenAI()
+    streaming: Streaming = Streaming()
+    media: Media = Media()
+    resources: Resources = Resources()
+    history: History = History()
+    persistence: Persistence = Persistence()
+    webhook: Webhook = Webhook()
+    quiz_pool: QuizPool = QuizPool()
+    grading: Grading = Grading()
+    fact_buffer: FactBuffer = FactBuffer()
+    outbound: Outbound = Outbound()
+    coalescing: Coalescing = Coalescing()
+    completion_cache: CompletionCache = CompletionCache()
+    semantic_cache: SemanticCache = SemanticCache()
+    metrics: Metrics = Metrics()
+    tracing: Tracing = Tracing()
+    logging: Logging = Logging()
+    workers: Workers = Workers()
+    admission: Admission = Admission()
+    startup: Startup = Startup()
+    leaderboard: Leaderboard = Leaderboard()
 
 config = Settings()
@@ -1,52 +1,214 @@
+import copy
+import hashlib
+import json
 import os
+import queue
+import random
 import sys
+import threading
+import traceback
 from loguru import logger
-from pathlib import Path
 
 from .config import config
 
+TEXT_FORMAT = "{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}"
+CONSOLE_FORMAT = ("<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | "
+                  "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
+WARNING_LEVEL = 30
+
+
+def truncate(value: str, limit: int) -> str:
+    """Обрізає рядок до limit символів, зберігаючи відомість про довжину оригіналу."""
+    if len(value) <= limit:
+        return value
+    return f"{value[:limit]}…(+{len(value) - limit})"
+
+
+def fingerprint(value: str) -> str:
+    """Короткий хеш тексту: дозволяє зіставити однакові повідомлення, не зберігаючи їх вміст."""
+    return f"sha256:{hashlib.sha256(value.encode('utf-8')).hexdigest()[:12]} len={len(value)}"
+
+
+class RecordProcessor:
+    """
+    Обробка запису один раз до передачі в обробники (patcher Loguru).
+
+    - Події (записи з extra["event"]) рівнів нижче WARNING потрапляють у лог з імовірністю
+      sample_rates[рівень]; відкинуті позначаються і фільтруються обробниками.
+    - Поля з текстом користувачів замінюються хешем, довгі рядки обрізаються.
+    """
+
+    def __init__(self, sample_rates: dict[str, float], max_message_length: int, max_field_length: int,
+                 hashed_fields: tuple[str, ...], hash_user_text: bool, seed: int | None = None):
+        self.sample_rates = sample_rates
+        self.max_message_length = max_message_length
+        self.max_field_length = max_field_length
+        self.hashed_fields = set(hashed_fields) if hash_user_text else set()
+        self._random = random.Random(seed)
+        self.dropped = 0
+
+    def __call__(self, record) -> None:
+        extra = record["extra"]
+        if "event" in extra and record["level"].no < WARNING_LEVEL:
+            rate = self.sample_rates.get(record["level"].name, 1.0)
+            if rate < 1.0 and self._random.random() >= rate:
+                extra["_dropped"] = True
+                self.dropped += 1
+                return
+        record["message"] = truncate(record["message"], self.max_message_length)
+        for key, value in extra.items():
+            if key in self.hashed_fields and isinstance(value, str):
+                extra[key] = fingerprint(value)
+            elif isinstance(value, str):
+                extra[key] = truncate(value, self.max_field_length)
+
+
+def _is_kept(record) -> bool:
+    return not record["extra"].get("_dropped")
+
+
+def _fields(record) -> dict:
+    return {key: value for key, value in record["extra"].items() if not key.startswith("_")}
+
+
+def json_format(record) -> str:
+    """Один запис — один рядок JSON (JSON Lines)."""
+    payload = {
+        "time": record["time"].isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "logger": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "message": record["message"],
+        **_fields(record),
+    }
+    if record["exception"] is not None:
+        payload["exception"] = "".join(traceback.format_exception(*record["exception"]))
+    record["extra"]["_json"] = json.dumps(payload, ensure_ascii=False, default=str)
+    return "{extra[_json]}\n"
+
+
+def _text_format(base: str):
+    def text_format(record) -> str:
+        fields = _fields(record)
+        record["extra"]["_fields"] = " | " + " ".join(f"{key}={value}" for key, value in fields.items()) \
+            if fields else ""
+        return base + "{extra[_fields]}\n{exception}"
+    return text_format
+
+
+class BackgroundSink:
+    """
+    Sink Loguru, що передає записи у фоновий потік через чергу в пам'яті.
+
+    Виклик logger.* лише кладе готовий запис у queue.SimpleQueue; форматування та запис у файли
+    і консоль виконує окремий потік через незалежну копію логера з власними обробниками
+    (ротація, стиснення, retention). Вбудований enqueue=True Loguru серіалізує кожен запис
+    через pickle і канал multiprocessing, що на гарячому шляху дорожче за сам запис у файл.
+    Якщо потік не встигає і в черзі вже max_pending записів, нові записи відкидаються.
+    """
+
+    def __init__(self, writer, max_pending: int = 100_000):
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._current = None
+        # Записи відтворюються з тими самими часом, рівнем, місцем виклику та полями
+        self._writer = writer.patch(lambda record: record.update(self._current))
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, message) -> None:
+        if self._queue.qsize() >= self.max_pending:
+            self.dropped += 1
+            return
+        self._queue.put(message.record)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            self._current = item
+            try:
+                self._writer.log(item["level"].name, item["message"])
+            except Exception as e:  # запис у лог не повинен зупиняти потік
+                print(f"Помилка запису в лог: {e!r}", file=sys.__stderr__)
+
+    def drain(self, timeout: float = 5.0) -> bool:
+        """Чекає, доки потік запише все, що вже в черзі (не довше timeout)."""
+        marker = threading.Event()
+        self._queue.put(marker)
+        return marker.wait(timeout)
+
+    def stop(self) -> None:
+        """Викликається Loguru при logger.remove(): дописує чергу і завершує потік."""
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+        self._writer.remove()
+
+
+_background: BackgroundSink | None = None
+
+
+def flush_logging(timeout: float = 5.0) -> None:
+    """Чекає запису повідомлень, що ще в черзі логування (блокує; з циклу подій — через to_thread)."""
+    if _background is not None:
+        _background.drain(timeout)
+
+
+def _add_sinks(target, settings, record_filter) -> None:
+    file_options = dict(
+        format=json_format if settings.structured else _text_format(TEXT_FORMAT),
+        filter=record_filter,
+        rotation=settings.rotation,
+        retention=settings.retention,
+        compression=settings.compression,
+        encoding="utf-8"
+    )
+    target.add(sink=config.paths.logs / "app.log", level=settings.level, **file_options)
+    # Окремий файл для попереджень і помилок
+    target.add(sink=config.paths.logs / "error.log", level="WARNING", **file_options)
+    # Обробник для виводу в консоль
+    target.add(sink=sys.stderr, level=settings.level, colorize=True, format=_text_format(CONSOLE_FORMAT),
+               filter=record_filter)
+
 
 def setup_logging() -> None:
     """
     Налаштовує логування для додатка, використовуючи Loguru.
 
-    Логи виводяться в консоль (рівень INFO), зберігаються в app.log (INFO)
-    та в error.log (WARNING).
+    Логи виводяться в консоль, зберігаються в app.log (усі рівні від Settings.logging.level)
+    та в error.log (WARNING і вище). Записи у файли й консоль виконуються з окремого потоку,
+    тож цикл подій не чекає на диск; файли ротуються зі стисненням і видаляються після retention.
     """
-    log_dir: Path = config.paths.logs
-    app_log_path: Path = log_dir / "app.log"
-    error_log_path: Path = log_dir / "error.log"
-
+    global _background
+    settings = config.logging
     # Створюємо папку для логів, якщо її немає
-    os.makedirs(log_dir, exist_ok=True)
+    os.makedirs(config.paths.logs, exist_ok=True)
 
     # Видаляємо стандартний обробник Loguru, щоб уникнути дублювання
     logger.remove()
+    _background = None
+    # Копія без обробників для фонового потоку (до встановлення patcher, щоб записи не оброблялися двічі)
+    writer = copy.deepcopy(logger)
 
-    # Обробник для запису всіх логів у файл app.log
-    logger.add(
-        sink=app_log_path,
-        level="INFO",
-        rotation="5 MB",
-        encoding="utf-8",
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}"
-    )
-
-    # Обробник для запису помилок (WARNING та вище) в error.log
-    logger.add(
-        sink=error_log_path,
-        level="WARNING",  # Записуємо тільки попередження та помилки
-        rotation="5 MB",
-        encoding="utf-8",
-        format="{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{function}:{line} - {message}"
-    )
-
-    # Обробник для виводу в консоль
-    logger.add(
-        sink=sys.stderr,
-        level="INFO",
-        colorize=True,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
-    )
+    logger.configure(patcher=RecordProcessor(
+        sample_rates=settings.sample_rates,
+        max_message_length=settings.max_message_length,
+        max_field_length=settings.max_field_length,
+        hashed_fields=settings.hashed_fields,
+        hash_user_text=settings.hash_user_text
+    ))
+    if settings.enqueue:
+        # Обробники, що пишуть у файли й консоль, належать копії логера у фоновому потоці
+        _add_sinks(writer, settings, record_filter=None)
+        _background = BackgroundSink(writer)
+        logger.add(_background, level=settings.level, format="{message}", filter=_is_kept)
+    else:
+        _add_sinks(logger, settings, record_filter=_is_kept)
 
-    logger.info("Логування налаштовано.")
\ No newline at end of file
+    logger.info("Логування налаштовано.")